@@ -0,0 +1,185 @@
+"""Find an article's latest archive.md snapshot without loading the archive's search page.
+
+The archive's timemap for a URL lists its snapshots, so one plain HTTP request gives the newest
+one, and the snapshot itself can often be fetched over HTTP too, leaving the browser for when
+archive.md serves a CAPTCHA. Snapshots found either way are kept in scrapes/archive/snapshots.jsonl
+by canonical URL, so an article is only looked up again once its entry is older than max_age.
+"""
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+import requests
+from bs4 import BeautifulSoup, NavigableString, Tag
+from pydantic import BaseModel
+from collect_links import setup_session, wait_for_domain
+from utils import canonicalize_url
+
+ARCHIVE_PREFIX = "https://archive.md/"
+SNAPSHOTS_PATH = Path("scrapes/archive/snapshots.jsonl")
+REQUEST_TIMEOUT = 15
+# Gap between our requests to archive.md, across all scraping threads
+REQUEST_DELAY = 1.0
+# After a CAPTCHA or rate limit, how long to leave archive.md to the browsers
+BLOCKED_BACKOFF = 300
+# Cached snapshots older than this are looked up again, in case the article was archived since
+SNAPSHOT_MAX_AGE = timedelta(days=7)
+
+# <https://archive.md/20251209101112/https://...>; rel="last memento"; datetime="..."
+MEMENTO_RE = re.compile(r'<([^>]+)>\s*;([^<]*)')
+REL_RE = re.compile(r'rel="([^"]*)"')
+# The challenge page loads a CAPTCHA widget, snapshots never do as archive.md strips their scripts and iframes
+CHALLENGE_RE = re.compile(
+    r'<(?:script|iframe)[^>]+src="[^"]*(?:google\.com/recaptcha|recaptcha\.net|hcaptcha\.com|challenges\.cloudflare\.com)',
+    re.IGNORECASE,
+)
+BLOCK_TAGS = {
+    "address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt", "figcaption", "figure", "footer",
+    "form", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li", "main", "nav", "ol", "p", "pre", "section",
+    "table", "tr", "ul",
+}
+SKIP_TAGS = {"script", "style", "noscript", "template", "head"}
+
+class Snapshot(BaseModel):
+    url: str
+    snapshot: str
+    resolved_at: datetime
+
+class Blocked(Exception):
+    """archive.md answered with a CAPTCHA or a rate limit"""
+
+def is_blocked(response: requests.Response) -> bool:
+    """Whether archive.md refused the request or served its CAPTCHA page, not an article that mentions CAPTCHAs"""
+    return response.status_code in (403, 429) or CHALLENGE_RE.search(response.text) is not None
+
+def latest_memento(timemap: str) -> str | None:
+    """The newest snapshot listed in a link-format timemap"""
+    mementos = []
+    for target, params in MEMENTO_RE.findall(timemap):
+        rel = REL_RE.search(params)
+        if rel and "memento" in rel.group(1).split():
+            if "last" in rel.group(1).split():
+                return target
+            mementos.append(target)
+    return mementos[-1] if mementos else None
+
+def _html_text(element: Tag) -> str:
+    """An element's text with a line per block, roughly as the browser's innerText gives it"""
+    parts: list[str] = []
+    for node in element.descendants:
+        if isinstance(node, NavigableString):
+            if not any(parent.name in SKIP_TAGS for parent in node.parents if parent is not element):
+                parts.append(str(node))
+        elif isinstance(node, Tag) and node.name in BLOCK_TAGS:
+            parts.append("\n")
+    lines = (" ".join(line.split()) for line in "".join(parts).split("\n"))
+    return "\n".join(line for line in lines if line)
+
+def snapshot_body_text(html: str) -> str | None:
+    """The archived page's text from a snapshot, from the same .body element the browser scrape reads"""
+    body = BeautifulSoup(html, "html.parser").find(class_="body")
+    if not isinstance(body, Tag):
+        return None
+    return _html_text(body) or None
+
+class SnapshotResolver:
+    """Latest snapshot of each article, from the on-disk cache or the archive's timemap, and snapshot text over HTTP.
+    The CLI turns it off with enabled like llm_cache, leaving everything to the browser's search page flow."""
+    def __init__(self, path: Path, max_age: timedelta = SNAPSHOT_MAX_AGE):
+        self.path = path
+        self.enabled = True
+        self.max_age = max_age
+        self.counts = {"cached": 0, "timemap": 0, "http": 0, "browser": 0, "search": 0}
+        self._snapshots: dict[str, Snapshot] | None = None
+        self._blocked_until = 0.0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict[str, Snapshot]:
+        if self._snapshots is None:
+            snapshots: dict[str, Snapshot] = {}
+            if self.path.exists():
+                for line in self.path.read_text().splitlines():
+                    if line.strip():
+                        snapshot = Snapshot.model_validate_json(line)
+                        snapshots[snapshot.url] = snapshot
+            self._snapshots = snapshots
+        return self._snapshots
+
+    def _session(self) -> requests.Session:
+        # Sessions aren't thread safe, each scraping thread gets its own
+        if not hasattr(self._local, "session"):
+            self._local.session = setup_session()
+        return self._local.session
+
+    def count(self, key: str):
+        with self._lock:
+            self.counts[key] += 1
+
+    def _get(self, url: str) -> requests.Response:
+        if time.monotonic() < self._blocked_until:
+            raise Blocked(url)
+        wait_for_domain(url, REQUEST_DELAY)
+        response = self._session().get(url, timeout=REQUEST_TIMEOUT)
+        if is_blocked(response):
+            self._blocked_until = time.monotonic() + BLOCKED_BACKOFF
+            raise Blocked(url)
+        return response
+
+    def cached(self, url: str) -> str | None:
+        """The snapshot found for the article within max_age"""
+        with self._lock:
+            snapshot = self._load().get(canonicalize_url(url))
+        if snapshot is None or datetime.now() - snapshot.resolved_at > self.max_age:
+            return None
+        return snapshot.snapshot
+
+    def record(self, url: str, snapshot_url: str):
+        snapshot = Snapshot(url=canonicalize_url(url), snapshot=snapshot_url, resolved_at=datetime.now())
+        with self._lock:
+            self._load()[snapshot.url] = snapshot
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(snapshot.model_dump_json() + "\n")
+
+    def resolve(self, url: str) -> str | None:
+        """The article's latest snapshot URL, None if the archive has none or couldn't be asked"""
+        if not self.enabled:
+            return None
+        if (snapshot_url := self.cached(url)) is not None:
+            self.count("cached")
+            return snapshot_url
+        try:
+            response = self._get(f"{ARCHIVE_PREFIX}timemap/{url}")
+        except (Blocked, requests.RequestException):
+            return None
+        if not response.ok or (snapshot_url := latest_memento(response.text)) is None:
+            return None
+        self.count("timemap")
+        self.record(url, snapshot_url)
+        return snapshot_url
+
+    def fetch_text(self, snapshot_url: str) -> str | None:
+        """A snapshot's body text over plain HTTP, None if archive.md wants a browser"""
+        if not self.enabled:
+            return None
+        try:
+            response = self._get(snapshot_url)
+        except (Blocked, requests.RequestException):
+            return None
+        if not response.ok:
+            return None
+        text = snapshot_body_text(response.text)
+        if text:
+            self.count("http")
+        return text
+
+    def summary(self) -> str:
+        c = self.counts
+        return (
+            f"Archive snapshots: {c['cached']} cached, {c['timemap']} from the timemap, {c['search']} from the search page; "
+            f"{c['http']} fetched over HTTP, {c['browser']} in the browser"
+        )
+
+snapshot_resolver = SnapshotResolver(SNAPSHOTS_PATH)
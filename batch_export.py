@@ -0,0 +1,141 @@
+"""Pack a batch's clean articles into one compressed JSONL shard, for loading a whole batch in one read.
+
+The shard is a run of independently compressed blocks of BLOCK_RECORDS lines, so it reads
+sequentially as a single stream, and a sidecar index of block offsets lets one record be
+read by decompressing just its block. zstd is used when the zstandard package is installed.
+"""
+import gzip
+import io
+from pathlib import Path
+from typing import Iterator, Literal
+from pydantic import BaseModel
+from utils import Paper, ScrapeData, read_clean_article_scrape, get_clean_article_scrapes_for_batch, parse_article_scrape_filename
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+EXPORT_DIR = Path("scrapes/exports")
+# Records per compressed block, bigger blocks compress better but random reads decompress more
+BLOCK_RECORDS = 256
+
+Compression = Literal["gzip", "zstd"]
+
+class ExportedArticle(ScrapeData):
+    filename: str
+    paper: Paper | None = None
+
+class ExportBlock(BaseModel):
+    offset: int
+    length: int
+    # Index of the block's first record in the shard
+    first_record: int
+    n_records: int
+
+class ExportIndex(BaseModel):
+    batch_id: str
+    compression: Compression
+    n_records: int
+    blocks: list[ExportBlock]
+    # Position of each record in the shard, by filename
+    records: dict[str, int]
+
+def default_compression() -> Compression:
+    return "zstd" if zstandard is not None else "gzip"
+
+def shard_path(batch_id: str, compression: Compression, directory: Path = EXPORT_DIR) -> Path:
+    return directory / f"{batch_id}.jsonl.{'zst' if compression == 'zstd' else 'gz'}"
+
+def index_path(shard: Path) -> Path:
+    return shard.with_name(shard.name + ".idx.json")
+
+def _compress(data: bytes, compression: Compression) -> bytes:
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+def _decompress(data: bytes, compression: Compression) -> bytes:
+    if compression == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+def export_batch(batch_id: str, compression: Compression | None = None, directory: Path = EXPORT_DIR) -> tuple[Path, ExportIndex]:
+    """Write every clean article of a batch into one shard and its index"""
+    compression = compression or default_compression()
+    if compression == "zstd" and zstandard is None:
+        raise ValueError("zstd compression needs the zstandard package, use gzip")
+    shard = shard_path(batch_id, compression, directory)
+    shard.parent.mkdir(parents=True, exist_ok=True)
+
+    blocks: list[ExportBlock] = []
+    records: dict[str, int] = {}
+    lines: list[bytes] = []
+    offset = 0
+    # Write to a temporary file first so a reader never sees a half written shard
+    tmp_shard = shard.with_name(shard.name + ".tmp")
+    with open(tmp_shard, "wb") as f:
+        def flush():
+            nonlocal offset, lines
+            if not lines:
+                return
+            block = _compress(b"".join(lines), compression)
+            f.write(block)
+            blocks.append(ExportBlock(offset=offset, length=len(block), first_record=len(records) - len(lines), n_records=len(lines)))
+            offset += len(block)
+            lines = []
+
+        for path in get_clean_article_scrapes_for_batch(batch_id):
+            scrape = read_clean_article_scrape(path.name)
+            record = ExportedArticle(
+                **scrape.model_dump(), filename=path.name, paper=parse_article_scrape_filename(path.name)[0],
+            )
+            records[path.name] = len(records)
+            lines.append(record.model_dump_json().encode() + b"\n")
+            if len(lines) >= BLOCK_RECORDS:
+                flush()
+        flush()
+
+    index = ExportIndex(batch_id=batch_id, compression=compression, n_records=len(records), blocks=blocks, records=records)
+    # Both files are written before either replaces the old ones, which leaves only the two renames between them
+    tmp_index = index_path(tmp_shard)
+    tmp_index.write_text(index.model_dump_json())
+    tmp_shard.replace(shard)
+    tmp_index.replace(index_path(shard))
+    return shard, index
+
+def read_index(shard: Path) -> ExportIndex:
+    return ExportIndex.model_validate_json(index_path(shard).read_text())
+
+def _compression_of(shard: Path) -> Compression:
+    return "zstd" if shard.suffix == ".zst" else "gzip"
+
+def iter_export(shard: Path) -> Iterator[ExportedArticle]:
+    """Yield every record of a shard in order, reading it as one sequential stream"""
+    with open(shard, "rb") as raw:
+        if _compression_of(shard) == "zstd":
+            # Each block is its own frame
+            stream = io.BufferedReader(
+                zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True), buffer_size=1024 * 1024,
+            )
+        else:
+            # gzip reads concatenated members as one stream
+            stream = gzip.GzipFile(fileobj=raw)
+        with stream:
+            for line in stream:
+                if line.strip():
+                    yield ExportedArticle.model_validate_json(line)
+
+def read_exported_article(shard: Path, filename: str, index: ExportIndex | None = None) -> ExportedArticle:
+    """Read one record, decompressing only the block that holds it"""
+    index = index or read_index(shard)
+    position = index.records.get(filename)
+    if position is None:
+        raise KeyError(f"{filename} is not in {shard}")
+    # Blocks are in record order, so the last block starting at or before the record holds it
+    block = next(b for b in reversed(index.blocks) if b.first_record <= position)
+    with open(shard, "rb") as f:
+        f.seek(block.offset)
+        data = _decompress(f.read(block.length), index.compression)
+    line = data.split(b"\n")[position - block.first_record]
+    return ExportedArticle.model_validate_json(line)
@@ -0,0 +1,102 @@
+"""Compare anchor extraction strategies on saved HTML fixtures.
+
+    uv run python -m benchmarks.anchor_extraction --save      # save current topic pages as fixtures
+    uv run python -m benchmarks.anchor_extraction --repeats 5
+
+Without any saved fixtures a synthetic 600-anchor listing page is generated.
+"""
+import time
+from pathlib import Path
+import typer
+from rich import print
+from rich.table import Table
+from selenium import webdriver
+from selenium.webdriver.common.by import By
+from collect_links import setup_driver, setup_session, scrape_all_links, scrape_all_links_from_html
+from utils import LinkData, PAPERS, ai_topic_page_maps, paper_fetch_backends
+
+FIXTURE_DIR = Path("benchmarks/fixtures")
+
+def scrape_all_links_per_element(driver: webdriver.Chrome) -> list[LinkData]:
+    # The previous strategy: two WebDriver commands per anchor
+    links = driver.find_elements(By.XPATH, "//a")
+    link_datas = []
+    for link in links:
+        href = link.get_attribute("href")
+        if not href:
+            continue
+        link_datas.append(
+            LinkData(text=link.text, href=href)
+        )
+    return link_datas
+
+def synthetic_listing(n_anchors: int = 600) -> str:
+    items = "\n".join(
+        f'<li><a href="/news/technology/story-{i}">Headline number {i} about artificial intelligence</a></li>'
+        for i in range(n_anchors)
+    )
+    return f"<html><body><nav><a href='/'>Home</a><a href='/news'>News</a></nav><ul>{items}</ul></body></html>"
+
+def save_fixtures():
+    """Save page 1 of each server-rendered paper's topic page"""
+    FIXTURE_DIR.mkdir(parents=True, exist_ok=True)
+    session = setup_session()
+    for paper in PAPERS:
+        if paper_fetch_backends[paper] != "http":
+            continue
+        url = ai_topic_page_maps[paper](1)
+        try:
+            response = session.get(url, timeout=15)
+            response.raise_for_status()
+        except Exception as e:
+            print(f"[red]Could not fetch {url}: {e}[/red]")
+            continue
+        # Keep the original URL in a base tag so relative hrefs resolve as they did live
+        html = response.text.replace("<head>", f'<head><base href="{response.url}">', 1)
+        (FIXTURE_DIR / f"{paper}.html").write_text(html, encoding="utf-8")
+        print(f"[green]Saved {paper} fixture ({len(html)} chars)[/green]")
+
+def _time(fn, repeats: int) -> tuple[float, list[LinkData]]:
+    result = []
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = fn()
+    return (time.perf_counter() - start) / repeats, result
+
+def main(
+    repeats: int = typer.Option(3, help="Runs of each strategy per fixture"),
+    save: bool = typer.Option(False, help="Fetch and save fixtures before benchmarking"),
+):
+    if save:
+        save_fixtures()
+    fixtures = sorted(FIXTURE_DIR.glob("*.html"))
+    if not fixtures:
+        FIXTURE_DIR.mkdir(parents=True, exist_ok=True)
+        synthetic = FIXTURE_DIR / "synthetic.html"
+        synthetic.write_text(synthetic_listing(), encoding="utf-8")
+        fixtures = [synthetic]
+
+    table = Table(title="Anchor extraction, mean seconds per page")
+    for column in ["fixture", "anchors", "per-element", "execute_script", "speedup", "beautifulsoup"]:
+        table.add_column(column)
+
+    driver = setup_driver()
+    try:
+        for fixture in fixtures:
+            driver.get(fixture.resolve().as_uri())
+            html = fixture.read_text(encoding="utf-8")
+            slow, slow_links = _time(lambda: scrape_all_links_per_element(driver), repeats)
+            fast, fast_links = _time(lambda: scrape_all_links(driver), repeats)
+            soup, _ = _time(lambda: scrape_all_links_from_html(html, fixture.resolve().as_uri()), repeats)
+            if [l.href for l in slow_links] != [l.href for l in fast_links]:
+                print(f"[yellow]{fixture.name}: strategies disagree on hrefs[/yellow]")
+            table.add_row(
+                fixture.name, str(len(fast_links)),
+                f"{slow:.3f}", f"{fast:.3f}", f"{slow / fast:.0f}x" if fast else "-", f"{soup:.3f}",
+            )
+    finally:
+        driver.quit()
+    print(table)
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,101 @@
+"""Compare the standard and lean browser setups on page load time, bytes downloaded and memory.
+
+    uv run python -m benchmarks.driver_modes --repeats 2
+    uv run python -m benchmarks.driver_modes --url https://www.theguardian.com/technology/artificialintelligenceai
+
+Pages default to each selenium paper's first topic page. Each mode gets its own browser profile
+with the cache disabled, so neither mode is helped by what the other downloaded. A page counts
+as loaded once wait_for_page_ready returns, as in collection. Bytes are the transfer sizes the
+page's Resource Timing entries report. Cross-origin resources without Timing-Allow-Origin report 0,
+so the standard mode's bytes are understated. RSS is that of chromedriver's Chrome processes (Linux only).
+"""
+import time
+from pathlib import Path
+import typer
+from rich import print
+from rich.table import Table
+from selenium.webdriver.common.by import By
+from driver_service import DriverMode, connect_driver
+from collect_links import configure_options
+from page_ready import wait_for_page_ready
+from utils import PAPERS, ai_topic_page_maps, paper_fetch_backends, paper_page_waits, PageWait
+
+TRANSFERRED_BYTES_JS = """
+return performance.getEntriesByType("navigation").concat(performance.getEntriesByType("resource"))
+    .reduce((total, entry) => total + (entry.transferSize || 0), 0);
+"""
+
+def _children(pid: int) -> list[int]:
+    children = []
+    for stat in Path("/proc").glob("[0-9]*/stat"):
+        try:
+            fields = stat.read_text().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(stat.parent.name))
+    return children
+
+def browser_rss_mb(driver_pid: int) -> float | None:
+    """Resident memory of every process under chromedriver, None where /proc isn't available"""
+    if not Path("/proc").exists():
+        return None
+    total_kb, pending = 0, _children(driver_pid)
+    while pending:
+        pid = pending.pop()
+        pending += _children(pid)
+        try:
+            status = Path(f"/proc/{pid}/status").read_text()
+        except OSError:
+            continue
+        total_kb += next((int(line.split()[1]) for line in status.splitlines() if line.startswith("VmRSS:")), 0)
+    return total_kb / 1024
+
+def run_mode(mode: DriverMode, urls: list[tuple[str, PageWait]], repeats: int) -> tuple[list[float], list[int], list[float]]:
+    driver = connect_driver(f"benchmark-{mode}", configure_options, mode=mode)
+    seconds, transferred, rss = [], [], []
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setCacheDisabled", {"cacheDisabled": True})
+        for _ in range(repeats):
+            for url, page_wait in urls:
+                start = time.perf_counter()
+                try:
+                    driver.get(url)
+                    wait_for_page_ready(driver, (By.TAG_NAME, "a"), page_wait)
+                except Exception as e:
+                    print(f"[yellow]{mode}: {url} failed to load ({e.__class__.__name__})[/yellow]")
+                    continue
+                seconds.append(time.perf_counter() - start)
+                transferred.append(int(driver.execute_script(TRANSFERRED_BYTES_JS) or 0))
+                page_rss = browser_rss_mb(driver.service.process.pid)
+                if page_rss is not None:
+                    rss.append(page_rss)
+    finally:
+        driver.quit()
+    return seconds, transferred, rss
+
+def main(
+    url: list[str] = typer.Option([], "--url", help="Pages to load (defaults to each selenium paper's first topic page)"),
+    repeats: int = typer.Option(1, help="Times to load each page"),
+):
+    if url:
+        urls = [(u, PageWait()) for u in url]
+    else:
+        urls = [(ai_topic_page_maps[p](1), paper_page_waits[p]) for p in PAPERS if paper_fetch_backends[p] == "selenium"]
+
+    table = Table(title=f"Browser setups, {len(urls)} pages x {repeats}")
+    for column in ["mode", "pages loaded", "mean seconds", "mean KiB transferred", "peak RSS MiB"]:
+        table.add_column(column)
+    for mode in ("standard", "lean"):
+        seconds, transferred, rss = run_mode(mode, urls, repeats)
+        table.add_row(
+            mode, str(len(seconds)),
+            f"{sum(seconds) / len(seconds):.2f}" if seconds else "-",
+            f"{sum(transferred) / len(transferred) / 1024:.0f}" if transferred else "-",
+            f"{max(rss):.0f}" if rss else "-",
+        )
+    print(table)
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,81 @@
+"""Compare verbatim and span-based article extraction for tokens used and wall time.
+
+    uv run python -m benchmarks.extraction_modes --batch-id 2025-12-09 --limit 20
+
+Articles come from the raw scrapes of a batch, or a synthetic article wrapped in page
+boilerplate if no batch is given. The LLM cache is disabled, so every article costs a call.
+Each mode's output is also compared with the verbatim one, as the share of verbatim lines it kept.
+Point OPENAI_BASE_URL at stub_responses_server.py to check the plumbing without spending tokens.
+"""
+import random
+import time
+import typer
+from rich import print
+from rich.table import Table
+from llm import extract_article_text, llm_cache, llm_usage, ExtractionMode
+from utils import get_article_scrapes_for_batch, read_article_scrape
+
+def synthetic_article(seed: int = 0, paragraphs: int = 30) -> str:
+    """An article body between navigation and footer lines, as a page scrape comes out"""
+    rng = random.Random(seed)
+    words = ["government", "minister", "said", "report", "people", "week", "new", "plans", "council", "after"]
+    header = ["Skip to main content", "News", "Sport", "Culture", "Lifestyle", "Sign in", "Subscribe"]
+    body = [
+        " ".join(rng.choice(words) for _ in range(rng.randint(20, 60))).capitalize() + "."
+        for _ in range(paragraphs)
+    ]
+    footer = ["Most viewed", "About us", "Contact us", "Privacy policy", "Cookie settings", "© 2025 News Example"]
+    return "\n".join(header + ["Last modified on Tue 9 Dec 2025 02.02 EST"] + body + footer)
+
+def load_articles(batch_id: str | None, limit: int) -> list[str]:
+    if batch_id is None:
+        return [synthetic_article(seed) for seed in range(limit)]
+    texts = []
+    for path in get_article_scrapes_for_batch(batch_id):
+        scrape = read_article_scrape(path.name)
+        if scrape.success and scrape.content:
+            texts.append(scrape.content)
+        if len(texts) >= limit:
+            break
+    return texts
+
+def overlap(output: str, reference: str) -> float:
+    reference_lines = {line.strip() for line in reference.splitlines() if line.strip()}
+    if not reference_lines:
+        return 1.0
+    output_lines = {line.strip() for line in output.splitlines() if line.strip()}
+    return len(reference_lines & output_lines) / len(reference_lines)
+
+def main(
+    batch_id: str | None = typer.Option(None, "-b", "--batch-id", help="Batch whose raw article scrapes to use"),
+    limit: int = typer.Option(5, help="Number of articles"),
+):
+    texts = load_articles(batch_id, limit)
+    if not texts:
+        print(f"[red]No article scrapes found for batch {batch_id}[/red]")
+        raise typer.Exit(1)
+    llm_cache.enabled = False
+
+    table = Table(title=f"Article extraction, {len(texts)} articles")
+    for column in ["mode", "seconds", "requests", "input tokens", "output tokens", "articles", "verbatim lines kept"]:
+        table.add_column(column)
+
+    outputs: dict[ExtractionMode, list[tuple[str, bool]]] = {}
+    for mode in ("verbatim", "spans"):
+        llm_usage.reset()
+        start = time.perf_counter()
+        outputs[mode] = [extract_article_text(text, mode=mode) for text in texts]
+        seconds = time.perf_counter() - start
+        kept = [
+            overlap(content, reference) for (content, _), (reference, is_article) in zip(outputs[mode], outputs["verbatim"])
+            if is_article
+        ]
+        table.add_row(
+            mode, f"{seconds:.1f}", str(llm_usage.requests), str(llm_usage.input_tokens), str(llm_usage.output_tokens),
+            str(sum(is_article for _, is_article in outputs[mode])),
+            f"{sum(kept) / len(kept):.0%}" if kept else "-",
+        )
+    print(table)
+
+if __name__ == "__main__":
+    typer.run(main)
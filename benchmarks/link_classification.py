@@ -0,0 +1,108 @@
+"""Benchmark link merging and classification on synthetic page histories.
+
+    uv run python -m benchmarks.link_classification --links 10000 --pages 50
+
+Links are also checked against a topic page link scheme, with the previous per-call
+scheme matching for the legacy run and LinkSchemeMatcher for the indexed run.
+The previous quadratic implementation is also timed, on a smaller history by default
+since it takes minutes at full size, and its output is checked against the new one.
+"""
+import random
+import time
+import typer
+from rich import print
+from rich.table import Table
+from collect_links import merge_links, classify_links
+from utils import LinkData, LinkScheme, LinkSchemeMatcher, SmartLinkScrapeResult
+
+LINK_SCHEME: LinkScheme = lambda n: f"https://news.example/topic/artificial-intelligence?page={n}"
+
+def synthetic_history(n_links: int, n_pages: int, seed: int = 0) -> list[list[LinkData]]:
+    """Pages sharing some navigation links, with a few links on several pages and the rest on one"""
+    rng = random.Random(seed)
+    n_nav = min(50, n_links // 10)
+    n_multiple = n_links // 10
+    nav = [LinkData(text=f"Section {i}", href=f"https://news.example/section-{i}") for i in range(n_nav)]
+    pages: list[list[LinkData]] = [list(nav) for _ in range(n_pages)]
+    for page in range(n_pages):
+        pages[page].append(LinkData(text="Next", href=LINK_SCHEME(page + 2)))
+    for i in range(n_multiple):
+        link = LinkData(text=f"Popular {i}", href=f"https://news.example/popular/{i}")
+        for page in rng.sample(range(n_pages), k=min(n_pages, rng.randint(2, 4))):
+            pages[page].append(link)
+    for i in range(n_links - n_nav - n_multiple):
+        pages[i % n_pages].append(LinkData(text=f"Story {i}", href=f"https://news.example/story/{i}"))
+    return pages
+
+def legacy_merge_links(old_links: list[LinkData], new_links: list[LinkData]) -> tuple[bool, list[LinkData]]:
+    links = old_links
+    old_length = len(old_links)
+    for new_link in new_links:
+        if new_link.href in [link.href for link in links]:
+            continue
+        links.append(new_link)
+    return len(links) > old_length, links
+
+def legacy_classify(links: list[LinkData], scrape_history: list[list[LinkData]]) -> SmartLinkScrapeResult:
+    def matches_scheme(href: str, n: int):
+        for i in range(1, n+1):
+            if href in LINK_SCHEME(i) or LINK_SCHEME(i) in href:
+                return True
+        return False
+    n = len(scrape_history) + 5
+    schema_links = [l for l in links if matches_scheme(l.href, n)]
+    links = [l for l in links if not matches_scheme(l.href, n)]
+    def count_scrapes(href: str):
+        total = 0
+        for scrape in scrape_history:
+            if href in [link.href for link in scrape]:
+                total += 1
+        return total
+    return SmartLinkScrapeResult(
+        schema_links=schema_links,
+        once_links=[l for l in links if count_scrapes(l.href) == 1],
+        multiple_links=[l for l in links if 1 < count_scrapes(l.href) < len(scrape_history)],
+        all_links=[l for l in links if count_scrapes(l.href) == len(scrape_history)],
+    )
+
+def run(history: list[list[LinkData]], legacy: bool) -> tuple[float, SmartLinkScrapeResult]:
+    start = time.perf_counter()
+    links: list[LinkData] = []
+    seen_hrefs: set[str] = set()
+    for page in history:
+        if legacy:
+            _, links = legacy_merge_links(links, page)
+        else:
+            _, links = merge_links(links, page, seen_hrefs)
+    if legacy:
+        result = legacy_classify(links, history)
+    else:
+        matcher = LinkSchemeMatcher(LINK_SCHEME, len(history) + 5)
+        result = classify_links(links, history, matcher.matches)
+    return time.perf_counter() - start, result
+
+def main(
+    links: int = typer.Option(10_000, help="Distinct links across the history"),
+    pages: int = typer.Option(50, help="Pages in the history"),
+    legacy_links: int = typer.Option(1_000, help="Distinct links for the legacy comparison"),
+    legacy_pages: int = typer.Option(10, help="Pages for the legacy comparison"),
+):
+    table = Table(title="Merge and classify")
+    for column in ["implementation", "links", "pages", "seconds", "schema", "once", "multiple", "all"]:
+        table.add_column(column)
+
+    small = synthetic_history(legacy_links, legacy_pages)
+    for name, legacy in [("legacy", True), ("indexed", False)]:
+        seconds, result = run(small, legacy)
+        table.add_row(name, str(legacy_links), str(legacy_pages), f"{seconds:.3f}", str(len(result.schema_links)),
+                      str(len(result.once_links)), str(len(result.multiple_links)), str(len(result.all_links)))
+    if run(small, True)[1] != run(small, False)[1]:
+        print("[red]Legacy and indexed classifications differ[/red]")
+
+    seconds, result = run(synthetic_history(links, pages), legacy=False)
+    table.add_row("indexed", str(links), str(pages), f"{seconds:.3f}", str(len(result.schema_links)),
+                  str(len(result.once_links)), str(len(result.multiple_links)), str(len(result.all_links)))
+    print(table)
+
+if __name__ == "__main__":
+    typer.run(main)
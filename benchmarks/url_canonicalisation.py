@@ -0,0 +1,46 @@
+"""Check canonicalize_url against the corpus of article URL variants in data/url_variants.json.
+
+    uv run python -m benchmarks.url_canonicalisation
+
+Every variant of an article should canonicalise to the one URL the paper uses for it, so it
+is scraped once. Reports, per paper, how many distinct URLs the variants came to before and
+after, and exits non-zero listing any variant which doesn't reach its canonical URL.
+"""
+import json
+from pathlib import Path
+import typer
+from rich import print
+from rich.table import Table
+from utils import Paper, canonicalize_url
+
+CORPUS_PATH = Path("data/url_variants.json")
+
+def main(corpus: Path = typer.Option(CORPUS_PATH, help="JSON list of {paper, canonical, variants}")):
+    articles = json.loads(corpus.read_text())
+    table = Table(title=f"URL canonicalisation, {len(articles)} articles")
+    for column in ["paper", "variants", "distinct before", "distinct after"]:
+        table.add_column(column)
+
+    failures: list[tuple[Paper, str, str, str]] = []
+    for article in articles:
+        paper: Paper = article["paper"]
+        canonicals = set()
+        for variant in article["variants"]:
+            canonical = canonicalize_url(variant, paper)
+            canonicals.add(canonical)
+            if canonical != article["canonical"]:
+                failures.append((paper, variant, canonical, article["canonical"]))
+            # Rules found by host should agree with the paper's
+            if canonicalize_url(variant) != canonical:
+                failures.append((paper, variant, canonicalize_url(variant), canonical))
+        table.add_row(paper, str(len(article["variants"])), str(len(set(article["variants"]))), str(len(canonicals)))
+    print(table)
+
+    for paper, variant, got, expected in failures:
+        print(f"[red]✗ {paper}: {variant}\n    gave     {got}\n    expected {expected}[/red]")
+    if failures:
+        raise typer.Exit(1)
+    print("[green]✓ Every variant canonicalises to its article's URL[/green]")
+
+if __name__ == "__main__":
+    typer.run(main)
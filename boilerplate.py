@@ -0,0 +1,54 @@
+import threading
+from collections import Counter
+from utils import Paper, canonicalize_url, read_article_scrape, recent_scrape_filenames
+
+# A line is boilerplate if it recurs in at least this fraction of a paper's scrapes
+MIN_FRACTION = 0.3
+# Too few scrapes and ordinary phrases look like boilerplate, so don't learn anything below this
+MIN_SCRAPES = 5
+# The most recent scrapes are enough to learn from, and keep learning quick
+SAMPLE_LIMIT = 300
+
+_boilerplate_cache: dict[Paper, set[str]] = {}
+_cache_lock = threading.Lock()
+
+def _distinct_lines(content: str) -> set[str]:
+    return {line.strip() for line in content.splitlines() if line.strip()}
+
+def learn_boilerplate(paper: Paper, min_fraction: float = MIN_FRACTION, sample_limit: int = SAMPLE_LIMIT) -> set[str]:
+    """Learn the lines (navigation, cookie banners, footers...) that recur across a paper's raw scrapes.
+    Each article counts once, however many batches its scrape was reused in."""
+    line_counts: Counter[str] = Counter()
+    seen_urls: set[str] = set()
+    for filename in recent_scrape_filenames("articles_raw", paper, sample_limit):
+        try:
+            scrape = read_article_scrape(filename)
+        except (OSError, ValueError):
+            continue
+        if not scrape.success or not scrape.content:
+            continue
+        url = canonicalize_url(scrape.url, paper)
+        if url in seen_urls:
+            continue
+        seen_urls.add(url)
+        line_counts.update(_distinct_lines(scrape.content))
+
+    n_scrapes = len(seen_urls)
+    if n_scrapes < MIN_SCRAPES:
+        return set()
+    # However small the fraction, a line must recur in MIN_SCRAPES distinct articles to be boilerplate
+    threshold = max(MIN_SCRAPES, min_fraction * n_scrapes)
+    return {line for line, count in line_counts.items() if count >= threshold}
+
+def boilerplate_for_paper(paper: Paper) -> set[str]:
+    """learn_boilerplate, learnt once per paper per process"""
+    with _cache_lock:
+        if paper not in _boilerplate_cache:
+            _boilerplate_cache[paper] = learn_boilerplate(paper)
+        return _boilerplate_cache[paper]
+
+def strip_boilerplate(content: str, boilerplate: set[str]) -> str:
+    """Remove boilerplate lines, falling back to the original if nothing would be left"""
+    kept = [line for line in content.splitlines() if line.strip() not in boilerplate]
+    stripped = "\n".join(kept).strip()
+    return stripped or content
@@ -1,27 +1,125 @@
+import asyncio
+import queue
+import threading
+import time
 import typer
+from datetime import datetime, timedelta
 from pathlib import Path
 from rich import print as rprint
-from collect_links import setup_driver, smart_collect_link_scheme
+from rich.table import Table
+from collect_links import setup_driver, setup_session, setup_fetcher, paper_backend, smart_collect_link_scheme, previous_link_hrefs
 from utils import (
-    ai_topic_page_maps,glob_articles, glob_links, PAPERS, Paper, get_batch_id, parse_link_scrape_filename,
+    ai_topic_page_maps, paper_page_waits, FetchBackend, glob_articles, glob_links, PAPERS, Paper, get_batch_id, parse_link_scrape_filename,
     parse_article_scrape_filename, clean_link_scrape_exists, article_scrape_exists,
     clean_article_scrape_exists, get_link_scrapes_for_batch, get_clean_link_scrapes_for_batch,
     get_article_scrapes_for_batch, get_clean_article_scrapes_for_batch,
     read_link_scrape, write_clean_link_scrape, read_clean_link_scrape,
     read_article_scrape, write_article_scrape, write_clean_article_scrape,
     read_clean_article_scrape, article_scrape_filename, link_scrape_filename,
-    write_link_scrape, LINK_SCRAPE_DIR,
-    CLEAN_LINK_SCRAPE_DIR, ARTICLE_SCRAPE_DIR, CLEAN_ARTICLE_SCRAPE_DIR
+    write_link_scrape, Scrape, ScrapeData, SmartLinkScrapeResult, LinkData, LINK_SCRAPE_DIR,
+    CLEAN_LINK_SCRAPE_DIR, ARTICLE_SCRAPE_DIR, CLEAN_ARTICLE_SCRAPE_DIR,
+    get_store, open_store, StorageBackend, SCRAPE_STAGES, SCRAPE_DB_PATH,
+    find_previous_scrape, copy_article_scrape, write_link_decisions,
 )
-from llm import filter_links, extract_article_text
+from storage import migrate_scrapes
+from batch_export import Compression, EXPORT_DIR, export_batch as _export_batch
+from llm import (
+    extract_article_text, extract_article_text_async, llm_cache, estimate_tokens,
+    links_request, link_candidates, filtered_links_result, extraction_request, extraction_result,
+    llm_usage, ExtractionMode, FilteredLinks, request_link_filter,
+)
+from offline_batch import BatchClient, finish_offline_batch, run_offline_batch
+from boilerplate import boilerplate_for_paper, strip_boilerplate
+from link_prefilter import PrefilterResult, prefilter_links
+from near_dup import DEFAULT_THRESHOLD, DuplicatePlan, index_articles, plan_cleaning
+from rate_limit import RateLimiter
 from scrape_from_archive import scrape_from_archive, setup_driver as setup_archive_driver
-from typing import Optional
+from archive_resolver import snapshot_resolver
+from driver_pool import run_driver_pool, run_driver_pools, start_driver_pool, wait_for_queue, driver_alive
+from driver_service import STATE_PATH, DriverMode, browser_settings, run_service, service_status
+from typing import Any, Callable, Literal, Optional
+
+CleanMode = Literal["online", "offline"]
+# LLM rate limits when cleaning articles concurrently
+DEFAULT_RPM = 500
+DEFAULT_TPM = 500_000
 
 app = typer.Typer(help="News website scraping app using Selenium. Collect links, process these then scrape them.")
 
 # Internal helper functions (not CLI commands)
-def _batch_clean_links_impl(batch_id: str, force: bool = False):
-    """Internal implementation of batch_clean_links"""
+def _prefilter_link_scrape(filename: str, scrape_result: SmartLinkScrapeResult, prefilter: bool = True) -> PrefilterResult:
+    """Decide what we can about a link scrape's candidates locally, reporting how much was decided"""
+    paper, _, _ = parse_link_scrape_filename(filename)
+    pre = prefilter_links(paper if prefilter else None, scrape_result)
+    if prefilter and paper is not None:
+        rprint(
+            f"[dim]Decided {pre.decided_fraction:.0%} of {len(pre.candidates)} links locally for {paper} "
+            f"({len(pre.accepted)} accepted, {len(pre.rejected)} rejected, {len(pre.ambiguous)} left for the LLM)[/dim]"
+        )
+    return pre
+
+def _record_link_decisions(filename: str, asked: SmartLinkScrapeResult, parsed: FilteredLinks | None):
+    """Keep what the LLM decided about the links it was asked about, for the prefilter to learn from"""
+    if parsed is not None:
+        write_link_decisions(link_candidates(asked), filtered_links_result(parsed, asked), filename)
+
+def _filter_link_scrape(filename: str, scrape_result: SmartLinkScrapeResult, prefilter: bool = True) -> list[LinkData]:
+    """Filter a link scrape down to article links, only asking the LLM about links the prefilter can't decide"""
+    if not prefilter:
+        parsed = request_link_filter(scrape_result)
+        _record_link_decisions(filename, scrape_result, parsed)
+        return filtered_links_result(parsed, scrape_result)
+    pre = _prefilter_link_scrape(filename, scrape_result)
+    if not pre.ambiguous:
+        return pre.combine([])
+    parsed = request_link_filter(pre.remainder())
+    _record_link_decisions(filename, pre.remainder(), parsed)
+    return pre.combine(filtered_links_result(parsed, pre.remainder()))
+
+def _batch_clean_links_offline(
+    filenames: list[str], batch_id: str, batch_client: BatchClient | None, poll_interval: float, prefilter: bool = True,
+) -> tuple[int, int]:
+    """Filter every link scrape in one Batch API job, then write the results"""
+    prefiltered: dict[str, PrefilterResult] = {}
+    error_count = 0
+    for filename in filenames:
+        try:
+            prefiltered[filename] = _prefilter_link_scrape(filename, read_link_scrape(filename), prefilter)
+        except Exception as e:
+            rprint(f"[red]✗ Error reading link scrape {filename}: {e}[/red]")
+            error_count += 1
+    
+    requests = {
+        filename: links_request(link_candidates(pre.remainder()))
+        for filename, pre in prefiltered.items() if pre.ambiguous
+    }
+    results = run_offline_batch(batch_id, "links", requests, batch_client, poll_interval)
+    
+    success_count = 0
+    for filename, pre in prefiltered.items():
+        if filename in requests and filename not in results:
+            continue
+        paper, _, _ = parse_link_scrape_filename(filename)
+        llm_links = []
+        if filename in results:
+            _record_link_decisions(filename, pre.remainder(), results[filename])  # type: ignore[arg-type]
+            llm_links = filtered_links_result(results[filename], pre.remainder())  # type: ignore[arg-type]
+        filtered_links = pre.combine(llm_links)
+        write_clean_link_scrape(filtered_links, filename)
+        rprint(f"[green]✓ Cleaned {len(filtered_links)} links for {paper}[/green]")
+        success_count += 1
+    finish_offline_batch(batch_id, "links")
+    error_count += len(requests) - len(results)
+    return success_count, error_count
+
+def _batch_clean_links_impl(
+    batch_id: str, force: bool = False, mode: CleanMode = "online",
+    batch_client: BatchClient | None = None, poll_interval: float = 60, prefilter: bool = True,
+):
+    """Internal implementation of batch_clean_links
+    
+    In offline mode the links are filtered through the Batch API, batch_client can be swapped for a fake.
+    With prefilter, obvious article and non-article links are decided by URL rules without the LLM."""
     rprint(f"[blue]Processing batch: {batch_id}[/blue]")
     
     # Get all link scrapes for this batch
@@ -43,6 +141,13 @@ def _batch_clean_links_impl(batch_id: str, force: bool = False):
         rprint(f"[green]All link scrapes already cleaned for batch {batch_id}[/green]")
         return
     
+    if mode == "offline":
+        success_count, error_count = _batch_clean_links_offline(
+            [p.name for p in link_scrapes], batch_id, batch_client, poll_interval, prefilter
+        )
+        rprint(f"\n[blue]Batch cleaning complete: {success_count} succeeded, {error_count} failed[/blue]")
+        return
+    
     # Process each link scrape
     success_count = 0
     error_count = 0
@@ -54,7 +159,7 @@ def _batch_clean_links_impl(batch_id: str, force: bool = False):
         rprint(f"[cyan]Cleaning links for {paper} (page_limit={page_limit})...[/cyan]")
         try:
             scrape_result = read_link_scrape(filename)
-            filtered_links = filter_links(scrape_result)
+            filtered_links = _filter_link_scrape(filename, scrape_result, prefilter)
             write_clean_link_scrape(filtered_links, filename)
             rprint(f"[green]✓ Cleaned {len(filtered_links)} links for {paper}[/green]")
             success_count += 1
@@ -64,14 +169,57 @@ def _batch_clean_links_impl(batch_id: str, force: bool = False):
             # Continue with next scrape instead of failing completely
     
     rprint(f"\n[blue]Batch cleaning complete: {success_count} succeeded, {error_count} failed[/blue]")
+    rprint(f"[blue]{llm_cache.summary()}[/blue]")
+
+def _reuse_previous_scrape(url: str, filename: str, rescrape_after: float | None = None) -> bool:
+    """Copy an earlier batch's successful scrape of the same article into this batch, instead of scraping it again.
+    Returns False if there is none, or it is older than rescrape_after days"""
+    previous = find_previous_scrape(url)
+    if previous is None or previous.filename == filename:
+        return False
+    if rescrape_after is not None and datetime.now() - previous.written_at > timedelta(days=rescrape_after):
+        return False
+    try:
+        copy_article_scrape(previous.filename, filename)
+    except OSError as e:
+        # The earlier batch was deleted, scraping the article again indexes the new scrape instead
+        rprint(f"[yellow]Can't reuse {previous.filename} ({e.__class__.__name__}), scraping {url} again[/yellow]")
+        return False
+    return True
 
-def _batch_archive_scrape_articles_impl(batch_id: str, force: bool = False, article_limit: int | None = None):
+def _scrape_article(driver, paper: Paper, url: str, batch_id: str) -> bool:
+    """Scrape an article from the archive into the batch, returning whether it succeeded.
+    Raises if the driver died, so the pool respawns it and retries the article"""
+    scrapes = scrape_from_archive(driver, url)
+    if not (scrapes and scrapes[0].success) and not driver_alive(driver):
+        raise RuntimeError(f"Driver died while scraping {url}")
+    # Failed scrapes are saved too
+    if scrapes:
+        write_article_scrape(scrapes[0], article_scrape_filename(paper, url, batch_id=batch_id))
+    if scrapes and scrapes[0].success:
+        rprint(f"[green]✓ Scraped {url[:60]} ({len(scrapes[0].content)} chars)[/green]")
+        return True
+    rprint(f"[red]✗ Failed to scrape {url}[/red]")
+    return False
+
+def _save_failed_scrape(paper: Paper, url: str, batch_id: str, e: Exception):
+    """Save an article the driver pool gave up on as a failed scrape"""
+    rprint(f"[red]✗ Error scraping {url}: {e}[/red]")
+    write_article_scrape(Scrape(url=url, content="", success=False), article_scrape_filename(paper, url, batch_id=batch_id))
+
+def _batch_archive_scrape_articles_impl(
+    batch_id: str, force: bool = False, article_limit: int | None = None, workers: int = 1,
+    reuse: bool = True, rescrape_after: float | None = None,
+):
     """Internal implementation of batch_archive_scrape_articles
     
     Args:
         batch_id: Batch ID to process
         force: Force re-scraping even if files exist
         article_limit: Limit number of articles to scrape per paper (None = no limit)
+        workers: Number of browser drivers scraping in parallel
+        reuse: Copy articles already scraped in an earlier batch instead of scraping them again
+        rescrape_after: Scrape reused articles again once their earlier scrape is this many days old
     """
     rprint(f"[blue]Processing batch: {batch_id}[/blue]")
     if article_limit:
@@ -87,6 +235,7 @@ def _batch_archive_scrape_articles_impl(batch_id: str, force: bool = False, arti
     
     # Collect all links to scrape, limiting per paper if requested
     all_links_to_scrape: list[tuple[Paper, str]] = []
+    reused = 0
     for clean_link_path in clean_link_scrapes:
         filename = clean_link_path.name
         paper, _, _ = parse_link_scrape_filename(filename)
@@ -104,56 +253,209 @@ def _batch_archive_scrape_articles_impl(batch_id: str, force: bool = False, arti
                 
                 article_filename = article_scrape_filename(paper, link.href, batch_id=batch_id)
                 if force or not article_scrape_exists(article_filename):
-                    all_links_to_scrape.append((paper, link.href))
+                    if not force and reuse and _reuse_previous_scrape(link.href, article_filename, rescrape_after):
+                        reused += 1
+                    else:
+                        all_links_to_scrape.append((paper, link.href))
                     paper_count += 1
         except Exception as e:
             rprint(f"[red]Error reading clean links from {filename}: {e}[/red]")
             continue
     
+    if reused:
+        rprint(f"[green]Reused {reused} articles already scraped in earlier batches[/green]")
     if not all_links_to_scrape:
         rprint(f"[green]All articles already scraped for batch {batch_id}[/green]")
         return
     
-    rprint(f"[blue]Found {len(all_links_to_scrape)} articles to scrape[/blue]")
+    rprint(f"[blue]Found {len(all_links_to_scrape)} articles to scrape with {workers} worker(s)[/blue]")
     
-    # Setup driver once for batch
-    driver = setup_archive_driver()
-    success_count = 0
-    error_count = 0
+    # Each worker owns one driver and pulls articles from a shared queue
+    total = len(all_links_to_scrape)
+    counts = {"started": 0, "success": 0, "error": 0}
+    counts_lock = threading.Lock()
     
-    try:
-        for i, (paper, url) in enumerate(all_links_to_scrape, 1):
-            filename = article_scrape_filename(paper, url, batch_id=batch_id)
-            rprint(f"[cyan][{i}/{len(all_links_to_scrape)}] Scraping {paper}: {url[:60]}...[/cyan]")
-            
+    def scrape_one(driver, job: tuple[Paper, str]):
+        paper, url = job
+        with counts_lock:
+            counts["started"] += 1
+            i = counts["started"]
+        rprint(f"[cyan][{i}/{total}] Scraping {paper}: {url[:60]}...[/cyan]")
+        success = _scrape_article(driver, paper, url, batch_id)
+        with counts_lock:
+            counts["success" if success else "error"] += 1
+    
+    def scrape_failed(job: tuple[Paper, str], e: Exception):
+        _save_failed_scrape(*job, batch_id, e)
+        with counts_lock:
+            counts["error"] += 1
+    
+    run_driver_pool(all_links_to_scrape, scrape_one, setup_archive_driver, workers=workers, on_error=scrape_failed)
+    
+    rprint(f"\n[blue]Batch scraping complete: {counts['success']} succeeded, {counts['error']} failed[/blue]")
+    rprint(f"[blue]{snapshot_resolver.summary()}[/blue]")
+
+def _strip_article_boilerplate(scrape: Scrape, filename: str) -> Scrape:
+    """Remove lines that recur across the paper's scrapes before they are sent to the LLM"""
+    paper, _ = parse_article_scrape_filename(filename)
+    if paper is None:
+        return scrape
+    stripped = strip_boilerplate(scrape.content, boilerplate_for_paper(paper))
+    saved = estimate_tokens(scrape.content) - estimate_tokens(stripped)
+    if saved > 0:
+        rprint(f"[dim]Stripped boilerplate from {filename}, ~{saved} tokens saved ({len(scrape.content)} → {len(stripped)} chars)[/dim]")
+    return scrape.model_copy(update={"content": stripped})
+
+def _load_scrape_for_cleaning(filename: str, strip: bool = True) -> Scrape | None:
+    """Read an article scrape, returning None (and saying why) if there is nothing to clean"""
+    scrape = read_article_scrape(filename)
+    if not scrape.success:
+        rprint(f"[yellow]Skipping failed scrape: {filename}[/yellow]")
+        return None
+    if not scrape.content:
+        rprint(f"[yellow]Skipping empty scrape: {filename}[/yellow]")
+        return None
+    if strip:
+        scrape = _strip_article_boilerplate(scrape, filename)
+    return scrape
+
+def _save_clean_article(scrape: Scrape, cleaned_content: str, is_article: bool, filename: str) -> bool:
+    """Write a cleaned article, returning False if the LLM judged it not to be an article"""
+    if not is_article:
+        rprint(f"[yellow]⚠ Skipping non-article (listing/navigation page): {filename}[/yellow]")
+        return False
+    clean_scrape = ScrapeData(url=scrape.url, content=cleaned_content, is_article=is_article)
+    write_clean_article_scrape(clean_scrape, filename)
+    rprint(f"[green]✓ Cleaned article ({len(cleaned_content)} chars)[/green]")
+    return True
+
+def _clean_article(filename: str, strip: bool = True, extraction_mode: ExtractionMode = "verbatim") -> bool:
+    """Clean one article with the LLM, returning False if it was skipped"""
+    scrape = _load_scrape_for_cleaning(filename, strip)
+    if scrape is None:
+        return False
+    rprint(f"[cyan]Cleaning article: {filename}...[/cyan]")
+    cleaned_content, is_article = extract_article_text(scrape.content, mode=extraction_mode)
+    return _save_clean_article(scrape, cleaned_content, is_article, filename)
+
+def _lookback_batch_ids(batch_id: str, lookback: int) -> list[str]:
+    """The batch and up to lookback batches before it"""
+    earlier = [other for other in sorted(get_store().batch_ids()) if other < batch_id]
+    return (earlier[-lookback:] if lookback else []) + [batch_id]
+
+def _near_duplicate_clusters(batch_id: str, lookback: int, threshold: float, strip: bool = True) -> tuple[list[list[str]], int]:
+    """Clusters of near-duplicate raw articles in a batch and the batches before it, and the number of articles indexed"""
+    filenames = [
+        path.name for other in _lookback_batch_ids(batch_id, lookback) for path in get_article_scrapes_for_batch(other)
+    ]
+    index = index_articles(filenames, threshold, strip)
+    return index.clusters(), len(index.signatures)
+
+def _plan_near_duplicates(filenames: list[str], batch_id: str, lookback: int, threshold: float, strip: bool = True) -> DuplicatePlan:
+    start = time.monotonic()
+    clusters, n_indexed = _near_duplicate_clusters(batch_id, lookback, threshold, strip)
+    plan = plan_cleaning(filenames, clusters, clean_article_scrape_exists)
+    rprint(
+        f"[blue]Indexed {n_indexed} articles in {time.monotonic() - start:.1f}s, {len(plan.derived)} of {len(filenames)} "
+        f"to clean are near-duplicates and will be derived from another article[/blue]"
+    )
+    return plan
+
+def _derive_near_duplicates(derived: dict[str, str]) -> tuple[int, int]:
+    """Write each near-duplicate's clean article from its representative's, returning (derived, skipped)"""
+    derived_count = skipped_count = 0
+    for filename, representative in derived.items():
+        if not clean_article_scrape_exists(representative):
+            # The representative failed or wasn't an article, the duplicate is left to clean another time
+            skipped_count += 1
+            continue
+        clean = read_clean_article_scrape(representative)
+        url = read_article_scrape(filename).url
+        write_clean_article_scrape(
+            ScrapeData(url=url, content=clean.content, is_article=clean.is_article, duplicate_of=representative), filename,
+        )
+        derived_count += 1
+    return derived_count, skipped_count
+
+async def _clean_articles_async(
+    filenames: list[str], concurrency: int, requests_per_minute: float, tokens_per_minute: float, strip: bool = True,
+    extraction_mode: ExtractionMode = "verbatim",
+) -> tuple[int, int, int]:
+    """Clean articles concurrently, writing each one as soon as it completes"""
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+    counts = {"success": 0, "error": 0, "skipped": 0}
+    
+    async def clean_one(filename: str):
+        async with semaphore:
             try:
-                scrapes = scrape_from_archive(driver, url)
-                
-                if scrapes and scrapes[0].success:
-                    write_article_scrape(scrapes[0], filename)
-                    rprint(f"[green]✓ Successfully scraped ({len(scrapes[0].content)} chars)[/green]")
-                    success_count += 1
+                scrape = _load_scrape_for_cleaning(filename, strip)
+                if scrape is None:
+                    counts["skipped"] += 1
+                    return
+                rprint(f"[cyan]Cleaning article: {filename}...[/cyan]")
+                cleaned_content, is_article = await extract_article_text_async(scrape.content, limiter, mode=extraction_mode)
+                if _save_clean_article(scrape, cleaned_content, is_article, filename):
+                    counts["success"] += 1
                 else:
-                    rprint(f"[red]✗ Failed to scrape[/red]")
-                    # Save failed scrape
-                    if scrapes:
-                        write_article_scrape(scrapes[0], filename)
-                    error_count += 1
+                    counts["skipped"] += 1
             except Exception as e:
-                rprint(f"[red]✗ Error scraping {url}: {e}[/red]")
-                # Save failed scrape
-                from utils import Scrape
-                failed_scrape = Scrape(url=url, content="", success=False)
-                write_article_scrape(failed_scrape, filename)
-                error_count += 1
-                # Continue with next article instead of failing completely
-    finally:
-        driver.quit()
+                rprint(f"[red]✗ Error cleaning article {filename}: {e}[/red]")
+                counts["error"] += 1
+    
+    await asyncio.gather(*(clean_one(filename) for filename in filenames))
+    return counts["success"], counts["error"], counts["skipped"]
+
+def _clean_articles_offline(
+    filenames: list[str], batch_id: str, batch_client: BatchClient | None, poll_interval: float, strip: bool = True,
+    extraction_mode: ExtractionMode = "verbatim",
+) -> tuple[int, int, int]:
+    """Clean every article in one Batch API job, then write the results"""
+    scrapes: dict[str, Scrape] = {}
+    error_count = 0
+    skipped_count = 0
+    for filename in filenames:
+        try:
+            scrape = _load_scrape_for_cleaning(filename, strip)
+        except Exception as e:
+            rprint(f"[red]✗ Error reading article {filename}: {e}[/red]")
+            error_count += 1
+            continue
+        if scrape is None:
+            skipped_count += 1
+        else:
+            scrapes[filename] = scrape
     
-    rprint(f"\n[blue]Batch scraping complete: {success_count} succeeded, {error_count} failed[/blue]")
+    requests = {filename: extraction_request(scrape.content, extraction_mode) for filename, scrape in scrapes.items()}
+    results = run_offline_batch(batch_id, "articles", requests, batch_client, poll_interval)
+    
+    success_count = 0
+    for filename, parsed in results.items():
+        scrape = scrapes[filename]
+        cleaned_content, is_article = extraction_result(parsed, scrape.content, extraction_mode)
+        if _save_clean_article(scrape, cleaned_content, is_article, filename):
+            success_count += 1
+        else:
+            skipped_count += 1
+    finish_offline_batch(batch_id, "articles")
+    error_count += len(requests) - len(results)
+    return success_count, error_count, skipped_count
 
-def _batch_clean_articles_impl(batch_id: str, force: bool = False):
-    """Internal implementation of batch_clean_articles"""
+def _batch_clean_articles_impl(
+    batch_id: str, force: bool = False, concurrency: int = 1,
+    requests_per_minute: float = DEFAULT_RPM, tokens_per_minute: float = DEFAULT_TPM,
+    mode: CleanMode = "online", batch_client: BatchClient | None = None, poll_interval: float = 60,
+    strip: bool = True, extraction_mode: ExtractionMode = "verbatim",
+    near_dup: bool = False, near_dup_threshold: float = DEFAULT_THRESHOLD, near_dup_lookback: int = 7,
+):
+    """Internal implementation of batch_clean_articles
+    
+    With concurrency above 1, articles are cleaned with the async client under request and token rate limits.
+    In offline mode they are cleaned through the Batch API, batch_client can be swapped for a fake.
+    Unless strip is False, each paper's learnt boilerplate lines are removed before cleaning.
+    extraction_mode "spans" has the LLM pick out paragraphs rather than rewrite the article.
+    With near_dup, only one article of each cluster of near-duplicates (in this batch and up to
+    near_dup_lookback batches before it) goes to the LLM, and the rest copy its clean article."""
     rprint(f"[blue]Processing batch: {batch_id}[/blue]")
     
     # Get all article scrapes for this batch
@@ -175,64 +477,251 @@ def _batch_clean_articles_impl(batch_id: str, force: bool = False):
         rprint(f"[green]All articles already cleaned for batch {batch_id}[/green]")
         return
     
+    filenames = [p.name for p in article_scrapes]
+    derived: dict[str, str] = {}
+    if near_dup:
+        plan = _plan_near_duplicates(filenames, batch_id, near_dup_lookback, near_dup_threshold, strip)
+        filenames, derived = plan.to_clean, plan.derived
+    
+    if mode == "offline":
+        success_count, error_count, skipped_count = _clean_articles_offline(
+            filenames, batch_id, batch_client, poll_interval, strip, extraction_mode,
+        )
+        _report_clean_articles(success_count, error_count, skipped_count, derived)
+        rprint(f"[blue]{llm_usage.summary()}[/blue]")
+        return
+    if concurrency > 1:
+        rprint(f"[blue]Cleaning with up to {concurrency} concurrent requests[/blue]")
+        success_count, error_count, skipped_count = asyncio.run(
+            _clean_articles_async(filenames, concurrency, requests_per_minute, tokens_per_minute, strip, extraction_mode)
+        )
+        _report_clean_articles(success_count, error_count, skipped_count, derived)
+        rprint(f"[blue]{llm_cache.summary()}[/blue]")
+        rprint(f"[blue]{llm_usage.summary()}[/blue]")
+        return
+    
     # Process each article scrape
     success_count = 0
     error_count = 0
     skipped_count = 0
     
-    for article_scrape_path in article_scrapes:
-        filename = article_scrape_path.name
-        
+    for filename in filenames:
         try:
-            scrape = read_article_scrape(filename)
-            
-            if not scrape.success:
-                rprint(f"[yellow]Skipping failed scrape: {filename}[/yellow]")
-                skipped_count += 1
-                continue
-            
-            if not scrape.content:
-                rprint(f"[yellow]Skipping empty scrape: {filename}[/yellow]")
+            if _clean_article(filename, strip, extraction_mode):
+                success_count += 1
+            else:
                 skipped_count += 1
-                continue
-            
-            rprint(f"[cyan]Cleaning article: {filename}...[/cyan]")
-            cleaned_content, is_article = extract_article_text(scrape.content)
-            
-            if not is_article:
-                rprint(f"[yellow]⚠ Skipping non-article (listing/navigation page): {filename}[/yellow]")
-                skipped_count += 1
-                continue
-            
-            from utils import ScrapeData
-            clean_scrape = ScrapeData(url=scrape.url, content=cleaned_content, is_article=is_article)
-            write_clean_article_scrape(clean_scrape, filename)
-            
-            rprint(f"[green]✓ Cleaned article ({len(cleaned_content)} chars)[/green]")
-            success_count += 1
         except Exception as e:
             rprint(f"[red]✗ Error cleaning article {filename}: {e}[/red]")
             error_count += 1
             # Continue with next article instead of failing completely
     
-    rprint(f"\n[blue]Batch cleaning complete: {success_count} succeeded, {error_count} failed, {skipped_count} skipped[/blue]")
+    _report_clean_articles(success_count, error_count, skipped_count, derived)
+    rprint(f"[blue]{llm_cache.summary()}[/blue]")
+    rprint(f"[blue]{llm_usage.summary()}[/blue]")
 
-def _batch_collect_papers_impl(page_limit: int, batch_id: str):
-    """Internal implementation of batch_collect_papers"""
-    driver = setup_driver()
-    try:
-        for paper in PAPERS:
-            rprint(f"[cyan]Collecting links for {paper}...[/cyan]")
+def _report_clean_articles(success_count: int, error_count: int, skipped_count: int, derived: dict[str, str]):
+    """Derive the near-duplicates once their representatives are cleaned, and print the totals"""
+    summary = f"{success_count} succeeded, {error_count} failed, {skipped_count} skipped"
+    if derived:
+        derived_count, waiting_count = _derive_near_duplicates(derived)
+        summary += f", {derived_count} derived from near-duplicates ({waiting_count} without a cleaned representative)"
+    rprint(f"\n[blue]Batch cleaning complete: {summary}[/blue]")
+
+def _configure_snapshot_lookup(no_snapshot_lookup: bool, rescrape_after: float | None = None):
+    snapshot_resolver.enabled = not no_snapshot_lookup
+    if rescrape_after is not None:
+        # Articles scraped again for being stale should get a newer snapshot if there is one
+        snapshot_resolver.max_age = min(snapshot_resolver.max_age, timedelta(days=rescrape_after))
+
+def _set_driver_mode(driver_mode: DriverMode | None):
+    if driver_mode is not None:
+        browser_settings.mode = driver_mode
+
+def _known_hrefs(paper: Paper, batch_id: str, incremental: bool) -> set[str] | None:
+    """Links from the paper's previous batch for incremental collection, None to collect every page"""
+    if not incremental:
+        return None
+    known_hrefs = previous_link_hrefs(paper, batch_id)
+    if known_hrefs is None:
+        rprint(f"[yellow]No previous link scrape for {paper}, collecting up to the page limit[/yellow]")
+    return known_hrefs
+
+def _collection_pools(backend: FetchBackend | None = None) -> list[tuple[list[Paper], Callable[[], Any]]]:
+    """Papers to collect over HTTP sessions and with browsers, for run_driver_pools to collect at the same time"""
+    return [
+        ([paper for paper in PAPERS if paper_backend(paper, backend) == "http"], setup_session),
+        ([paper for paper in PAPERS if paper_backend(paper, backend) == "selenium"], setup_driver),
+    ]
+
+def _collect_paper(driver, paper: Paper, page_limit: int, batch_id: str, incremental: bool = False) -> str:
+    """Collect a paper's links with a driver or HTTP session, returning the link scrape's filename"""
+    rprint(f"[cyan]Collecting links for {paper}...[/cyan]")
+    links = smart_collect_link_scheme(
+        driver, ai_topic_page_maps[paper], page_limit, paper_page_waits[paper], _known_hrefs(paper, batch_id, incremental),
+    )
+    filename = link_scrape_filename(paper, page_limit, batch_id=batch_id)
+    write_link_scrape(links, filename)
+    rprint(f"[green]✓ Collected {len(links.once_links)} links for {paper}[/green]")
+    return filename
+
+def _collect_failed(paper: Paper, e: Exception):
+    # Other papers carry on
+    rprint(f"[red]✗ Error collecting links for {paper}: {e}[/red]")
+
+def _batch_collect_papers_impl(
+    page_limit: int, batch_id: str, concurrency: int = 1, backend: FetchBackend | None = None, incremental: bool = False,
+):
+    """Internal implementation of batch_collect_papers
+    
+    Each paper is its own domain, so up to `concurrency` papers are collected at once,
+    each on its own driver or HTTP session. Requests within a paper are spaced by its politeness delay.
+    Server-rendered papers are fetched over HTTP while the rest are fetched with browsers.
+    If incremental, each paper stops at the first page holding only links from its previous batch."""
+    def collect_paper(driver, paper: Paper):
+        _collect_paper(driver, paper, page_limit, batch_id, incremental)
+    
+    run_driver_pools(_collection_pools(backend), collect_paper, workers=concurrency, on_error=_collect_failed)
+
+def _stream_batch_impl(
+    page_limit: int, batch_id: str, force: bool = False, article_limit: int | None = None,
+    collect_concurrency: int = 1, link_workers: int = 2, scrape_workers: int = 1, clean_workers: int = 1,
+    queue_size: int = 50, skip_collect: bool = False, extraction_mode: ExtractionMode = "verbatim",
+    reuse: bool = True, rescrape_after: float | None = None, incremental: bool = False,
+):
+    """Run every stage of the batch at once, each finished item feeding the next stage straight away.
+    
+    Collected link scrapes go to the link cleaners, their article links to the scraping drivers, and
+    each scraped article to the article cleaners. Link scrapes and scraped articles wait in queues of
+    at most queue_size, so a slow stage holds back the stage before it rather than piling work up."""
+    start_time = time.monotonic()
+    # Filenames of raw link scrapes, and of raw article scrapes ready to clean. None tells a worker to stop
+    link_queue: "queue.Queue[str | None]" = queue.Queue(maxsize=queue_size)
+    clean_queue: "queue.Queue[str | None]" = queue.Queue(maxsize=queue_size)
+    # The driver pool re-queues items after a crash, so its queue can't be bounded
+    scrape_work: queue.Queue = queue.Queue()
+    counts = {
+        "collected": 0, "links": 0, "reused": 0, "scraped": 0, "scrape_failed": 0, "cleaned": 0, "skipped": 0, "errors": 0,
+    }
+    counts_lock = threading.Lock()
+    
+    def count(key: str):
+        with counts_lock:
+            counts[key] += 1
+    
+    # Stage 1: collect links, one driver or session per paper at a time
+    def collect_paper(driver, paper: Paper):
+        filename = _collect_paper(driver, paper, page_limit, batch_id, incremental)
+        count("collected")
+        link_queue.put(filename)
+    
+    def collect_failed(paper: Paper, e: Exception):
+        _collect_failed(paper, e)
+        count("errors")
+    
+    # Stage 2: clean links, queueing each article for scraping (or cleaning, if it was scraped already)
+    def clean_link_scrape(filename: str):
+        paper, _, _ = parse_link_scrape_filename(filename)
+        if paper is None:
+            return
+        if not force and clean_link_scrape_exists(filename):
+            clean_links = read_clean_link_scrape(filename)
+        else:
+            clean_links = _filter_link_scrape(filename, read_link_scrape(filename))
+            write_clean_link_scrape(clean_links, filename)
+            rprint(f"[green]✓ Cleaned {len(clean_links)} links for {paper}[/green]")
+            count("links")
+        queued = 0
+        for link in clean_links:
+            if article_limit and queued >= article_limit:
+                break
+            article_filename = article_scrape_filename(paper, link.href, batch_id=batch_id)
+            if force or not article_scrape_exists(article_filename):
+                if not force and reuse and _reuse_previous_scrape(link.href, article_filename, rescrape_after):
+                    count("reused")
+                    if not clean_article_scrape_exists(article_filename):
+                        clean_queue.put(article_filename)
+                else:
+                    scrape_work.put(((paper, link.href), 0))
+                queued += 1
+            elif not clean_article_scrape_exists(article_filename):
+                clean_queue.put(article_filename)
+    
+    def link_worker():
+        while (filename := link_queue.get()) is not None:
             try:
-                link_scheme = ai_topic_page_maps[paper]
-                links = smart_collect_link_scheme(driver, link_scheme, page_limit)
-                write_link_scrape(links, link_scrape_filename(paper, page_limit, batch_id=batch_id))
-                rprint(f"[green]✓ Collected {len(links.once_links)} links for {paper}[/green]")
+                clean_link_scrape(filename)
             except Exception as e:
-                rprint(f"[red]✗ Error collecting links for {paper}: {e}[/red]")
-                # Continue with next paper
-    finally:
-        driver.quit()
+                rprint(f"[red]✗ Error cleaning links in {filename}: {e}[/red]")
+                count("errors")
+    
+    # Stage 3: scrape articles from the archive
+    def scrape_one(driver, job: tuple[Paper, str]):
+        paper, url = job
+        rprint(f"[cyan]Scraping {paper}: {url[:60]}...[/cyan]")
+        if _scrape_article(driver, paper, url, batch_id):
+            count("scraped")
+            clean_queue.put(article_scrape_filename(paper, url, batch_id=batch_id))
+        else:
+            count("scrape_failed")
+    
+    def scrape_failed(job: tuple[Paper, str], e: Exception):
+        _save_failed_scrape(*job, batch_id, e)
+        count("scrape_failed")
+    
+    # Stage 4: clean articles with the LLM
+    def clean_worker():
+        while (filename := clean_queue.get()) is not None:
+            try:
+                count("cleaned" if _clean_article(filename, extraction_mode=extraction_mode) else "skipped")
+            except Exception as e:
+                rprint(f"[red]✗ Error cleaning article {filename}: {e}[/red]")
+                count("errors")
+    
+    def start_threads(target, n: int, name: str) -> list[threading.Thread]:
+        threads = [threading.Thread(target=target, name=f"{name}-{i}", daemon=True) for i in range(n)]
+        for thread in threads:
+            thread.start()
+        return threads
+    
+    link_threads = start_threads(link_worker, link_workers, "link-cleaner")
+    clean_threads = start_threads(clean_worker, clean_workers, "article-cleaner")
+    scrape_stop = threading.Event()
+    scrape_threads = start_driver_pool(
+        scrape_work, scrape_stop, scrape_one, setup_archive_driver, workers=scrape_workers, on_error=scrape_failed,
+    )
+    
+    # Each stage is drained in order, while the stages after it keep running
+    if skip_collect:
+        for path in get_link_scrapes_for_batch(batch_id):
+            link_queue.put(path.name)
+    else:
+        run_driver_pools(_collection_pools(), collect_paper, workers=collect_concurrency, on_error=collect_failed)
+    for _ in link_threads:
+        link_queue.put(None)
+    for thread in link_threads:
+        thread.join()
+    
+    wait_for_queue(scrape_work, scrape_threads, scrape_failed)
+    scrape_stop.set()
+    for thread in scrape_threads:
+        thread.join()
+    
+    for _ in clean_threads:
+        clean_queue.put(None)
+    for thread in clean_threads:
+        thread.join()
+    
+    elapsed = time.monotonic() - start_time
+    rprint(
+        f"\n[blue]Streaming batch complete in {elapsed / 60:.1f} minutes: {counts['collected']} papers collected, "
+        f"{counts['links']} link scrapes cleaned, {counts['reused']} articles reused from earlier batches, "
+        f"{counts['scraped']} articles scraped ({counts['scrape_failed']} failed), "
+        f"{counts['cleaned']} articles cleaned ({counts['skipped']} skipped), {counts['errors']} errors[/blue]"
+    )
+    rprint(f"[blue]{snapshot_resolver.summary()}[/blue]")
+    rprint(f"[blue]{llm_cache.summary()}[/blue]")
+    rprint(f"[blue]{llm_usage.summary()}[/blue]")
 
 @app.command()
 def collect_links(
@@ -240,11 +729,16 @@ def collect_links(
     page_limit: int = typer.Option(10, help="Maximum number of pages to try to scrape for links."),
     verbose: bool = typer.Option(False, "--verbose", "-v"),
     batch_id: str|None = typer.Option(None, "-b", "--batch-id"),
+    backend: FetchBackend|None = typer.Option(None, help="Fetch pages over plain http or with selenium (defaults to the paper's setting)."),
+    incremental: bool = typer.Option(False, "--incremental", help="Stop paging through a paper's topic pages at the first page with no links that weren't in its previous batch"),
+    driver_mode: DriverMode | None = typer.Option(None, "--driver-mode", help="lean runs browsers headless and blocks images, fonts, media and ad hosts (defaults to DRIVER_MODE or standard)"),
 ):
     """Collect links for a newspaper's artticles on ai"""
-    driver = setup_driver()
+    _set_driver_mode(driver_mode)
+    driver = setup_fetcher(paper_backend(paper, backend))
     link_scheme = ai_topic_page_maps[paper]
-    links = smart_collect_link_scheme(driver, link_scheme, page_limit)
+    known_hrefs = _known_hrefs(paper, get_batch_id(batch_id), incremental)
+    links = smart_collect_link_scheme(driver, link_scheme, page_limit, paper_page_waits[paper], known_hrefs)
     if verbose:
         print(
             f"{len(links.all_links)} links appear on all pages, eg. {links.all_links[:5]}...", 
@@ -258,10 +752,15 @@ def collect_links(
 def batch_collect_papers(
     page_limit: int = typer.Option(10, help="Maximum number of pages to try to scrape for links."),
     batch_id: str|None = typer.Option(None, "-b", "--batch-id"),
+    concurrency: int = typer.Option(1, "--concurrency", "-c", min=1, help="Number of papers to collect links from at once"),
+    backend: FetchBackend|None = typer.Option(None, help="Fetch pages over plain http or with selenium for every paper (defaults to each paper's setting)."),
+    incremental: bool = typer.Option(False, "--incremental", help="Stop paging through a paper's topic pages at the first page with no links that weren't in its previous batch"),
+    driver_mode: DriverMode | None = typer.Option(None, "--driver-mode", help="lean runs browsers headless and blocks images, fonts, media and ad hosts (defaults to DRIVER_MODE or standard)"),
 ):
     """From each paper in the list, scrape links to articles, and save """
+    _set_driver_mode(driver_mode)
     batch_id = get_batch_id(batch_id)
-    _batch_collect_papers_impl(page_limit, batch_id)
+    _batch_collect_papers_impl(page_limit, batch_id, concurrency, backend, incremental)
 
 @app.command()
 def list_link_scrapes(
@@ -274,12 +773,130 @@ def list_link_scrapes(
 def list_article_scrapes():
     return glob_articles()
 
+@app.command()
+def rebuild_manifest(
+    batch_id: str | None = typer.Option(None, "-b", "--batch-id", help="Batch ID to re-index (defaults to today's date)"),
+    all_batches: bool = typer.Option(False, "--all", help="Re-index every batch"),
+):
+    """Rebuild batch manifests from the scrape directories, after files were added or removed by hand.
+    With --all the index of article URLs across batches is rebuilt too, as after changing canonicalisation rules"""
+    store = get_store()
+    batch_ids = store.batch_ids() if all_batches else [get_batch_id(batch_id)]
+    for batch_id in batch_ids:
+        store.rebuild_index(batch_id)
+        counts = ", ".join(f"{len(store.paths(stage, batch_id))} {stage}" for stage in SCRAPE_STAGES)
+        rprint(f"[green]✓ Rebuilt manifest for {batch_id}: {counts}[/green]")
+    if all_batches:
+        store.rebuild_url_index()
+        rprint(f"[green]✓ Rebuilt the article URL index[/green]")
+
+@app.command()
+def browser_service(
+    archive_slots: int = typer.Option(1, "--archive-slots", min=0, help="Browsers to keep for scraping from the archive, one per scraping worker"),
+    collect_slots: int = typer.Option(1, "--collect-slots", min=0, help="Browsers to keep for collecting links from papers needing selenium"),
+    check_interval: float = typer.Option(10, help="Seconds between health checks of each browser"),
+    headless: bool = typer.Option(False, "--headless", help="Run the browsers without windows (solve the first CAPTCHA with a window first)"),
+    status: bool = typer.Option(False, "--status", help="Show the running service's browsers instead of starting one"),
+):
+    """Keep browsers with persistent profiles running for other commands to attach to, restarting any that die"""
+    if status:
+        browsers = service_status()
+        if not browsers:
+            rprint(f"[yellow]No browser service running[/yellow]")
+            return
+        for browser, alive in browsers:
+            health = "[green]answering[/green]" if alive else "[red]not answering[/red]"
+            rprint(f"{browser.profile} browser {browser.slot}: port {browser.port}, pid {browser.pid}, {health}")
+        return
+    rprint(f"[blue]Starting browser service, stop it with Ctrl-C. State is kept in {STATE_PATH}[/blue]")
+    try:
+        run_service({"archive": archive_slots, "collect": collect_slots}, check_interval, headless)
+    except RuntimeError as e:
+        rprint(f"[red]{e}[/red]")
+        raise typer.Exit(1)
+
+@app.command()
+def dedup_report(
+    batch_id: str | None = typer.Option(None, "-b", "--batch-id", help="Batch ID to report on (defaults to today's date)"),
+    threshold: float = typer.Option(DEFAULT_THRESHOLD, min=0, max=1, help="Estimated share of word 5-grams two articles must have in common to be near-duplicates"),
+    lookback: int = typer.Option(7, min=0, help="Number of earlier batches to look for near-duplicates in too"),
+    show: int = typer.Option(20, help="Number of the largest groups to list"),
+):
+    """Report groups of near-duplicate articles, such as wire stories syndicated across papers"""
+    batch_id = get_batch_id(batch_id)
+    start = time.monotonic()
+    clusters, n_indexed = _near_duplicate_clusters(batch_id, lookback, threshold)
+    elapsed = time.monotonic() - start
+    in_batch = [cluster for cluster in clusters if any(parse_article_scrape_filename(f)[1] == batch_id for f in cluster)]
+    
+    table = Table(title=f"Near-duplicate articles in {batch_id}")
+    for column in ["articles", "papers", "batches", "url"]:
+        table.add_column(column)
+    for cluster in in_batch[:show]:
+        parsed = [parse_article_scrape_filename(filename) for filename in cluster]
+        table.add_row(
+            str(len(cluster)),
+            ", ".join(sorted({paper for paper, _ in parsed if paper})),
+            ", ".join(sorted({other for _, other in parsed if other})),
+            read_article_scrape(cluster[0]).url,
+        )
+    rprint(table)
+    # Articles of the batch which could copy a clean article, from this batch or an earlier one
+    duplicates = 0
+    for cluster in in_batch:
+        members = sum(parse_article_scrape_filename(filename)[1] == batch_id for filename in cluster)
+        duplicates += members if members < len(cluster) else members - 1
+    rprint(
+        f"[blue]Indexed {n_indexed} articles from {len(_lookback_batch_ids(batch_id, lookback))} batches in {elapsed:.1f}s: "
+        f"{len(in_batch)} groups of near-duplicates involving {batch_id}, cleaning one article per group "
+        f"would save up to {duplicates} LLM calls[/blue]"
+    )
+
+@app.command()
+def export_batch(
+    batch_id: str | None = typer.Option(None, "-b", "--batch-id", help="Batch ID to export (defaults to today's date)"),
+    compression: Compression | None = typer.Option(None, help="Shard compression (defaults to zstd if zstandard is installed, else gzip)"),
+    output_dir: Path = typer.Option(EXPORT_DIR, help="Directory to write the shard and its index to"),
+):
+    """Pack a batch's clean articles into one compressed JSONL shard with an index for random access"""
+    batch_id = get_batch_id(batch_id)
+    if not get_clean_article_scrapes_for_batch(batch_id):
+        rprint(f"[yellow]No clean articles found for batch {batch_id}[/yellow]")
+        return
+    try:
+        shard, index = _export_batch(batch_id, compression, output_dir)
+    except ValueError as e:
+        rprint(f"[red]{e}[/red]")
+        raise typer.Exit(1)
+    rprint(
+        f"[green]✓ Exported {index.n_records} articles in {len(index.blocks)} {index.compression} blocks "
+        f"to {shard} ({shard.stat().st_size / 1024:.0f} KiB)[/green]"
+    )
+
+@app.command()
+def migrate_storage(
+    to: StorageBackend = typer.Option("sqlite", help="Backend to copy scrapes into"),
+    source: StorageBackend = typer.Option("json", "--from", help="Backend to copy scrapes from"),
+    db: Path = typer.Option(SCRAPE_DB_PATH, help="SQLite database file"),
+    batch_id: list[str] = typer.Option([], "-b", "--batch-id", help="Batch IDs to copy (defaults to all)"),
+):
+    """Copy scrapes between the JSON files and the SQLite database, e.g. to import existing JSON trees.
+    Set SCRAPE_BACKEND=sqlite afterwards to use the database."""
+    if to == source:
+        rprint(f"[red]--from and --to are both {to}[/red]")
+        raise typer.Exit(1)
+    counts = migrate_scrapes(open_store(source, db), open_store(to, db), batch_id or None)
+    rprint(f"[green]✓ Copied {', '.join(f'{n} {stage}' for stage, n in counts.items())} from {source} to {to}[/green]")
+
 @app.command()
 def clean_links(
     filename: str = typer.Argument(..., help="Filename of the link scrape to clean"),
     force: bool = typer.Option(False, "--force", "-f", help="Force re-cleaning even if clean file exists"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="Always call the LLM, ignoring and not updating the response cache"),
+    no_prefilter: bool = typer.Option(False, "--no-prefilter", help="Send every candidate link to the LLM, without deciding obvious ones by URL rules first"),
 ):
     """Clean the links from a link scrape, and save the cleaned links to /clean"""
+    llm_cache.enabled = not no_cache
     # Check if clean file already exists
     if not force and clean_link_scrape_exists(filename):
         rprint(f"[yellow]Clean link scrape already exists: {filename}. Use --force to re-clean.[/yellow]")
@@ -295,7 +912,7 @@ def clean_links(
     # Filter links using LLM
     rprint(f"[blue]Filtering {len(scrape_result.once_links) + len(scrape_result.multiple_links)} links with LLM...[/blue]")
     try:
-        filtered_links = filter_links(scrape_result)
+        filtered_links = _filter_link_scrape(filename, scrape_result, not no_prefilter)
         rprint(f"[green]Filtered to {len(filtered_links)} article links[/green]")
     except Exception as e:
         rprint(f"[red]Error filtering links with LLM: {e}[/red]")
@@ -315,17 +932,26 @@ def clean_links(
 def batch_clean_links(
     batch_id: str | None = typer.Option(None, "-b", "--batch-id", help="Batch ID to process (defaults to today's date)"),
     force: bool = typer.Option(False, "--force", "-f", help="Force re-cleaning even if clean files exist"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="Always call the LLM, ignoring and not updating the response cache"),
+    mode: CleanMode = typer.Option("online", help="online calls the LLM per item, offline submits one Batch API job and waits for it (resumable)"),
+    poll_interval: float = typer.Option(60, help="Seconds between status checks of an offline job"),
+    no_prefilter: bool = typer.Option(False, "--no-prefilter", help="Send every candidate link to the LLM, without deciding obvious ones by URL rules first"),
 ):
     """Batch clean the links from several link scrapes, and save these to their respective places in /clean"""
+    llm_cache.enabled = not no_cache
     batch_id = get_batch_id(batch_id)
-    _batch_clean_links_impl(batch_id, force)
+    _batch_clean_links_impl(batch_id, force, mode, poll_interval=poll_interval, prefilter=not no_prefilter)
 
 @app.command()
 def clean_articles(
     filename: str = typer.Argument(..., help="Filename of the article scrape to clean"),
     force: bool = typer.Option(False, "--force", "-f", help="Force re-cleaning even if clean file exists"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="Always call the LLM, ignoring and not updating the response cache"),
+    keep_boilerplate: bool = typer.Option(False, "--keep-boilerplate", help="Send the raw text to the LLM without removing the paper's recurring boilerplate lines"),
+    extraction_mode: ExtractionMode = typer.Option("verbatim", help="verbatim has the LLM write out the article, spans has it pick the article's paragraphs (far fewer output tokens)"),
 ):
     """Clean an article's text and save to /clean"""
+    llm_cache.enabled = not no_cache
     # Check if clean file already exists
     if not force and clean_article_scrape_exists(filename):
         rprint(f"[yellow]Clean article already exists: {filename}. Use --force to re-clean.[/yellow]")
@@ -346,10 +972,13 @@ def clean_articles(
         rprint(f"[yellow]Skipping empty scrape: {filename}[/yellow]")
         return
     
+    if not keep_boilerplate:
+        scrape = _strip_article_boilerplate(scrape, filename)
+    
     # Clean article text using LLM
     rprint(f"[blue]Cleaning article text ({len(scrape.content)} chars)...[/blue]")
     try:
-        cleaned_content, is_article = extract_article_text(scrape.content)
+        cleaned_content, is_article = extract_article_text(scrape.content, mode=extraction_mode)
         if not is_article:
             rprint(f"[yellow]Not a valid article (listing/navigation page), skipping save[/yellow]")
             return
@@ -360,7 +989,6 @@ def clean_articles(
     
     # Write cleaned article (only if it's a valid article)
     try:
-        from utils import ScrapeData
         clean_scrape = ScrapeData(url=scrape.url, content=cleaned_content, is_article=is_article)
         write_clean_article_scrape(clean_scrape, filename)
         from utils import get_article_scrape_path
@@ -374,10 +1002,26 @@ def clean_articles(
 def batch_clean_articles(
     batch_id: str | None = typer.Option(None, "-b", "--batch-id", help="Batch ID to process (defaults to today's date)"),
     force: bool = typer.Option(False, "--force", "-f", help="Force re-cleaning even if clean files exist"),
+    concurrency: int = typer.Option(1, "--concurrency", "-c", min=1, help="Number of articles to clean with the LLM at once"),
+    requests_per_minute: float = typer.Option(DEFAULT_RPM, "--rpm", help="LLM requests per minute limit when cleaning concurrently"),
+    tokens_per_minute: float = typer.Option(DEFAULT_TPM, "--tpm", help="LLM tokens per minute limit when cleaning concurrently"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="Always call the LLM, ignoring and not updating the response cache"),
+    mode: CleanMode = typer.Option("online", help="online calls the LLM per item, offline submits one Batch API job and waits for it (resumable)"),
+    poll_interval: float = typer.Option(60, help="Seconds between status checks of an offline job"),
+    keep_boilerplate: bool = typer.Option(False, "--keep-boilerplate", help="Send the raw text to the LLM without removing the paper's recurring boilerplate lines"),
+    extraction_mode: ExtractionMode = typer.Option("verbatim", help="verbatim has the LLM write out the article, spans has it pick the article's paragraphs (far fewer output tokens)"),
+    near_dup: bool = typer.Option(False, "--near-dup", help="Clean one article of each group of near-duplicates (such as syndicated wire stories) and copy it to the rest"),
+    near_dup_threshold: float = typer.Option(DEFAULT_THRESHOLD, "--near-dup-threshold", min=0, max=1, help="Estimated share of word 5-grams two articles must have in common to be near-duplicates"),
+    near_dup_lookback: int = typer.Option(7, "--near-dup-lookback", min=0, help="Number of earlier batches whose articles near-duplicates are also looked for in"),
 ):
     """Batch clean article contents"""
+    llm_cache.enabled = not no_cache
     batch_id = get_batch_id(batch_id)
-    _batch_clean_articles_impl(batch_id, force)
+    _batch_clean_articles_impl(
+        batch_id, force, concurrency, requests_per_minute, tokens_per_minute, mode,
+        poll_interval=poll_interval, strip=not keep_boilerplate, extraction_mode=extraction_mode,
+        near_dup=near_dup, near_dup_threshold=near_dup_threshold, near_dup_lookback=near_dup_lookback,
+    )
 
 @app.command()
 def archive_scrape_article(
@@ -385,8 +1029,12 @@ def archive_scrape_article(
     paper: Paper = typer.Option(..., "-p", "--paper", help="Paper name for filename"),
     batch_id: str | None = typer.Option(None, "-b", "--batch-id", help="Batch ID (defaults to today's date)"),
     force: bool = typer.Option(False, "--force", "-f", help="Force re-scraping even if file exists"),
+    no_snapshot_lookup: bool = typer.Option(False, "--no-snapshot-lookup", help="Always find archive snapshots through the archive's search page in the browser, without the timemap, snapshot cache or HTTP fetches"),
+    driver_mode: DriverMode | None = typer.Option(None, "--driver-mode", help="lean runs browsers headless and blocks images, fonts, media and ad hosts (defaults to DRIVER_MODE or standard)"),
 ):
     """Scrape a single article from archive"""
+    _set_driver_mode(driver_mode)
+    _configure_snapshot_lookup(no_snapshot_lookup)
     batch_id = get_batch_id(batch_id)
     filename = article_scrape_filename(paper, url, batch_id=batch_id)
     
@@ -412,7 +1060,6 @@ def archive_scrape_article(
     except Exception as e:
         rprint(f"[red]Error scraping article: {e}[/red]")
         # Save failed scrape
-        from utils import Scrape
         failed_scrape = Scrape(url=url, content="", success=False)
         write_article_scrape(failed_scrape, filename)
         raise typer.Exit(1)
@@ -424,10 +1071,17 @@ def batch_archive_scrape_articles(
     batch_id: str | None = typer.Option(None, "-b", "--batch-id", help="Batch ID to process (defaults to today's date)"),
     force: bool = typer.Option(False, "--force", "-f", help="Force re-scraping even if files exist"),
     article_limit: int | None = typer.Option(None, "--article-limit", "-a", help="Limit number of articles to scrape per paper (useful for testing)"),
+    workers: int = typer.Option(1, "--workers", "-w", min=1, help="Number of browser drivers scraping articles in parallel"),
+    no_reuse: bool = typer.Option(False, "--no-reuse", help="Scrape every article, even those already scraped in an earlier batch"),
+    rescrape_after: float | None = typer.Option(None, "--rescrape-after", min=0, help="Scrape articles again if the earlier batch's scrape is older than this many days"),
+    no_snapshot_lookup: bool = typer.Option(False, "--no-snapshot-lookup", help="Always find archive snapshots through the archive's search page in the browser, without the timemap, snapshot cache or HTTP fetches"),
+    driver_mode: DriverMode | None = typer.Option(None, "--driver-mode", help="lean runs browsers headless and blocks images, fonts, media and ad hosts (defaults to DRIVER_MODE or standard)"),
 ):
     """In a batch process, scrape the links from archive"""
+    _set_driver_mode(driver_mode)
+    _configure_snapshot_lookup(no_snapshot_lookup, rescrape_after)
     batch_id = get_batch_id(batch_id)
-    _batch_archive_scrape_articles_impl(batch_id, force, article_limit)
+    _batch_archive_scrape_articles_impl(batch_id, force, article_limit, workers, not no_reuse, rescrape_after)
 
 @app.command()
 def run_batch(
@@ -439,8 +1093,29 @@ def run_batch(
     skip_clean_links: bool = typer.Option(False, "--skip-clean-links", help="Skip link cleaning step"),
     skip_scrape: bool = typer.Option(False, "--skip-scrape", help="Skip article scraping step"),
     skip_clean_articles: bool = typer.Option(False, "--skip-clean-articles", help="Skip article cleaning step"),
+    workers: int = typer.Option(1, "--workers", "-w", min=1, help="Number of browser drivers scraping articles in parallel"),
+    concurrency: int = typer.Option(1, "--concurrency", "-c", min=1, help="Number of papers to collect links from at once"),
+    clean_concurrency: int = typer.Option(1, "--clean-concurrency", min=1, help="Number of articles to clean with the LLM at once"),
+    requests_per_minute: float | None = typer.Option(None, "--rpm", help=f"LLM requests per minute limit when cleaning concurrently (defaults to {DEFAULT_RPM})"),
+    tokens_per_minute: float | None = typer.Option(None, "--tpm", help=f"LLM tokens per minute limit when cleaning concurrently (defaults to {DEFAULT_TPM})"),
+    extraction_mode: ExtractionMode = typer.Option("verbatim", help="verbatim has the LLM write out the article, spans has it pick the article's paragraphs (far fewer output tokens)"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="Always call the LLM, ignoring and not updating the response cache"),
+    streaming: bool = typer.Option(False, "--streaming", help="Run all stages at once, passing each item on as soon as it is done, instead of one stage after another"),
+    link_workers: int = typer.Option(2, "--link-workers", min=1, help="Number of link scrapes to clean with the LLM at once when streaming"),
+    queue_size: int = typer.Option(50, "--queue-size", min=1, help="Most items waiting between two stages when streaming"),
+    no_reuse: bool = typer.Option(False, "--no-reuse", help="Scrape every article, even those already scraped in an earlier batch"),
+    rescrape_after: float | None = typer.Option(None, "--rescrape-after", min=0, help="Scrape articles again if the earlier batch's scrape is older than this many days"),
+    near_dup: bool = typer.Option(False, "--near-dup", help="Clean one article of each group of near-duplicates (such as syndicated wire stories) and copy it to the rest"),
+    near_dup_threshold: float = typer.Option(DEFAULT_THRESHOLD, "--near-dup-threshold", min=0, max=1, help="Estimated share of word 5-grams two articles must have in common to be near-duplicates"),
+    near_dup_lookback: int = typer.Option(7, "--near-dup-lookback", min=0, help="Number of earlier batches whose articles near-duplicates are also looked for in"),
+    incremental: bool = typer.Option(False, "--incremental", help="Stop paging through a paper's topic pages at the first page with no links that weren't in its previous batch"),
+    no_snapshot_lookup: bool = typer.Option(False, "--no-snapshot-lookup", help="Always find archive snapshots through the archive's search page in the browser, without the timemap, snapshot cache or HTTP fetches"),
+    driver_mode: DriverMode | None = typer.Option(None, "--driver-mode", help="lean runs browsers headless and blocks images, fonts, media and ad hosts (defaults to DRIVER_MODE or standard)"),
 ):
     """Run the complete batch pipeline: collect links, clean links, scrape articles, clean articles"""
+    _set_driver_mode(driver_mode)
+    _configure_snapshot_lookup(no_snapshot_lookup, rescrape_after)
+    llm_cache.enabled = not no_cache
     batch_id = get_batch_id(batch_id)
     rprint(f"[bold blue]Starting batch pipeline for batch_id: {batch_id}[/bold blue]")
     if page_limit != 10:
@@ -448,11 +1123,30 @@ def run_batch(
     if article_limit:
         rprint(f"[blue]Article limit per paper: {article_limit}[/blue]")
     
+    if streaming:
+        if skip_clean_links or skip_scrape or skip_clean_articles:
+            rprint(f"[red]--streaming runs every stage after collection, only --skip-collect can be combined with it[/red]")
+            raise typer.Exit(1)
+        if near_dup:
+            rprint(f"[red]--near-dup needs the whole batch scraped before cleaning, so can't be combined with --streaming[/red]")
+            raise typer.Exit(1)
+        if requests_per_minute is not None or tokens_per_minute is not None:
+            rprint(f"[red]--rpm and --tpm limit the concurrent cleaning of a scraped batch, so can't be combined with --streaming, use --clean-concurrency[/red]")
+            raise typer.Exit(1)
+        _stream_batch_impl(
+            page_limit, batch_id, force, article_limit,
+            collect_concurrency=concurrency, link_workers=link_workers, scrape_workers=workers,
+            clean_workers=clean_concurrency, queue_size=queue_size, skip_collect=skip_collect,
+            extraction_mode=extraction_mode, reuse=not no_reuse, rescrape_after=rescrape_after, incremental=incremental,
+        )
+        rprint(f"\n[bold green]✓ Batch pipeline complete for batch_id: {batch_id}[/bold green]")
+        return
+    
     # Step 1: Collect links
     if not skip_collect:
         rprint(f"\n[bold yellow]Step 1/4: Collecting links from papers...[/bold yellow]")
         try:
-            _batch_collect_papers_impl(page_limit, batch_id)
+            _batch_collect_papers_impl(page_limit, batch_id, concurrency, incremental=incremental)
         except Exception as e:
             rprint(f"[red]Error in link collection step: {e}[/red]")
             raise typer.Exit(1)
@@ -474,7 +1168,7 @@ def run_batch(
     if not skip_scrape:
         rprint(f"\n[bold yellow]Step 3/4: Scraping articles from archive...[/bold yellow]")
         try:
-            _batch_archive_scrape_articles_impl(batch_id, force, article_limit)
+            _batch_archive_scrape_articles_impl(batch_id, force, article_limit, workers, not no_reuse, rescrape_after)
         except Exception as e:
             rprint(f"[red]Error in article scraping step: {e}[/red]")
             raise typer.Exit(1)
@@ -485,7 +1179,12 @@ def run_batch(
     if not skip_clean_articles:
         rprint(f"\n[bold yellow]Step 4/4: Cleaning articles with LLM...[/bold yellow]")
         try:
-            _batch_clean_articles_impl(batch_id, force)
+            _batch_clean_articles_impl(
+                batch_id, force, clean_concurrency,
+                requests_per_minute=DEFAULT_RPM if requests_per_minute is None else requests_per_minute,
+                tokens_per_minute=DEFAULT_TPM if tokens_per_minute is None else tokens_per_minute,
+                extraction_mode=extraction_mode, near_dup=near_dup, near_dup_threshold=near_dup_threshold, near_dup_lookback=near_dup_lookback,
+            )
         except Exception as e:
             rprint(f"[red]Error in article cleaning step: {e}[/red]")
             raise typer.Exit(1)
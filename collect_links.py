@@ -1,36 +1,101 @@
 from rich import print
+import threading
 import time
+from collections import Counter
+from typing import Callable
+import requests
+from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.common.by import By
-from urllib.parse import urlparse
-from utils import LinkData, SmartLinkScrapeResult, Paper, LinkScheme, write_link_scrape, read_link_scrape, link_scrape_filename
+from urllib.parse import urlparse, urljoin
+from utils import (
+    LinkData, SmartLinkScrapeResult, Paper, LinkScheme, LinkSchemeMatcher, PageWait, FetchBackend, paper_fetch_backends,
+    write_link_scrape, read_link_scrape, link_scrape_filename, canonicalize_url,
+    recent_scrape_filenames, parse_link_scrape_filename,
+)
+from page_ready import wait_for_page_ready
+from driver_service import connect_driver
 
-def setup_driver():
-    """Initialize and configure the Chrome WebDriver"""
-    options = webdriver.ChromeOptions()
+COLLECT_PROFILE = "collect"
+
+def configure_options(options: webdriver.ChromeOptions):
     # Uncomment the next line to run in headless mode (no browser window)
     # options.add_argument('--headless')
     options.add_argument('--no-sandbox')
     options.add_argument('--disable-dev-shm-usage')
-    
-    driver = webdriver.Chrome(options=options)
+
+def setup_driver():
+    """Initialize and configure the Chrome WebDriver, on a persistent profile so accepted cookie banners carry over between runs.
+    Attaches to the browser service's browser if it is running."""
+    driver = connect_driver(COLLECT_PROFILE, configure_options)
     driver.maximize_window()
     return driver
 
+HTTP_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/131.0.0.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-GB,en;q=0.9",
+}
+
+def setup_session() -> requests.Session:
+    """Initialize an HTTP session for papers whose topic pages don't need a browser"""
+    session = requests.Session()
+    session.headers.update(HTTP_HEADERS)
+    return session
+
+def setup_fetcher(backend: FetchBackend) -> webdriver.Chrome | requests.Session:
+    """Set up either a browser or an HTTP session, both can be passed to collect_links"""
+    if backend == "http":
+        return setup_session()
+    return setup_driver()
+
+def paper_backend(paper: Paper, backend: FetchBackend | None = None) -> FetchBackend:
+    """The backend to collect a paper with, an explicit choice overrides the paper's default"""
+    return backend or paper_fetch_backends[paper]
+
 def scrape_body_text(driver: webdriver.Chrome) -> str:
     # Scrape visible text from the body element of the current page
     body = driver.find_element(by=By.CLASS_NAME, value="body")
     return body.text
 
+# Read every anchor's resolved href and rendered text in a single round trip to chromedriver,
+# rather than two WebDriver commands per anchor. An SVG <a>'s href is an SVGAnimatedString and it has
+# no innerText, so its href attribute is resolved against the page as an HTML anchor's is.
+_ALL_ANCHORS_JS = """
+return Array.from(document.querySelectorAll("a[href]"), a => {
+    if (typeof a.href === "string") {
+        return [a.href, a.innerText];
+    }
+    try {
+        return [new URL(a.getAttribute("href"), document.baseURI).href, a.textContent];
+    } catch (e) {
+        return [null, null];
+    }
+});
+"""
+
 def scrape_all_links(driver: webdriver.Chrome) -> list[LinkData]:
-    links = driver.find_elements(By.XPATH, "//a")
+    anchors = driver.execute_script(_ALL_ANCHORS_JS) or []
     link_datas = []
-    for link in links:
-        href = link.get_attribute("href")
+    for href, text in anchors:
         if not href:
             continue
         link_datas.append(
-            LinkData(text=link.text, href=href)
+            LinkData(text=(text or "").strip(), href=href)
+        )
+    return link_datas
+
+def scrape_all_links_from_html(html: str, base_url: str) -> list[LinkData]:
+    # Resolve hrefs against the page URL, as the browser does for anchor.href
+    soup = BeautifulSoup(html, "html.parser")
+    link_datas = []
+    for link in soup.find_all("a", href=True):
+        href = urljoin(base_url, link["href"].strip())
+        link_datas.append(
+            LinkData(text=link.get_text(" ", strip=True), href=href)
         )
     return link_datas
 
@@ -38,84 +103,147 @@ def href_base(href: str) -> str:
     parsed = urlparse(href)
     return parsed.netloc
 
-def collect_links(driver: webdriver.Chrome, url: str):
+# Time at which the next request to each domain may be made, shared by all collection threads
+_domain_next_request: dict[str, float] = {}
+_domain_lock = threading.Lock()
+
+def wait_for_domain(url: str, delay: float):
+    """Sleep until at least `delay` seconds have passed since the last request to url's domain.
+    Concurrent callers for the same domain are given successive slots, other domains don't wait."""
+    domain = href_base(url)
+    with _domain_lock:
+        now = time.monotonic()
+        slot = max(now, _domain_next_request.get(domain, now))
+        _domain_next_request[domain] = slot + delay
+    if slot > now:
+        time.sleep(slot - now)
+
+def collect_links(driver: webdriver.Chrome | requests.Session, url: str, page_wait: PageWait | None = None):
     """
-    Navigate to a news website ai page
+    Navigate to a news website ai page, with a browser or a plain HTTP session
     """    
-    time.sleep(1)
+    page_wait = page_wait or PageWait()
+    wait_for_domain(url, page_wait.request_delay)
     
     # Navigate to the initial URL
     print(f"Navigating to {url}...")
-    driver.get(url)
-    
-    time.sleep(2)  # Brief wait for page load
-    
-    links = scrape_all_links(driver)
+    if isinstance(driver, requests.Session):
+        response = driver.get(url, timeout=page_wait.timeout)
+        response.raise_for_status()
+        links = scrape_all_links_from_html(response.text, response.url)
+    else:
+        driver.get(url)
+        # Wait until links are present and the page has stopped rendering
+        wait_for_page_ready(driver, (By.TAG_NAME, "a"), page_wait)
+        links = scrape_all_links(driver)
     
+    # Variants of one article (tracking parameters, AMP pages...) merge as one link
+    links = [LinkData(text=link.text, href=canonicalize_url(link.href)) for link in links]
     # Filter out links that are not to the same webpage
-    links = list(filter(lambda link : href_base(link.href) == href_base(url), links))
+    links = list(filter(lambda link : href_base(link.href) == href_base(canonicalize_url(url)), links))
     return links
 
-def merge_links(old_links:list[LinkData], new_links:list[LinkData]) -> tuple[bool, list[LinkData]]:
+def merge_links(old_links:list[LinkData], new_links:list[LinkData], seen_hrefs:set[str]|None = None) -> tuple[bool, list[LinkData]]:
     # Merge links by href, and return a bool representing any links were merged
+    # Pass seen_hrefs (kept in step with old_links) when merging repeatedly, to avoid rebuilding it each time
     links = old_links
     old_length = len(old_links)
+    if seen_hrefs is None:
+        seen_hrefs = {link.href for link in links}
     for new_link in new_links:
-        if new_link.href in [link.href for link in links]:
+        if new_link.href in seen_hrefs:
             continue
+        seen_hrefs.add(new_link.href)
         links.append(new_link)
     
     merged = len(links) > old_length
     
     return merged, links
     
-def collect_link_scheme(driver: webdriver.Chrome, link_scheme: LinkScheme, page_limit = 10):
+def collect_link_scheme(driver: webdriver.Chrome | requests.Session, link_scheme: LinkScheme, page_limit = 10, page_wait: PageWait | None = None):
     # iterate through page numbers while we are getting new links
     links = []
+    seen_hrefs:set[str] = set()
     for n in range(1, page_limit+1):
-        new_links = collect_links(driver, link_scheme(n))
-        merged, links = merge_links(links, new_links)
+        new_links = collect_links(driver, link_scheme(n), page_wait)
+        merged, links = merge_links(links, new_links, seen_hrefs)
         if not merged:
             break
     return links
 
-def smart_collect_link_scheme(driver: webdriver.Chrome, link_scheme: LinkScheme, page_limit = 10):
+def classify_links(links:list[LinkData], scrape_history:list[list[LinkData]], is_schema_link:Callable[[str], bool]) -> SmartLinkScrapeResult:
+    """Bucket links by how many of the scraped pages they appeared on, in one pass over the history"""
+    # Count pages per href, a link listed twice on one page still counts once for that page
+    page_counts: Counter[str] = Counter()
+    for scrape in scrape_history:
+        page_counts.update({link.href for link in scrape})
+    n_pages = len(scrape_history)
+    
+    schema_links, once_links, multiple_links, all_links = [], [], [], []
+    for link in links:
+        # we can reject the links matching our link scheme
+        if is_schema_link(link.href):
+            schema_links.append(link)
+            continue
+        count = page_counts[link.href]
+        # with a single page, a link is both on one page and on all pages
+        if count == 1:
+            once_links.append(link)
+        if 1 < count < n_pages:
+            multiple_links.append(link)
+        if count == n_pages:
+            all_links.append(link)
+    return SmartLinkScrapeResult(
+        schema_links=schema_links, 
+        all_links=all_links, 
+        multiple_links=multiple_links, 
+        once_links=once_links
+    )
+
+# Incremental collection reads at least this many pages, as classifying links compares pages
+INCREMENTAL_MIN_PAGES = 2
+
+def previous_link_hrefs(paper: Paper, batch_id: str) -> set[str] | None:
+    """Every link in the paper's latest raw link scrape from another batch, or None if there isn't one"""
+    for filename in recent_scrape_filenames("links_raw", paper, 5):
+        if parse_link_scrape_filename(filename)[2] == batch_id:
+            continue
+        scrape = read_link_scrape(filename)
+        return {
+            canonicalize_url(link.href)
+            for links in (scrape.once_links, scrape.schema_links, scrape.multiple_links, scrape.all_links)
+            for link in links
+        }
+    return None
+
+def smart_collect_link_scheme(
+    driver: webdriver.Chrome | requests.Session, link_scheme: LinkScheme, page_limit = 10, page_wait: PageWait | None = None,
+    known_hrefs: set[str] | None = None,
+):
     # iterate through page numbers while we are getting new links
     # maintain the history of all scraped links
+    # with known_hrefs (the links collected last time), stop at the first page with nothing new on it,
+    # as the pages after it were collected last time too
     links:list[LinkData] = []
+    seen_hrefs:set[str] = set()
     scrape_history:list[list[LinkData]] = []
+    page_matcher = LinkSchemeMatcher(link_scheme, page_limit+5) if known_hrefs is not None else None
     for n in range(1, page_limit+1):
-        new_links = collect_links(driver, link_scheme(n))
-        merged, links = merge_links(links, new_links)
+        new_links = collect_links(driver, link_scheme(n), page_wait)
+        merged, links = merge_links(links, new_links, seen_hrefs)
         if not merged:
             break
         scrape_history.append(new_links)
+        if page_matcher is not None and n >= INCREMENTAL_MIN_PAGES and all(
+            link.href in known_hrefs or page_matcher.matches(link.href) for link in new_links
+        ):
+            print(f"Page {n} has no links we didn't collect last time, stopping")
+            break
     # we can reject the links matching our link scheme (this matches sub and superstrings too)
-    def matches_scheme(href:str, n:int):
-        for i in range(1,n+1):
-            if href in link_scheme(i) or link_scheme(i) in href:
-                return True
-        return False
+    scheme_matcher = LinkSchemeMatcher(link_scheme, len(scrape_history)+5)
     # we can reject links that appear on all pages
     # we can mark links that appear on multiple but not all pages for testing
-    def count_scrapes(href:str, scrape_history:list[list[LinkData]]):
-        total = 0 
-        for scrape in scrape_history:
-            if href in [link.href for link in scrape]:
-                total += 1
-        return total
-    schema_links = list(filter(lambda link: matches_scheme(link.href, len(scrape_history)+5), links))
-    links = list(filter(lambda link: not matches_scheme(link.href, len(scrape_history)+5), links))
-    
-    once_scraped_links = list(filter(lambda link: count_scrapes(link.href, scrape_history) == 1, links))
-    multiple_scraped_links = list(filter(lambda link: 1 < count_scrapes(link.href, scrape_history) < len(scrape_history), links))
-    always_scraped_links = list(filter(lambda link: count_scrapes(link.href, scrape_history) == len(scrape_history), links))
-    return SmartLinkScrapeResult(
-        schema_links=schema_links, 
-        all_links=always_scraped_links, 
-        multiple_links=multiple_scraped_links, 
-        once_links=once_scraped_links
-    )
+    return classify_links(links, scrape_history, scheme_matcher.matches)
 
 if __name__ == "__main__":
     driver = setup_driver()
@@ -131,11 +259,11 @@ if __name__ == "__main__":
     #     json.dump(links, outfile, indent=4)
         
     # Collect paginated links with some more link filtering
-    from utils import ai_topic_page_maps
+    from utils import ai_topic_page_maps, paper_page_waits
     PAPER:Paper = "ft"
     PAGE_LIMIT = 4
     url_scheme = ai_topic_page_maps["ft"]
-    scrape_result= smart_collect_link_scheme(driver, url_scheme, page_limit=4)
+    scrape_result= smart_collect_link_scheme(driver, url_scheme, page_limit=4, page_wait=paper_page_waits["ft"])
     print(
         "Schema:" + "-"*30,
         scrape_result.schema_links, 
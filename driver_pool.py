@@ -0,0 +1,168 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, TypeVar
+from rich import print
+from selenium.webdriver.remote.webdriver import WebDriver
+
+T = TypeVar("T")
+
+# Attempts at starting a worker's driver, with a pause between them, before the worker gives up
+SETUP_ATTEMPTS = 3
+SETUP_RETRY_DELAY = 5
+
+def driver_alive(driver: Any) -> bool:
+    """Check whether a driver's browser session still responds. Non-browser fetchers are always alive."""
+    if not isinstance(driver, WebDriver):
+        return True
+    try:
+        driver.current_url
+        return True
+    except Exception:
+        return False
+
+def _quit_driver(driver: Any):
+    try:
+        if isinstance(driver, WebDriver):
+            driver.quit()
+        else:
+            driver.close()
+    except Exception:
+        pass
+
+def _start_driver(worker_id: int, setup_driver: Callable[[], Any]) -> Any | None:
+    """A new driver, or None if it couldn't be started in SETUP_ATTEMPTS tries"""
+    for attempt in range(1, SETUP_ATTEMPTS + 1):
+        try:
+            return setup_driver()
+        except Exception as e:
+            print(f"[red]Worker {worker_id}: could not start driver (attempt {attempt}/{SETUP_ATTEMPTS}): {e}[/red]")
+            if attempt < SETUP_ATTEMPTS:
+                time.sleep(SETUP_RETRY_DELAY)
+    return None
+
+def _pool_worker(
+    worker_id: int,
+    work: "queue.Queue[tuple[T, int]]",
+    stop: threading.Event,
+    process: Callable[[Any, T], None],
+    setup_driver: Callable[[], Any],
+    on_error: Callable[[T, Exception], None] | None,
+    max_retries: int,
+):
+    driver = _start_driver(worker_id, setup_driver)
+    if driver is None:
+        return
+    try:
+        while driver is not None and not stop.is_set():
+            try:
+                item, attempt = work.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                process(driver, item)
+            except Exception as e:
+                if not driver_alive(driver):
+                    # The browser died under us: respawn it and hand the item back to the queue.
+                    # The item is re-queued before task_done so the queue never looks finished.
+                    print(f"[yellow]Worker {worker_id}: driver crashed ({e.__class__.__name__}), respawning...[/yellow]")
+                    if attempt < max_retries:
+                        work.put((item, attempt + 1))
+                    elif on_error is not None:
+                        on_error(item, e)
+                    _quit_driver(driver)
+                    # Without a driver the worker stops, wait_for_queue fails what is left if no worker remains
+                    driver = _start_driver(worker_id, setup_driver)
+                elif on_error is not None:
+                    on_error(item, e)
+            finally:
+                work.task_done()
+    finally:
+        if driver is not None:
+            _quit_driver(driver)
+
+def start_driver_pool(
+    work: "queue.Queue[tuple[T, int]]",
+    stop: threading.Event,
+    process: Callable[[Any, T], None],
+    setup_driver: Callable[[], Any],
+    workers: int = 1,
+    on_error: Callable[[T, Exception], None] | None = None,
+    max_retries: int = 2,
+) -> list[threading.Thread]:
+    """Start `workers` threads, each owning one driver (or HTTP session), consuming `(item, attempt)` pairs from `work`.
+
+    Workers run until `stop` is set. Callers wait for the queue to drain before setting `stop`,
+    so items can keep arriving while the pool runs and re-queued items are never dropped."""
+    threads = []
+    for worker_id in range(1, workers + 1):
+        thread = threading.Thread(
+            target=_pool_worker,
+            args=(worker_id, work, stop, process, setup_driver, on_error, max_retries),
+            name=f"driver-pool-{worker_id}",
+            daemon=True,
+        )
+        thread.start()
+        threads.append(thread)
+    return threads
+
+def wait_for_queue(work: queue.Queue, threads: list[threading.Thread], on_error: Callable[[Any, Exception], None] | None = None):
+    """Block until every queued item is done, or until no worker is left alive to do them.
+    Items left over then are passed to on_error, so they are recorded as failed rather than dropped."""
+    while work.unfinished_tasks and any(thread.is_alive() for thread in threads):
+        time.sleep(0.2)
+    while True:
+        try:
+            item, _ = work.get_nowait()
+        except queue.Empty:
+            break
+        try:
+            if on_error is not None:
+                on_error(item, RuntimeError("No driver left to process it"))
+        finally:
+            work.task_done()
+
+def run_driver_pools(
+    pools: list[tuple[list[T], Callable[[], Any]]],
+    process: Callable[[Any, T], None],
+    workers: int = 1,
+    on_error: Callable[[T, Exception], None] | None = None,
+    max_retries: int = 2,
+):
+    """run_driver_pool for several lists of items at once, each with its own kind of driver (such as HTTP
+    sessions and browsers) and up to `workers` of them, blocking until every list is done."""
+    stop = threading.Event()
+    running: list[tuple[queue.Queue, list[threading.Thread]]] = []
+    try:
+        for items, setup_driver in pools:
+            if not items:
+                continue
+            work: queue.Queue = queue.Queue()
+            for item in items:
+                work.put((item, 0))
+            threads = start_driver_pool(
+                work, stop, process, setup_driver,
+                workers=min(workers, len(items)), on_error=on_error, max_retries=max_retries,
+            )
+            running.append((work, threads))
+        for work, threads in running:
+            wait_for_queue(work, threads, on_error)
+    finally:
+        stop.set()
+        for _, threads in running:
+            for thread in threads:
+                thread.join()
+
+def run_driver_pool(
+    items: list[T],
+    process: Callable[[Any, T], None],
+    setup_driver: Callable[[], Any],
+    workers: int = 1,
+    on_error: Callable[[T, Exception], None] | None = None,
+    max_retries: int = 2,
+):
+    """Process a fixed list of items with a pool of drivers and block until all are done.
+
+    `process(driver, item)` should raise on failure. If the driver is dead afterwards it is
+    respawned and the item retried up to `max_retries` times, otherwise `on_error` is called."""
+    run_driver_pools([(items, setup_driver)], process, workers, on_error, max_retries)
@@ -0,0 +1,244 @@
+"""Long-lived Chrome browsers with persistent profiles, for CLI commands to attach to.
+
+Each browser has its own user data directory under scrapes/browser_profiles/, so cookies and the
+archive.md CAPTCHA clearance survive between runs. `cli.py browser-service` keeps a number of them
+running with remote debugging ports, checks their health and restarts any which die. connect_driver
+attaches to one of the service's browsers if the service is running, otherwise it starts Chrome on
+the same persistent profile itself. Each process claims a profile slot with a lock file, so two
+commands never drive the same browser.
+
+In "lean" mode (browser_settings.mode, or DRIVER_MODE=lean) browsers run headless, don't wait for
+subresources before a page counts as loaded, and block images, media, fonts and ad and analytics
+hosts, as we only read anchors and body text. Lean archive scraping needs the CAPTCHA cleared
+already, in a headed run on the same profile.
+"""
+import fcntl
+import os
+import shutil
+import signal
+import subprocess
+import time
+from pathlib import Path
+from typing import IO, Callable, Literal
+import requests
+from pydantic import BaseModel
+from rich import print
+from selenium import webdriver
+
+PROFILE_DIR = Path("scrapes/browser_profiles")
+STATE_PATH = PROFILE_DIR / "service.json"
+BASE_PORT = 9300
+MAX_SLOTS = 32
+# How long a client waits for the service to restart a dead browser
+RESTART_WAIT = 20
+CHROME_BINARIES = ["google-chrome", "google-chrome-stable", "chromium", "chromium-browser", "chrome"]
+
+DriverMode = Literal["standard", "lean"]
+# Network.setBlockedURLs patterns for what lean browsers never download
+BLOCKED_URL_PATTERNS = [
+    # Images, media and fonts
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico", "*.bmp",
+    "*.mp4", "*.webm", "*.m3u8", "*.ts", "*.mp3", "*.m4a", "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    # Ads, analytics and recommendation widgets
+    "*doubleclick.net*", "*googlesyndication.com*", "*googletagservices.com*", "*googletagmanager.com*",
+    "*google-analytics.com*", "*amazon-adsystem.com*", "*adnxs.com*", "*criteo.com*", "*criteo.net*",
+    "*rubiconproject.com*", "*pubmatic.com*", "*casalemedia.com*", "*teads.tv*", "*taboola.com*", "*outbrain.com*",
+    "*scorecardresearch.com*", "*chartbeat.com*", "*chartbeat.net*", "*quantserve.com*", "*permutive.com*",
+    "*permutive.app*", "*hotjar.com*", "*facebook.net*", "*twitter.com/widgets*", "*platform.twitter.com*",
+    "*newrelic.com*", "*nr-data.net*", "*optimizely.com*", "*ipredictive.com*", "*krxd.net*", "*bluekai.com*",
+]
+
+class BrowserSettings:
+    """How connect_driver sets up browsers, the CLI sets mode like llm_cache.enabled"""
+    def __init__(self):
+        self.mode: DriverMode = "lean" if os.environ.get("DRIVER_MODE") == "lean" else "standard"
+
+browser_settings = BrowserSettings()
+
+def configure_lean(options: webdriver.ChromeOptions):
+    options.add_argument("--headless=new")
+    options.add_argument("--window-size=1920,1080")
+    options.add_argument("--disable-extensions")
+    options.add_argument("--mute-audio")
+    options.add_argument("--blink-settings=imagesEnabled=false")
+    options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+
+def block_resources(driver: webdriver.Chrome):
+    """Stop the browser downloading BLOCKED_URL_PATTERNS, for the rest of the session"""
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+
+class BrowserSlot(BaseModel):
+    profile: str
+    slot: int
+    port: int
+    pid: int | None = None
+
+class ServiceState(BaseModel):
+    pid: int
+    slots: list[BrowserSlot]
+
+    def port_for(self, profile: str, slot: int) -> int | None:
+        return next((s.port for s in self.slots if s.profile == profile and s.slot == slot), None)
+
+def profile_path(profile: str, slot: int) -> Path:
+    return PROFILE_DIR / f"{profile}-{slot}"
+
+def read_state() -> ServiceState | None:
+    """The running service's browsers, None if no service is running"""
+    try:
+        state = ServiceState.model_validate_json(STATE_PATH.read_text())
+        os.kill(state.pid, 0)
+    except (OSError, ValueError):
+        return None
+    return state
+
+def chrome_alive(port: int) -> bool:
+    """Whether a browser answers on its remote debugging port"""
+    try:
+        return requests.get(f"http://127.0.0.1:{port}/json/version", timeout=2).ok
+    except requests.RequestException:
+        return False
+
+def claim_slot(profile: str) -> tuple[int, IO]:
+    """Lock the first free slot of a profile, held until the returned file is closed or the process exits"""
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    for slot in range(MAX_SLOTS):
+        lock_file = open(PROFILE_DIR / f"{profile}-{slot}.lock", "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            continue
+        return slot, lock_file
+    raise RuntimeError(f"All {MAX_SLOTS} {profile} browser slots are in use")
+
+class ProfileDriver(webdriver.Chrome):
+    """A Chrome driver holding a profile slot, which is freed on quit.
+    Quitting a driver attached to the service's browser leaves the browser running."""
+    def __init__(self, options: webdriver.ChromeOptions, slot_lock: IO):
+        self.slot_lock = slot_lock
+        try:
+            super().__init__(options=options)
+        except Exception:
+            slot_lock.close()
+            raise
+
+    def quit(self):
+        try:
+            super().quit()
+        finally:
+            self.slot_lock.close()
+
+def connect_driver(
+    profile: str, configure: Callable[[webdriver.ChromeOptions], None] | None = None, mode: DriverMode | None = None,
+) -> ProfileDriver:
+    """A driver on a persistent browser profile, attached to the browser service's browser for the slot if
+    it runs one, else on a Chrome started here. configure adds options for a Chrome started here.
+    mode defaults to browser_settings.mode."""
+    mode = mode or browser_settings.mode
+    slot, slot_lock = claim_slot(profile)
+    options = webdriver.ChromeOptions()
+    if mode == "lean":
+        # DOMContentLoaded is enough, wait_for_page_ready waits for the content we read
+        options.page_load_strategy = "eager"
+    state = read_state()
+    port = state.port_for(profile, slot) if state else None
+    if port is not None:
+        deadline = time.monotonic() + RESTART_WAIT
+        while not chrome_alive(port):
+            if time.monotonic() > deadline:
+                slot_lock.close()
+                raise RuntimeError(f"Browser service's {profile} browser {slot} isn't answering on port {port}")
+            time.sleep(1)
+        options.debugger_address = f"127.0.0.1:{port}"
+    else:
+        options.add_argument(f"--user-data-dir={profile_path(profile, slot).resolve()}")
+        if configure is not None:
+            configure(options)
+        if mode == "lean":
+            configure_lean(options)
+    driver = ProfileDriver(options, slot_lock)
+    if mode == "lean":
+        try:
+            # Blocking works on the service's browsers too, as it is per session rather than a launch option
+            block_resources(driver)
+        except Exception:
+            # Nobody else holds the driver yet, so quit it here to free Chrome and the slot
+            driver.quit()
+            raise
+    return driver
+
+def chrome_binary() -> str:
+    binary = os.environ.get("CHROME_BINARY") or next(filter(None, map(shutil.which, CHROME_BINARIES)), None)
+    if binary is None:
+        raise RuntimeError(f"Chrome not found, set CHROME_BINARY (looked for {', '.join(CHROME_BINARIES)})")
+    return binary
+
+def launch_chrome(browser: BrowserSlot, headless: bool = False) -> subprocess.Popen:
+    args = [
+        chrome_binary(),
+        f"--remote-debugging-port={browser.port}",
+        f"--user-data-dir={profile_path(browser.profile, browser.slot).resolve()}",
+        "--no-sandbox", "--disable-dev-shm-usage", "--no-first-run", "--no-default-browser-check", "--start-maximized",
+    ]
+    if headless:
+        args.append("--headless=new")
+    return subprocess.Popen(args + ["about:blank"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def _stop(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+def run_service(slots: dict[str, int], check_interval: float = 10, headless: bool = False):
+    """Keep slots[profile] browsers running per profile until interrupted, restarting any that stop answering"""
+    if read_state() is not None:
+        raise RuntimeError(f"A browser service is already running, see {STATE_PATH}")
+    browsers = [
+        BrowserSlot(profile=profile, slot=slot, port=BASE_PORT + i)
+        for i, (profile, slot) in enumerate((profile, slot) for profile, n in slots.items() for slot in range(n))
+    ]
+    processes: dict[int, subprocess.Popen] = {}
+
+    def start(browser: BrowserSlot):
+        process = launch_chrome(browser, headless)
+        processes[browser.port] = process
+        browser.pid = process.pid
+        STATE_PATH.write_text(ServiceState(pid=os.getpid(), slots=browsers).model_dump_json(indent=4))
+
+    def shutdown(signum, frame):
+        raise KeyboardInterrupt
+
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    signal.signal(signal.SIGTERM, shutdown)
+    try:
+        for browser in browsers:
+            start(browser)
+            print(f"[green]Started {browser.profile} browser {browser.slot} on port {browser.port}[/green]")
+        # A browser gets a while to come up before its first health check
+        last_restart = {browser.port: time.monotonic() for browser in browsers}
+        while True:
+            time.sleep(check_interval)
+            for browser in browsers:
+                if time.monotonic() - last_restart[browser.port] < RESTART_WAIT or chrome_alive(browser.port):
+                    continue
+                print(f"[yellow]{browser.profile} browser {browser.slot} on port {browser.port} stopped answering, restarting[/yellow]")
+                _stop(processes[browser.port])
+                start(browser)
+                last_restart[browser.port] = time.monotonic()
+    except KeyboardInterrupt:
+        print("[blue]Stopping browsers...[/blue]")
+    finally:
+        for process in processes.values():
+            _stop(process)
+        STATE_PATH.unlink(missing_ok=True)
+
+def service_status() -> list[tuple[BrowserSlot, bool]]:
+    """The running service's browsers and whether each is answering"""
+    state = read_state()
+    if state is None:
+        return []
+    return [(browser, chrome_alive(browser.port)) for browser in state.slots]
@@ -0,0 +1,174 @@
+import re
+import threading
+from collections import Counter
+from typing import Literal
+from urllib.parse import urlparse
+from pydantic import BaseModel
+from utils import (
+    LinkData, LinkSchemeMatcher, Paper, SmartLinkScrapeResult, read_link_decisions, recent_scrape_filenames,
+)
+from llm import link_candidates
+
+LinkDecision = Literal["accept", "reject", "ambiguous"]
+# (first path segment, kind of id in the path, file extension)
+LinkShape = tuple[str, str, str]
+
+# Path segments which never lead to an article when they end the path, like /games or /account/login
+UTILITY_SEGMENTS = {
+    "login", "signin", "sign-in", "logout", "register", "signup", "sign-up", "subscribe", "subscription",
+    "subscriptions", "account", "myaccount", "my-account", "newsletter", "newsletters", "search", "privacy",
+    "privacy-policy", "terms", "terms-and-conditions", "cookies", "cookie-policy", "contact", "contact-us",
+    "about", "about-us", "help", "faq", "advertise", "jobs", "careers", "puzzles", "crosswords", "games",
+    "shop", "offers", "vouchers", "podcasts", "video", "videos", "weather", "horoscopes", "sitemap",
+    "topic", "topics", "tag", "tags", "author", "authors", "profile", "all-about", "latest", "live-tv",
+}
+# Query parameters added by share buttons and login redirects, dropped before the link is judged
+UTILITY_QUERY_KEYS = {"share", "redirect", "returnurl", "return_url", "next", "ref_login"}
+
+UUID_RE = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}", re.IGNORECASE)
+NUMERIC_ID_RE = re.compile(r"(?<![0-9])[0-9]{6,}(?![0-9])")
+DATE_PATH_RE = re.compile(r"/(19|20)[0-9]{2}/([a-z]{3}|[01]?[0-9])/[0-3]?[0-9]/", re.IGNORECASE)
+
+# A learnt shape needs this many previous decisions, all going one way, before we trust it
+MIN_SHAPE_SUPPORT = 5
+# Headlines are long, navigation text is short
+MIN_HEADLINE_CHARS = 30
+MIN_SLUG_WORDS = 5
+
+def _segments(path: str) -> list[str]:
+    return [segment for segment in path.split("/") if segment]
+
+def id_kind(href: str) -> str:
+    path = urlparse(href).path
+    if UUID_RE.search(path):
+        return "uuid"
+    if DATE_PATH_RE.search(path):
+        return "date"
+    if NUMERIC_ID_RE.search(path):
+        return "numeric"
+    return "none"
+
+def link_shape(href: str) -> LinkShape:
+    """A coarse signature of a URL's structure, links to articles on a paper tend to share a few of these"""
+    path = urlparse(href).path
+    segments = _segments(path)
+    first = segments[0].lower() if len(segments) > 1 else ""
+    last = segments[-1] if segments else ""
+    extension = last.rsplit(".", 1)[1].lower() if "." in last else ""
+    return (first, id_kind(href), extension)
+
+class LinkPatterns(BaseModel):
+    """Shapes which a paper's previous LLM link filtering always accepted or always rejected"""
+    accepted: set[LinkShape] = set()
+    rejected: set[LinkShape] = set()
+
+def learn_link_patterns(paper: Paper) -> LinkPatterns:
+    """Learn from previous batches' LLM link filtering, only the links the LLM decided rather than the prefilter"""
+    accepted_counts: Counter[LinkShape] = Counter()
+    rejected_counts: Counter[LinkShape] = Counter()
+    for filename in recent_scrape_filenames("links_llm", paper):
+        try:
+            decisions = read_link_decisions(filename)
+        except (OSError, ValueError):
+            continue
+        kept = set(decisions.kept)
+        for href in decisions.asked:
+            if href in kept:
+                accepted_counts[link_shape(href)] += 1
+            else:
+                rejected_counts[link_shape(href)] += 1
+    return LinkPatterns(
+        accepted={s for s, n in accepted_counts.items() if n >= MIN_SHAPE_SUPPORT and rejected_counts[s] == 0},
+        rejected={s for s, n in rejected_counts.items() if n >= MIN_SHAPE_SUPPORT and accepted_counts[s] == 0},
+    )
+
+_patterns_cache: dict[Paper, LinkPatterns] = {}
+_patterns_lock = threading.Lock()
+
+def patterns_for_paper(paper: Paper) -> LinkPatterns:
+    """learn_link_patterns, learnt once per paper per process"""
+    with _patterns_lock:
+        if paper not in _patterns_cache:
+            _patterns_cache[paper] = learn_link_patterns(paper)
+        return _patterns_cache[paper]
+
+def without_utility_query(link: LinkData) -> LinkData:
+    """The link without share and redirect parameters, keeping the rest of the query as it was encoded"""
+    parsed = urlparse(link.href)
+    parts = [part for part in parsed.query.split("&") if part]
+    kept = [part for part in parts if part.split("=", 1)[0].lower() not in UTILITY_QUERY_KEYS]
+    if len(kept) == len(parts):
+        return link
+    return link.model_copy(update={"href": parsed._replace(query="&".join(kept)).geturl()})
+
+def classify_link(link: LinkData, patterns: LinkPatterns, scheme_matcher: LinkSchemeMatcher | None = None) -> LinkDecision:
+    segments = [segment.lower() for segment in _segments(urlparse(link.href).path)]
+    shape = link_shape(link.href)
+    kind = shape[1]
+    slug_words = max((len(segment.split("-")) for segment in segments), default=0)
+    # An id, a date or a long slug in the path, however the sections around it are named
+    article_shaped = len(segments) >= 2 and (kind in ("uuid", "numeric", "date") or slug_words >= MIN_SLUG_WORDS)
+
+    # Obvious non-articles: utility pages and paginated topic pages
+    if segments and segments[-1] in UTILITY_SEGMENTS and not article_shaped:
+        return "reject"
+    if scheme_matcher is not None and scheme_matcher.matches(link.href):
+        return "reject"
+
+    # What the LLM has consistently decided for this shape before
+    if shape in patterns.accepted:
+        return "accept"
+    if shape in patterns.rejected:
+        return "reject"
+
+    # Articles have an id or date in their path, or a long slug with a headline as link text
+    if len(segments) >= 2 and kind in ("uuid", "numeric", "date"):
+        return "accept"
+    if len(segments) >= 2 and slug_words >= MIN_SLUG_WORDS and len(link.text) >= MIN_HEADLINE_CHARS:
+        return "accept"
+    # Section roots like /news or /technology
+    if len(segments) <= 1 and kind == "none":
+        return "reject"
+    return "ambiguous"
+
+class PrefilterResult(BaseModel):
+    candidates: list[LinkData]
+    accepted: list[LinkData]
+    rejected: list[LinkData]
+    ambiguous: list[LinkData]
+
+    @property
+    def decided_fraction(self) -> float:
+        if not self.candidates:
+            return 1.0
+        return 1 - len(self.ambiguous) / len(self.candidates)
+
+    def remainder(self) -> SmartLinkScrapeResult:
+        """The ambiguous links, as a scrape result which filter_links can take"""
+        return SmartLinkScrapeResult(once_links=self.ambiguous, schema_links=[], multiple_links=[], all_links=[])
+
+    def combine(self, llm_links: list[LinkData]) -> list[LinkData]:
+        """Locally accepted links plus those the LLM kept, in the original candidate order"""
+        kept = {link.href for link in self.accepted} | {link.href for link in llm_links}
+        return [link for link in self.candidates if link.href in kept]
+
+def prefilter_links(paper: Paper | None, scrape_result: SmartLinkScrapeResult) -> PrefilterResult:
+    """Decide high confidence links locally, leaving only the ambiguous ones for the LLM"""
+    candidates = link_candidates(scrape_result)
+    if paper is None:
+        return PrefilterResult(candidates=candidates, accepted=[], rejected=[], ambiguous=candidates)
+    # A shared article is still the article, once the share parameters are gone
+    stripped = {link.href: link for link in map(without_utility_query, candidates)}
+    candidates = list(stripped.values())
+    patterns = patterns_for_paper(paper)
+    # Topic pages past the ones we collected are still topic pages
+    scheme_matcher = LinkSchemeMatcher.for_paper(paper, 50)
+    decisions: dict[LinkDecision, list[LinkData]] = {"accept": [], "reject": [], "ambiguous": []}
+    for link in candidates:
+        decisions[classify_link(link, patterns, scheme_matcher)].append(link)
+    return PrefilterResult(
+        candidates=candidates,
+        accepted=decisions["accept"],
+        rejected=decisions["reject"],
+        ambiguous=decisions["ambiguous"],
+    )
@@ -1,12 +1,166 @@
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from dotenv import load_dotenv
 import os
 import json
-from utils import SmartLinkScrapeResult, LinkData
+import asyncio
+import difflib
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Literal
+from utils import SmartLinkScrapeResult, LinkData, LLM_CACHE_DIR
 from pydantic import BaseModel
+from rate_limit import RateLimiter, with_retries
 
 load_dotenv()
+# Both clients honour OPENAI_BASE_URL, so they can be pointed at stub_responses_server.py
 client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+# Retries are handled by rate_limit.with_retries, so that they back off with jitter
+async_client = AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"), max_retries=0)
+
+MODEL = "gpt-5"
+
+class LLMCache:
+    """On-disk cache of parsed LLM outputs, keyed by a hash of the model, instructions, input and output schema.
+    Hits refresh an entry's mtime, and the least recently used entries are evicted past max_bytes."""
+    def __init__(self, directory: Path, max_bytes: int = 1024**3):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        self._size: int | None = None
+        self._lock = threading.Lock()
+    
+    def key(self, request: dict) -> str:
+        text_format: type[BaseModel] = request["text_format"]
+        keyed = {
+            "model": request["model"],
+            "reasoning": request.get("reasoning"),
+            "instructions": request["instructions"],
+            "input": request["input"],
+            "schema": text_format.model_json_schema(),
+        }
+        return hashlib.sha256(json.dumps(keyed, sort_keys=True).encode()).hexdigest()
+    
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+    
+    def get(self, key: str, text_format: type[BaseModel]) -> BaseModel | None:
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            parsed = text_format.model_validate_json(path.read_text())
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return parsed
+    
+    def put(self, key: str, parsed: BaseModel):
+        if not self.enabled:
+            return
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = parsed.model_dump_json()
+        # Write then rename, so concurrent readers never see a partial entry
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp_path.write_text(data)
+        tmp_path.replace(path)
+        with self._lock:
+            if self._size is None:
+                self._size = sum(p.stat().st_size for p in self.directory.rglob("*.json"))
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+    
+    def _evict(self):
+        # Drop the least recently used entries until we are comfortably under the limit
+        entries = []
+        for p in self.directory.rglob("*.json"):
+            stat = p.stat()
+            entries.append((stat.st_mtime, stat.st_size, p))
+        entries.sort()
+        self._size = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, p in entries:
+            if self._size <= target:
+                break
+            p.unlink(missing_ok=True)
+            self._size -= size
+    
+    def summary(self) -> str:
+        if not self.enabled:
+            return "LLM cache disabled"
+        return f"LLM cache: {self.hits} hits, {self.misses} misses"
+
+llm_cache = LLMCache(LLM_CACHE_DIR)
+
+class LLMUsage:
+    """Running totals of the requests made and tokens billed, cache hits cost nothing so aren't counted"""
+    def __init__(self):
+        self.requests = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self._lock = threading.Lock()
+    
+    def add(self, usage):
+        # usage is the Responses API usage object, or its dict form from Batch API output
+        if isinstance(usage, dict):
+            input_tokens, output_tokens = usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+        elif usage is not None:
+            input_tokens, output_tokens = usage.input_tokens, usage.output_tokens
+        else:
+            input_tokens = output_tokens = 0
+        with self._lock:
+            self.requests += 1
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+    
+    def reset(self):
+        with self._lock:
+            self.requests = self.input_tokens = self.output_tokens = 0
+    
+    def summary(self) -> str:
+        return f"LLM usage: {self.requests} requests, {self.input_tokens} input tokens, {self.output_tokens} output tokens"
+
+llm_usage = LLMUsage()
+
+def _parse(request: dict) -> BaseModel | None:
+    """client.responses.parse, answered from the cache when we have seen this exact request before"""
+    key = llm_cache.key(request)
+    cached = llm_cache.get(key, request["text_format"])
+    if cached is not None:
+        return cached
+    response = client.responses.parse(**request)
+    llm_usage.add(response.usage)
+    parsed = response.output_parsed
+    if parsed is not None:
+        llm_cache.put(key, parsed)
+    return parsed
+
+async def _parse_async(request: dict, limiter: RateLimiter | None = None, tokens: int = 0) -> BaseModel | None:
+    """Async _parse, waiting on `limiter` before each request and retrying rate limit and server errors"""
+    key = llm_cache.key(request)
+    cached = llm_cache.get(key, request["text_format"])
+    if cached is not None:
+        return cached
+    async def call():
+        if limiter is not None:
+            await limiter.acquire(tokens)
+        return await async_client.responses.parse(**request)
+    response = await with_retries(call)
+    llm_usage.add(response.usage)
+    parsed = response.output_parsed
+    if parsed is not None:
+        llm_cache.put(key, parsed)
+    return parsed
 
 class FilteredLinks(BaseModel):
     links: list[LinkData]
@@ -14,77 +168,384 @@ class FilteredLinks(BaseModel):
 class ArticleExtractionResult(BaseModel):
     content: str
     is_article: bool
+
+class ArticleClassification(BaseModel):
+    is_article: bool
+    reason: str
+
+class ChunkExtractionResult(BaseModel):
+    content: str
+
+class ParagraphSpan(BaseModel):
+    # Inclusive paragraph numbers
+    start: int
+    end: int
+
+class ArticleSpans(BaseModel):
+    is_article: bool
+    reason: str
+    spans: list[ParagraphSpan]
     
-def filter_links(scrape_result: SmartLinkScrapeResult) -> list[LinkData]:
-    # Combine once_links and multiple_links for filtering
-    candidates = (
-        scrape_result.once_links 
-        + scrape_result.multiple_links # can comment out these links, less likely to be good
-    )
+def _strict_schema(node):
+    """A JSON schema as structured outputs' strict mode takes it: every property required, no others allowed, no defaults"""
+    if isinstance(node, list):
+        return [_strict_schema(item) for item in node]
+    if not isinstance(node, dict):
+        return node
+    strict = {key: _strict_schema(value) for key, value in node.items() if key != "default"}
+    if strict.get("type") == "object" and "properties" in strict:
+        strict["required"] = list(strict["properties"])
+        strict["additionalProperties"] = False
+    return strict
+
+def text_format_param(text_format: type[BaseModel]) -> dict:
+    """The Responses API text.format for a structured output model"""
+    return {
+        "type": "json_schema",
+        "name": text_format.__name__,
+        "schema": _strict_schema(text_format.model_json_schema()),
+        "strict": True,
+    }
+
+def request_body(request: dict) -> dict:
+    """The JSON body of a /v1/responses call for a request, as used in Batch API input files"""
+    body = {key: value for key, value in request.items() if key != "text_format"}
+    body["text"] = {"format": text_format_param(request["text_format"])}
+    return body
+
+def parse_response_body(body: dict, text_format: type[BaseModel]) -> BaseModel | None:
+    """Parse the structured output from a raw Responses API response body"""
+    for item in body.get("output", []):
+        if item.get("type") != "message":
+            continue
+        for content in item.get("content", []):
+            if content.get("type") == "output_text":
+                return text_format.model_validate_json(content["text"])
+    return None
+
+LINK_FILTER_INSTRUCTIONS = (
+    "You will be given a list of links taken from a webpage on a news site. "
+    "Your task is to extract the links which refer to articles. "
+    "You should remove links to things like settings, homepages, advertisements. "
+    "Return only the hrefs of article links."
+    "Article links will usually have some kind of id or some article title/keywords in their link text."
+)
+
+def links_request(candidates: list[LinkData]) -> dict:
     # Just pass the hrefs and text for the LLM to evaluate
     link_summaries = [{"href": l.href, "text": l.text} for l in candidates]
-    
-    response = client.responses.parse(
-        model="gpt-5",
+    return dict(
+        model=MODEL,
         reasoning={"effort": "low"},
-        instructions=(
-            "You will be given a list of links taken from a webpage on a news site. "
-            "Your task is to extract the links which refer to articles. "
-            "You should remove links to things like settings, homepages, advertisements. "
-            "Return only the hrefs of article links."
-            "Article links will usually have some kind of id or some article title/keywords in their link text."
-        ),
+        instructions=LINK_FILTER_INSTRUCTIONS,
         input=json.dumps(link_summaries),
         text_format=FilteredLinks,
     )
-    
-    if not response.output_parsed:
+
+def link_candidates(scrape_result: SmartLinkScrapeResult) -> list[LinkData]:
+    # Combine once_links and multiple_links for filtering
+    return (
+        scrape_result.once_links 
+        + scrape_result.multiple_links # can comment out these links, less likely to be good
+    )
+
+def filtered_links_result(parsed: FilteredLinks | None, scrape_result: SmartLinkScrapeResult) -> list[LinkData]:
+    if not parsed:
         print("Issue in LLM link filtering, didn't get JSON back from API.")
         return scrape_result.once_links
-    filtered_hrefs = {l.href for l in response.output_parsed.links}
+    filtered_hrefs = {l.href for l in parsed.links}
     
-    return [l for l in candidates if l.href in filtered_hrefs]
+    return [l for l in link_candidates(scrape_result) if l.href in filtered_hrefs]
+
+def request_link_filter(scrape_result: SmartLinkScrapeResult) -> FilteredLinks | None:
+    """The LLM's choice of article links among a scrape's candidates, None if it gave no usable answer"""
+    return _parse(links_request(link_candidates(scrape_result)))  # type: ignore[return-value]
+
+def filter_links(scrape_result: SmartLinkScrapeResult) -> list[LinkData]:
+    return filtered_links_result(request_link_filter(scrape_result), scrape_result)
 
-def extract_article_text(article_body_text: str) -> tuple[str, bool]:
+ARTICLE_EXTRACTION_INSTRUCTIONS = (
+    "You will be given the text taken from a webpage which may contain a newspaper article."
+    "\n\n"
+    "First, determine if this is actually an article page or if it's something else like:"
+    "- A listing/index page (showing multiple article headlines and teasers)"
+    "- A navigation page"
+    "- A category page"
+    "- A search results page"
+    "- Any other non-article content"
+    "\n\n"
+    "If it IS a valid article:"
+    "- Extract the article text verbatim, not changing any content."
+    "- Remove the header and footer text, that came from hyperlinks, and other parts of the webpage, which is not related to the article."
+    "- Remove non-article content such as 'Last modified on Tue 9 Dec 2025 02.02 EST' or 'Composite: Guardian Design; MR.Cole_Photographer; J Studios/Getty Images'"
+    "- Set is_article to true"
+    "\n\n"
+    "If it is NOT a valid article (e.g., a listing page):"
+    "- Set is_article to false"
+    "- In the content field, provide a brief explanation of why it's not an article (e.g., 'This is a listing page showing multiple article headlines')"
+)
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English text
+    return len(text) // 4 + 1
+
+def article_request(article_body_text: str) -> dict:
+    return dict(
+        model=MODEL,
+        reasoning={"effort": "low"},
+        instructions=ARTICLE_EXTRACTION_INSTRUCTIONS,
+        input=article_body_text,
+        text_format=ArticleExtractionResult,
+    )
+
+def article_result(parsed: ArticleExtractionResult | None, article_body_text: str) -> tuple[str, bool]:
+    if not parsed:
+        # Fallback: return original text and assume it's an article
+        return article_body_text, True
+    return parsed.content, parsed.is_article
+
+# Bodies longer than this (live blogs, long reads) are cleaned in overlapping chunks, concurrently
+CHUNK_THRESHOLD_CHARS = 20_000
+CHUNK_CHARS = 8_000
+CHUNK_OVERLAP_CHARS = 800
+# The start of a page is enough to tell an article from a listing page
+CLASSIFICATION_CHARS = 4_000
+
+ARTICLE_CLASSIFICATION_INSTRUCTIONS = (
+    "You will be given the start of the text taken from a webpage which may contain a newspaper article."
+    "\n\n"
+    "Determine if this is actually an article page or if it's something else like a listing/index page, "
+    "a navigation page, a category page, a search results page or any other non-article content."
+    "\n\n"
+    "Set is_article accordingly, and give a brief reason (e.g., 'This is a listing page showing multiple article headlines')."
+)
+
+CHUNK_EXTRACTION_INSTRUCTIONS = (
+    "You will be given one part of the text taken from a webpage containing a long newspaper article. "
+    "Neighbouring parts overlap with it by a few lines."
+    "\n\n"
+    "- Extract the article text in this part verbatim, not changing any content."
+    "- Remove the header and footer text, that came from hyperlinks, and other parts of the webpage, which is not related to the article."
+    "- Remove non-article content such as 'Last modified on Tue 9 Dec 2025 02.02 EST' or 'Composite: Guardian Design; MR.Cole_Photographer; J Studios/Getty Images'"
+    "- Keep article lines whole, even at the very start or end of the part."
+    "- If the part contains no article text, return empty content."
+)
+
+def split_into_chunks(text: str, chunk_chars: int = CHUNK_CHARS, overlap_chars: int = CHUNK_OVERLAP_CHARS) -> list[str]:
+    """Split text on line boundaries into chunks of about chunk_chars, each starting with
+    the last overlap_chars or so of the previous chunk's lines"""
+    lines = text.splitlines()
+    chunks: list[str] = []
+    start = 0
+    while start < len(lines):
+        end = start
+        size = 0
+        while end < len(lines) and (end == start or size + len(lines[end]) <= chunk_chars):
+            size += len(lines[end]) + 1
+            end += 1
+        chunks.append("\n".join(lines[start:end]))
+        if end >= len(lines):
+            break
+        # Step back over whole lines for the overlap, always moving forward at least one line
+        next_start = end
+        overlap = 0
+        while next_start - 1 > start and overlap + len(lines[next_start - 1]) <= overlap_chars:
+            next_start -= 1
+            overlap += len(lines[next_start]) + 1
+        start = next_start
+    return chunks
+
+def _overlap_length(tail: list[str], lines: list[str]) -> int:
+    """How many of a chunk's leading lines repeat the end of the text so far"""
+    # Longest run of leading lines that the tail ends with
+    for k in range(min(len(tail), len(lines)), 0, -1):
+        if tail[-k:] == lines[:k]:
+            return k
+    # The model may have reworded a line of the overlap in one chunk only. Allow that while the
+    # leading lines still match up to the very end of the tail, and mostly match along the way.
+    blocks = [block for block in difflib.SequenceMatcher(None, tail, lines, autojunk=False).get_matching_blocks() if block.size]
+    if not blocks or blocks[-1].a + blocks[-1].size != len(tail):
+        return 0
+    overlap = blocks[-1].b + blocks[-1].size
+    return overlap if 2 * sum(block.size for block in blocks) >= overlap else 0
+
+def stitch_chunks(cleaned_chunks: list[str], overlap_chars: int = CHUNK_OVERLAP_CHARS) -> str:
+    """Join cleaned chunks, dropping the lines each one repeats from the end of the previous.
+    Blank lines are kept, so paragraphs stay separated as in articles cleaned whole."""
+    stitched: list[str] = []
+    for chunk in cleaned_chunks:
+        lines = chunk.strip("\n").splitlines()
+        content = [i for i, line in enumerate(lines) if line.strip()]
+        if not content:
+            continue
+        # Only the end of the text so far can overlap with this chunk
+        tail: list[str] = []
+        tail_chars = 0
+        for line in reversed(stitched):
+            if tail_chars > 2 * overlap_chars:
+                break
+            if line.strip():
+                tail.insert(0, line.strip())
+                tail_chars += len(line)
+        repeated = _overlap_length(tail, [lines[i].strip() for i in content])
+        if repeated:
+            rest = lines[content[repeated - 1] + 1:]
+        else:
+            rest = lines
+            # Chunks split between paragraphs lose the blank line between them
+            if stitched and ("" in stitched or any(not line.strip() for line in lines)):
+                rest = [""] + rest
+        # Blank lines between paragraphs, never more than one in a row
+        for line in rest:
+            if line.strip() or (stitched and stitched[-1].strip()):
+                stitched.append(line if line.strip() else "")
+    while stitched and not stitched[-1].strip():
+        stitched.pop()
+    return "\n".join(stitched)
+
+def classification_request(article_body_text: str) -> dict:
+    return dict(
+        model=MODEL,
+        reasoning={"effort": "low"},
+        instructions=ARTICLE_CLASSIFICATION_INSTRUCTIONS,
+        input=article_body_text[:CLASSIFICATION_CHARS],
+        text_format=ArticleClassification,
+    )
+
+def chunk_request(chunk: str) -> dict:
+    return dict(
+        model=MODEL,
+        reasoning={"effort": "low"},
+        instructions=CHUNK_EXTRACTION_INSTRUCTIONS,
+        input=chunk,
+        text_format=ChunkExtractionResult,
+    )
+
+def chunked_article_result(
+    classification: ArticleClassification | None,
+    chunk_results: list[ChunkExtractionResult | None],
+    chunks: list[str],
+) -> tuple[str, bool]:
+    if classification is not None and not classification.is_article:
+        return classification.reason, False
+    # Fallback for any chunk we got nothing back for: keep its original text
+    cleaned = [parsed.content if parsed else chunk for parsed, chunk in zip(chunk_results, chunks)]
+    return stitch_chunks(cleaned), True
+
+def _chunks_for(article_body_text: str, chunk_threshold: int | None) -> list[str] | None:
+    if chunk_threshold is None or len(article_body_text) <= chunk_threshold:
+        return None
+    chunks = split_into_chunks(article_body_text)
+    return chunks if len(chunks) > 1 else None
+
+# verbatim has the model write the article back out, spans only has it point at the paragraphs to keep
+ExtractionMode = Literal["verbatim", "spans"]
+
+ARTICLE_SPANS_INSTRUCTIONS = (
+    "You will be given the text taken from a webpage which may contain a newspaper article, "
+    "split into paragraphs each prefixed with its number in square brackets."
+    "\n\n"
+    "First, determine if this is actually an article page or if it's something else like:"
+    "- A listing/index page (showing multiple article headlines and teasers)"
+    "- A navigation page"
+    "- A category page"
+    "- A search results page"
+    "- Any other non-article content"
+    "\n\n"
+    "If it IS a valid article:"
+    "- Return the ranges of paragraph numbers (start and end inclusive) which make up the article text, in order."
+    "- Leave out the header and footer text, that came from hyperlinks, and other parts of the webpage, which is not related to the article."
+    "- Leave out non-article paragraphs such as 'Last modified on Tue 9 Dec 2025 02.02 EST' or 'Composite: Guardian Design; MR.Cole_Photographer; J Studios/Getty Images'"
+    "- Set is_article to true"
+    "\n\n"
+    "If it is NOT a valid article (e.g., a listing page):"
+    "- Set is_article to false, return no spans"
+    "- In the reason field, provide a brief explanation of why it's not an article (e.g., 'This is a listing page showing multiple article headlines')"
+)
+
+def split_paragraphs(text: str) -> list[str]:
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+def spans_request(article_body_text: str) -> dict:
+    numbered = "\n".join(f"[{i}] {paragraph}" for i, paragraph in enumerate(split_paragraphs(article_body_text)))
+    return dict(
+        model=MODEL,
+        reasoning={"effort": "low"},
+        instructions=ARTICLE_SPANS_INSTRUCTIONS,
+        input=numbered,
+        text_format=ArticleSpans,
+    )
+
+def spans_result(parsed: ArticleSpans | None, article_body_text: str) -> tuple[str, bool]:
+    """Rebuild the article from the paragraphs the model picked out"""
+    if not parsed:
+        # Fallback: return original text and assume it's an article
+        return article_body_text, True
+    if not parsed.is_article:
+        return parsed.reason, False
+    paragraphs = split_paragraphs(article_body_text)
+    kept: list[int] = []
+    for span in parsed.spans:
+        # Ranges may overlap or run past the end, keep each paragraph once
+        for i in range(max(span.start, 0), min(span.end, len(paragraphs) - 1) + 1):
+            if i not in kept:
+                kept.append(i)
+    return "\n".join(paragraphs[i] for i in kept), True
+
+def extraction_request(article_body_text: str, mode: ExtractionMode = "verbatim") -> dict:
+    return spans_request(article_body_text) if mode == "spans" else article_request(article_body_text)
+
+def extraction_result(parsed: BaseModel | None, article_body_text: str, mode: ExtractionMode = "verbatim") -> tuple[str, bool]:
+    return spans_result(parsed, article_body_text) if mode == "spans" else article_result(parsed, article_body_text)
+
+def extract_article_text(
+    article_body_text: str, chunk_threshold: int | None = CHUNK_THRESHOLD_CHARS, mode: ExtractionMode = "verbatim",
+) -> tuple[str, bool]:
     """Extract article text and determine if it's a valid article.
     
     Returns:
         tuple[str, bool]: (cleaned_content, is_article)
         - cleaned_content: The extracted article text
         - is_article: True if this is a valid article, False if it's a listing page, navigation, or non-article content
+    
+    Bodies longer than chunk_threshold are cleaned as overlapping chunks in parallel, alongside
+    one short call deciding is_article, so they take about as long as a single chunk.
+    In spans mode the model only returns which paragraphs to keep, so the output is short and nothing is chunked.
     """
-    response = client.responses.parse(
-        model="gpt-5",
-        reasoning={"effort": "low"},
-        instructions=(
-            "You will be given the text taken from a webpage which may contain a newspaper article."
-            "\n\n"
-            "First, determine if this is actually an article page or if it's something else like:"
-            "- A listing/index page (showing multiple article headlines and teasers)"
-            "- A navigation page"
-            "- A category page"
-            "- A search results page"
-            "- Any other non-article content"
-            "\n\n"
-            "If it IS a valid article:"
-            "- Extract the article text verbatim, not changing any content."
-            "- Remove the header and footer text, that came from hyperlinks, and other parts of the webpage, which is not related to the article."
-            "- Remove non-article content such as 'Last modified on Tue 9 Dec 2025 02.02 EST' or 'Composite: Guardian Design; MR.Cole_Photographer; J Studios/Getty Images'"
-            "- Set is_article to true"
-            "\n\n"
-            "If it is NOT a valid article (e.g., a listing page):"
-            "- Set is_article to false"
-            "- In the content field, provide a brief explanation of why it's not an article (e.g., 'This is a listing page showing multiple article headlines')"
-        ),
-        input=article_body_text,
-        text_format=ArticleExtractionResult,
-    )
+    if mode == "spans":
+        return spans_result(_parse(spans_request(article_body_text)), article_body_text)
+    chunks = _chunks_for(article_body_text, chunk_threshold)
+    if chunks is None:
+        parsed = _parse(article_request(article_body_text))
+        return article_result(parsed, article_body_text)
     
-    if not response.output_parsed:
-        # Fallback: return original text and assume it's an article
-        return article_body_text, True
+    with ThreadPoolExecutor(max_workers=len(chunks) + 1) as executor:
+        classification = executor.submit(_parse, classification_request(article_body_text))
+        chunk_results = list(executor.map(_parse, [chunk_request(chunk) for chunk in chunks]))
+        return chunked_article_result(classification.result(), chunk_results, chunks)
+
+async def extract_article_text_async(
+    article_body_text: str, limiter: RateLimiter | None = None, chunk_threshold: int | None = CHUNK_THRESHOLD_CHARS,
+    mode: ExtractionMode = "verbatim",
+) -> tuple[str, bool]:
+    """Async version of extract_article_text, rate limited by `limiter`"""
+    if mode == "spans":
+        request = spans_request(article_body_text)
+        # The numbered paragraphs are sent, and a few ranges come back
+        parsed = await _parse_async(request, limiter, estimate_tokens(request["input"]) + 100)
+        return spans_result(parsed, article_body_text)
+    chunks = _chunks_for(article_body_text, chunk_threshold)
+    if chunks is None:
+        # The article is sent once and written back out once, more or less
+        parsed = await _parse_async(article_request(article_body_text), limiter, 2 * estimate_tokens(article_body_text))
+        return article_result(parsed, article_body_text)
     
-    return response.output_parsed.content, response.output_parsed.is_article
+    request = classification_request(article_body_text)
+    classification, *chunk_results = await asyncio.gather(
+        _parse_async(request, limiter, estimate_tokens(request["input"])),
+        *(_parse_async(chunk_request(chunk), limiter, 2 * estimate_tokens(chunk)) for chunk in chunks),
+    )
+    return chunked_article_result(classification, chunk_results, chunks)
 
 if __name__ == "__main__":
     with open("example_article_llm_test.txt", "r") as file:
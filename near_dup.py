@@ -0,0 +1,142 @@
+"""Find near-duplicate articles, such as wire stories syndicated across papers, with MinHash and LSH.
+
+Each article's distinct word 5-grams are hashed once and reduced to a one-permutation MinHash
+signature, the smallest hash falling in each of SIGNATURE_SIZE buckets, so signing is a single pass
+over the text. Signatures are split into bands for an LSH index, so an article is only compared with
+those sharing a band, and pairs whose estimated Jaccard similarity reaches the threshold are joined
+into clusters. Shingles are hashed with Python's hash, so signatures only compare within one process.
+"""
+import string
+from collections import defaultdict
+from typing import Callable, Iterable
+from pydantic import BaseModel
+from boilerplate import boilerplate_for_paper, strip_boilerplate
+from utils import read_article_scrape, parse_article_scrape_filename
+
+SHINGLE_WORDS = 5
+SIGNATURE_SIZE = 64
+# 16 bands of 4 rows, pairs above about 0.5 similarity almost always share a band
+BANDS = 16
+ROWS = SIGNATURE_SIZE // BANDS
+DEFAULT_THRESHOLD = 0.7
+# Below this many shingles most buckets are empty and a shared standfirst looks like a duplicate
+MIN_SHINGLES = 50
+
+MASK = (1 << 64) - 1
+# Punctuation to spaces, quicker than a regex and papers punctuate syndicated copy differently
+PUNCTUATION = str.maketrans({c: " " for c in string.punctuation + "‘’“”–—…"})
+
+Signature = tuple[int, ...]
+
+def shingle_hashes(text: str) -> set[int]:
+    words = text.lower().translate(PUNCTUATION).split()
+    return set(map(hash, zip(*(words[i:] for i in range(SHINGLE_WORDS)))))
+
+def minhash(hashes: Iterable[int]) -> Signature:
+    signature = [MASK] * SIGNATURE_SIZE
+    for h in hashes:
+        h &= MASK
+        bucket = h % SIGNATURE_SIZE
+        if h < signature[bucket]:
+            signature[bucket] = h
+    # Fill an empty bucket from the next filled one, so two texts still compare bucket by bucket
+    filled = [i for i, value in enumerate(signature) if value != MASK]
+    if filled and len(filled) < SIGNATURE_SIZE:
+        for i in range(SIGNATURE_SIZE):
+            if signature[i] == MASK:
+                donor = next((j for j in filled if j > i), filled[0])
+                signature[i] = signature[donor] ^ (donor - i) % SIGNATURE_SIZE
+    return tuple(signature)
+
+def similarity(a: Signature, b: Signature) -> float:
+    """Estimated Jaccard similarity of two articles' shingles"""
+    return sum(x == y for x, y in zip(a, b)) / SIGNATURE_SIZE
+
+class NearDupIndex:
+    """Articles added one at a time, each joined to the clusters of any indexed near-duplicates"""
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self.signatures: dict[str, Signature] = {}
+        self._bands: dict[tuple[int, Signature], list[str]] = defaultdict(list)
+        # Union-find over keys, a root is its own parent
+        self._parent: dict[str, str] = {}
+
+    def _find(self, key: str) -> str:
+        root = key
+        while self._parent[root] != root:
+            root = self._parent[root]
+        while self._parent[key] != root:
+            self._parent[key], key = root, self._parent[key]
+        return root
+
+    def _union(self, a: str, b: str):
+        root_a, root_b = self._find(a), self._find(b)
+        if root_a != root_b:
+            self._parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    def add(self, key: str, text: str) -> bool:
+        """Index an article, returning False if it is too short to compare"""
+        hashes = shingle_hashes(text)
+        if len(hashes) < MIN_SHINGLES:
+            return False
+        signature = minhash(hashes)
+        self.signatures[key] = signature
+        self._parent[key] = key
+        candidates: set[str] = set()
+        for band in range(BANDS):
+            members = self._bands[(band, signature[band * ROWS:(band + 1) * ROWS])]
+            candidates.update(members)
+            members.append(key)
+        for candidate in candidates:
+            if self._find(candidate) != self._find(key) and similarity(signature, self.signatures[candidate]) >= self.threshold:
+                self._union(key, candidate)
+        return True
+
+    def clusters(self) -> list[list[str]]:
+        """Groups of two or more near-duplicates, each sorted, largest first"""
+        groups: dict[str, list[str]] = defaultdict(list)
+        for key in self.signatures:
+            groups[self._find(key)].append(key)
+        return sorted((sorted(group) for group in groups.values() if len(group) > 1), key=len, reverse=True)
+
+class DuplicatePlan(BaseModel):
+    # Articles to send to the LLM
+    to_clean: list[str]
+    # Article to derive from the representative of its cluster, which is cleaned or was cleaned before
+    derived: dict[str, str]
+
+def article_text(filename: str, strip: bool = True) -> str | None:
+    """A raw article's content as compared for near-duplicates, without its paper's boilerplate"""
+    try:
+        scrape = read_article_scrape(filename)
+    except (OSError, ValueError):
+        return None
+    if not scrape.success or not scrape.content:
+        return None
+    paper, _ = parse_article_scrape_filename(filename)
+    if strip and paper is not None:
+        return strip_boilerplate(scrape.content, boilerplate_for_paper(paper))
+    return scrape.content
+
+def index_articles(filenames: Iterable[str], threshold: float = DEFAULT_THRESHOLD, strip: bool = True) -> NearDupIndex:
+    index = NearDupIndex(threshold)
+    for filename in filenames:
+        text = article_text(filename, strip)
+        if text:
+            index.add(filename, text)
+    return index
+
+def plan_cleaning(to_clean: list[str], clusters: list[list[str]], is_cleaned: Callable[[str], bool]) -> DuplicatePlan:
+    """Clean one article per cluster, preferring one cleaned already, and derive the rest from it"""
+    pending = set(to_clean)
+    derived: dict[str, str] = {}
+    for cluster in clusters:
+        waiting = [filename for filename in cluster if filename in pending]
+        if not waiting:
+            continue
+        cleaned = [filename for filename in cluster if filename not in pending and is_cleaned(filename)]
+        representative = cleaned[0] if cleaned else waiting[0]
+        for filename in waiting:
+            if filename != representative:
+                derived[filename] = representative
+    return DuplicatePlan(to_clean=[filename for filename in to_clean if filename not in derived], derived=derived)
@@ -0,0 +1,198 @@
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Literal, Protocol
+from pydantic import BaseModel
+from rich import print
+from llm import client, llm_cache, llm_usage, request_body, parse_response_body
+from utils import LLM_BATCH_DIR
+
+OfflineStage = Literal["links", "articles"]
+
+# Batch statuses after which polling can stop
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+class BatchJobStatus(BaseModel):
+    status: str
+    output_file_id: str | None = None
+    error_file_id: str | None = None
+
+class BatchClient(Protocol):
+    """Submits a JSONL file of /v1/responses requests and reports on the job"""
+    def submit(self, jsonl: str) -> str: ...
+    def retrieve(self, job_id: str) -> BatchJobStatus: ...
+    def download(self, file_id: str) -> str: ...
+
+class OpenAIBatchClient:
+    def submit(self, jsonl: str) -> str:
+        input_file = client.files.create(file=("requests.jsonl", jsonl.encode()), purpose="batch")
+        batch = client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/responses",
+            completion_window="24h",
+        )
+        return batch.id
+
+    def retrieve(self, job_id: str) -> BatchJobStatus:
+        batch = client.batches.retrieve(job_id)
+        return BatchJobStatus(
+            status=batch.status,
+            output_file_id=batch.output_file_id,
+            error_file_id=batch.error_file_id,
+        )
+
+    def download(self, file_id: str) -> str:
+        return client.files.content(file_id).text
+
+class FakeBatchClient:
+    """Answers jobs locally with the stub Responses API handlers, completing after `polls_until_done` polls"""
+    def __init__(self, polls_until_done: int = 1):
+        self.polls_until_done = polls_until_done
+        self._jobs: dict[str, tuple[str, int]] = {}
+        self._files: dict[str, str] = {}
+
+    def submit(self, jsonl: str) -> str:
+        job_id = f"batch_fake_{len(self._jobs)}"
+        self._jobs[job_id] = (jsonl, 0)
+        return job_id
+
+    def retrieve(self, job_id: str) -> BatchJobStatus:
+        from stub_responses_server import response_body
+        jsonl, polls = self._jobs[job_id]
+        polls += 1
+        self._jobs[job_id] = (jsonl, polls)
+        if polls < self.polls_until_done:
+            return BatchJobStatus(status="in_progress")
+        output_lines = []
+        for line in jsonl.splitlines():
+            request = json.loads(line)
+            output_lines.append(json.dumps({
+                "id": f"batch_req_{request['custom_id']}",
+                "custom_id": request["custom_id"],
+                "response": {"status_code": 200, "request_id": "", "body": response_body(request["body"])},
+                "error": None,
+            }))
+        file_id = f"file_{job_id}"
+        self._files[file_id] = "\n".join(output_lines)
+        return BatchJobStatus(status="completed", output_file_id=file_id)
+
+    def download(self, file_id: str) -> str:
+        return self._files[file_id]
+
+class OfflineBatchJob(BaseModel):
+    """What we need to pick a submitted job back up if the process dies while polling"""
+    job_id: str
+    batch_id: str
+    stage: OfflineStage
+    # custom_id of each request is its index in this list
+    keys: list[str]
+    submitted_at: datetime
+
+def _job_path(batch_id: str, stage: OfflineStage) -> Path:
+    return LLM_BATCH_DIR / f"{batch_id}-{stage}.json"
+
+def _demultiplex(output: str, job: OfflineBatchJob, requests: dict[str, dict]) -> dict[str, BaseModel | None]:
+    results: dict[str, BaseModel | None] = {}
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        key = job.keys[int(record["custom_id"])]
+        response = record.get("response") or {}
+        if record.get("error") or response.get("status_code") != 200:
+            print(f"[red]✗ Offline request failed for {key}: {record.get('error') or response.get('status_code')}[/red]")
+            continue
+        llm_usage.add(response["body"].get("usage"))
+        request = requests.get(key)
+        if request is None:
+            # Submitted by an earlier run for an item we are no longer processing
+            continue
+        try:
+            parsed = parse_response_body(response["body"], request["text_format"])
+        except ValueError as e:
+            print(f"[red]✗ Could not parse offline response for {key}: {e}[/red]")
+            continue
+        if parsed is not None:
+            llm_cache.put(llm_cache.key(request), parsed)
+        results[key] = parsed
+    return results
+
+def run_offline_batch(
+    batch_id: str,
+    stage: OfflineStage,
+    requests: dict[str, dict],
+    batch_client: BatchClient | None = None,
+    poll_interval: float = 60,
+) -> dict[str, BaseModel | None]:
+    """Run requests (keyed by filename) through the Batch API and return their parsed outputs.
+
+    Requests already in the LLM cache are answered without submitting them. If a job for this
+    batch_id and stage was already submitted, it is polled instead of submitting a new one.
+    Keys missing from the result failed and can be retried by running again. Call finish_offline_batch
+    once the results are written."""
+    batch_client = batch_client or OpenAIBatchClient()
+    results: dict[str, BaseModel | None] = {}
+    pending: dict[str, dict] = {}
+    for key, request in requests.items():
+        cached = llm_cache.get(llm_cache.key(request), request["text_format"])
+        if cached is not None:
+            results[key] = cached
+        else:
+            pending[key] = request
+    if results:
+        print(f"[blue]{len(results)} requests answered from the LLM cache[/blue]")
+
+    job_path = _job_path(batch_id, stage)
+    if job_path.exists():
+        job = OfflineBatchJob.model_validate_json(job_path.read_text())
+        print(f"[yellow]Resuming offline job {job.job_id} submitted at {job.submitted_at:%Y-%m-%d %H:%M}[/yellow]")
+        unsubmitted = set(pending) - set(job.keys)
+        if unsubmitted:
+            print(f"[yellow]{len(unsubmitted)} items are not in this job, run again once it is done to process them[/yellow]")
+    elif pending:
+        keys = list(pending)
+        jsonl = "\n".join(
+            json.dumps({
+                "custom_id": str(i),
+                "method": "POST",
+                "url": "/v1/responses",
+                "body": request_body(pending[key]),
+            })
+            for i, key in enumerate(keys)
+        )
+        job = OfflineBatchJob(
+            job_id=batch_client.submit(jsonl),
+            batch_id=batch_id,
+            stage=stage,
+            keys=keys,
+            submitted_at=datetime.now(),
+        )
+        job_path.parent.mkdir(parents=True, exist_ok=True)
+        job_path.write_text(job.model_dump_json(indent=2))
+        print(f"[blue]Submitted offline job {job.job_id} with {len(keys)} requests[/blue]")
+    else:
+        return results
+
+    status = batch_client.retrieve(job.job_id)
+    while status.status not in TERMINAL_STATUSES:
+        print(f"[cyan]Offline job {job.job_id} is {status.status}, checking again in {poll_interval:.0f}s...[/cyan]")
+        time.sleep(poll_interval)
+        status = batch_client.retrieve(job.job_id)
+
+    if status.status != "completed":
+        # Nothing more will come from this job, the next run submits a fresh one
+        print(f"[red]Offline job {job.job_id} ended as {status.status}[/red]")
+        job_path.unlink(missing_ok=True)
+        return results
+
+    if status.output_file_id:
+        results.update(_demultiplex(batch_client.download(status.output_file_id), job, requests))
+    if status.error_file_id:
+        _demultiplex(batch_client.download(status.error_file_id), job, requests)
+    # The job file stays until the caller has written the results out, see finish_offline_batch
+    return results
+
+def finish_offline_batch(batch_id: str, stage: OfflineStage):
+    """Forget the stage's completed job once its results are written, until then a rerun downloads them again"""
+    _job_path(batch_id, stage).unlink(missing_ok=True)
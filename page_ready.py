@@ -0,0 +1,61 @@
+import time
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from utils import PageWait
+
+POLL_FREQUENCY = 0.05
+
+# Record the time of the latest DOM mutation on the window, so we can tell when the page has settled.
+# A fresh document gets a fresh window, so the observer is reinstalled after every navigation.
+# Only nodes being added or removed count, ads, carousels and tickers change attributes and text all the time.
+_INSTALL_MUTATION_OBSERVER = """
+if (window.__lastMutation === undefined) {
+    window.__lastMutation = performance.now();
+    new MutationObserver(() => { window.__lastMutation = performance.now(); })
+        .observe(document, {childList: true, subtree: true});
+}
+"""
+
+_MS_SINCE_LAST_MUTATION = "return performance.now() - window.__lastMutation;"
+
+def _remaining(deadline: float) -> float:
+    return max(deadline - time.monotonic(), 0)
+
+def document_ready(driver: webdriver.Chrome) -> bool:
+    # "interactive" means the DOM is parsed, we don't need to wait for every image and ad to load
+    return driver.execute_script("return document.readyState") != "loading"
+
+def dom_quiet(quiet_ms: int):
+    """Condition which holds once the DOM has had no mutations for quiet_ms"""
+    def condition(driver: webdriver.Chrome) -> bool:
+        driver.execute_script(_INSTALL_MUTATION_OBSERVER)
+        return driver.execute_script(_MS_SINCE_LAST_MUTATION) >= quiet_ms
+    return condition
+
+def wait_for_page_ready(
+    driver: webdriver.Chrome,
+    locator: tuple[str, str] | None = None,
+    page_wait: PageWait | None = None,
+) -> bool:
+    """Wait until the current page is parsed, `locator` is present and the DOM has stopped changing.
+
+    All three conditions share the page_wait.timeout budget, and waiting for the DOM to go quiet takes at
+    most page_wait.quiet_timeout of it. Returns False if either ran out before the page was ready,
+    in which case callers can still scrape whatever has loaded."""
+    page_wait = page_wait or PageWait()
+    deadline = time.monotonic() + page_wait.timeout
+    try:
+        WebDriverWait(driver, _remaining(deadline), poll_frequency=POLL_FREQUENCY).until(document_ready)
+        if locator is not None:
+            WebDriverWait(driver, _remaining(deadline), poll_frequency=POLL_FREQUENCY).until(
+                EC.presence_of_element_located(locator)
+            )
+        quiet_wait = min(_remaining(deadline), page_wait.quiet_timeout)
+        WebDriverWait(driver, quiet_wait, poll_frequency=POLL_FREQUENCY).until(
+            dom_quiet(page_wait.quiet_ms)
+        )
+    except TimeoutException:
+        return False
+    return True
@@ -0,0 +1,78 @@
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, TypeVar
+import openai
+from rich import print
+
+T = TypeVar("T")
+
+class TokenBucket:
+    """Refills `per_minute` units evenly over each minute, holding at most a minute's worth"""
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1):
+        # A single request larger than the bucket would wait forever, let it through once the bucket is full
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+class RateLimiter:
+    """Requests and tokens per minute limits, as OpenAI enforces them"""
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+
+    async def acquire(self, tokens: float):
+        await self.requests.acquire(1)
+        await self.tokens.acquire(tokens)
+
+def is_retryable(e: Exception) -> bool:
+    """Rate limits, server errors and dropped connections are worth retrying"""
+    if isinstance(e, openai.APIStatusError):
+        return e.status_code == 429 or e.status_code >= 500
+    return isinstance(e, openai.APIConnectionError)
+
+def _retry_after(e: Exception) -> float | None:
+    response = getattr(e, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+async def with_retries(
+    call: Callable[[], Awaitable[T]],
+    max_retries: int = 5,
+    base_delay: float = 1.0,
+    max_delay: float = 60.0,
+) -> T:
+    """Await call(), retrying retryable API errors with full-jitter exponential backoff.
+    A server supplied Retry-After is used as the minimum wait."""
+    attempt = 0
+    while True:
+        try:
+            return await call()
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            delay = max(delay, _retry_after(e) or 0)
+            print(f"[yellow]LLM request failed ({e.__class__.__name__}), retrying in {delay:.1f}s...[/yellow]")
+            await asyncio.sleep(delay)
+            attempt += 1
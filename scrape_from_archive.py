@@ -3,20 +3,25 @@ from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-import time
-from utils import Scrape
+from selenium.common.exceptions import TimeoutException
+from utils import Scrape, PageWait
+from page_ready import wait_for_page_ready
+from driver_service import connect_driver
+from archive_resolver import ARCHIVE_PREFIX, snapshot_resolver
+ARCHIVE_LINK_XPATH = "//a[contains(@href, 'archive.md')]"
+ARCHIVE_PAGE_WAIT = PageWait(timeout=15, quiet_ms=250)
+ARCHIVE_PROFILE = "archive"
 
-ARCHIVE_PREFIX = "https://archive.md/"
-
-def setup_driver():
-    """Initialize and configure the Chrome WebDriver"""
-    options = webdriver.ChromeOptions()
+def configure_options(options: webdriver.ChromeOptions):
     # Uncomment the next line to run in headless mode (no browser window)
     # options.add_argument('--headless')
     options.add_argument('--no-sandbox')
     options.add_argument('--disable-dev-shm-usage')
-    
-    driver = webdriver.Chrome(options=options)
+
+def setup_driver():
+    """Initialize and configure the Chrome WebDriver, on a persistent profile so the archive.md CAPTCHA clearance carries over between runs.
+    Attaches to the browser service's browser if it is running."""
+    driver = connect_driver(ARCHIVE_PROFILE, configure_options)
     driver.maximize_window()
     return driver
 
@@ -25,13 +30,14 @@ def scrape_body_text(driver: webdriver.Chrome) -> str:
     body = driver.find_element(by=By.CLASS_NAME, value="body")
     return body.text
 
-def find_archive_page_link(driver: webdriver.Chrome) -> str:
+def find_archive_page_link(driver: webdriver.Chrome, timeout: float = 10) -> str:
     # When we are on archive.md page, we want to click the archive link to get to our article
-    links = driver.find_elements(By.XPATH, "//a[contains(@href, 'archive.md')]")
-        
-    if len(links) == 0:
-        time.sleep(10)
-        links = driver.find_elements(By.XPATH, "//a[contains(@href, 'archive.md')]")
+    try:
+        links = WebDriverWait(driver, timeout).until(
+            lambda d: d.find_elements(By.XPATH, ARCHIVE_LINK_XPATH)
+        )
+    except TimeoutException:
+        links = []
     
     # All the bad archive links have a webpage after https://archive.md, we can find this by looking for a . after md
     link_texts = list(map(lambda l: l.get_attribute('href'), links))
@@ -45,28 +51,30 @@ def find_archive_page_link(driver: webdriver.Chrome) -> str:
         raise ValueError("No link found")
     return good_link_text
 
-def scrape_website(driver: webdriver.Chrome, url: str, captcha_wait_time=60) -> str:
+def scrape_website(driver: webdriver.Chrome, url: str, captcha_wait_time=60, page_wait: PageWait | None = None) -> str:
     """
     Navigate to a website, click a link, wait for CAPTCHA, and scrape body text
     
     Args:
         url: The initial URL to visit
         captcha_wait_time: Maximum time to wait for CAPTCHA completion (seconds)
+        page_wait: How long to wait for each page to settle once it has loaded
     
     Returns:
         The scraped body text as a string
     """    
-    time.sleep(1)
+    page_wait = page_wait or ARCHIVE_PAGE_WAIT
     
     # Navigate to the initial URL
     print(f"Navigating to {url}...")
     driver.get(url)
     
     WebDriverWait(driver, captcha_wait_time).until(
-        EC.presence_of_element_located((By.XPATH, "//a[contains(@href, 'archive.md')]"))
+        EC.presence_of_element_located((By.XPATH, ARCHIVE_LINK_XPATH))
     )
     
-    time.sleep(2)  # Brief wait for page load
+    # Let the search results finish rendering before reading the links
+    wait_for_page_ready(driver, page_wait=page_wait)
     
     good_link_text = find_archive_page_link(driver)
     
@@ -74,7 +82,8 @@ def scrape_website(driver: webdriver.Chrome, url: str, captcha_wait_time=60) ->
     print(f"Navigating to {good_link_text}...")
     driver.get(good_link_text)
     
-    time.sleep(2) # Wait for page load again
+    # Wait for the snapshot body to be present and settled
+    wait_for_page_ready(driver, (By.CLASS_NAME, "body"), page_wait)
     
     # Scrape the body text
     print("Scraping body text...")
@@ -82,8 +91,38 @@ def scrape_website(driver: webdriver.Chrome, url: str, captcha_wait_time=60) ->
     
     print(f"Scraped {len(body_text)} characters.")
     return body_text
-        
-def scrape_from_archive(driver: webdriver.Chrome, urls: str | list[str]) -> list[Scrape]:
+
+def scrape_snapshot(driver: webdriver.Chrome, snapshot_url: str, captcha_wait_time=60, page_wait: PageWait | None = None) -> str:
+    """Navigate straight to a known snapshot, waiting for a CAPTCHA if one is served, and scrape body text"""
+    print(f"Navigating to {snapshot_url}...")
+    driver.get(snapshot_url)
+    WebDriverWait(driver, captcha_wait_time).until(
+        EC.presence_of_element_located((By.CLASS_NAME, "body"))
+    )
+    wait_for_page_ready(driver, (By.CLASS_NAME, "body"), page_wait or ARCHIVE_PAGE_WAIT)
+    body_text = scrape_body_text(driver)
+    print(f"Scraped {len(body_text)} characters.")
+    return body_text
+
+def scrape_article(driver: webdriver.Chrome, url: str, captcha_wait_time=60, page_wait: PageWait | None = None) -> str:
+    """An article's text from its latest snapshot, fetched over HTTP where archive.md allows it.
+    The browser goes straight to the snapshot if it is known, else through the archive's search page."""
+    snapshot_url = snapshot_resolver.resolve(url)
+    if snapshot_url is None:
+        body_text = scrape_website(driver, ARCHIVE_PREFIX + url, captcha_wait_time, page_wait)
+        snapshot_resolver.count("search")
+        snapshot_resolver.count("browser")
+        if snapshot_resolver.enabled:
+            snapshot_resolver.record(url, driver.current_url)
+        return body_text
+    if (body_text := snapshot_resolver.fetch_text(snapshot_url)) is not None:
+        print(f"Fetched {len(body_text)} characters from {snapshot_url}.")
+        return body_text
+    body_text = scrape_snapshot(driver, snapshot_url, captcha_wait_time, page_wait)
+    snapshot_resolver.count("browser")
+    return body_text
+
+def scrape_from_archive(driver: webdriver.Chrome, urls: str | list[str], page_wait: PageWait | None = None) -> list[Scrape]:
     # Run the scraper
     if isinstance(urls, str):
         urls = [urls]
@@ -91,13 +130,12 @@ def scrape_from_archive(driver: webdriver.Chrome, urls: str | list[str]) -> list
     scrapes: list[Scrape] = []
     
     for url in urls:
-        archive_url = ARCHIVE_PREFIX + url
-        
         try: 
-            scraped_content = scrape_website(
+            scraped_content = scrape_article(
                 driver=driver,
-                url=archive_url,
+                url=url,
                 captcha_wait_time=60,  # Wait up to 60 seconds for CAPTCHA
+                page_wait=page_wait,
             )
             success = True
         except:
@@ -0,0 +1,491 @@
+"""Where scrapes are kept: one JSON file each under scrapes/ (the default), or rows of a SQLite database.
+
+The read_*/write_*/*_exists functions in utils go through get_store(), set SCRAPE_BACKEND=sqlite
+(and optionally SCRAPE_DB) to use the database. `cli.py migrate-storage` imports the JSON tree into it.
+"""
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Literal, Protocol, get_args
+from pydantic import BaseModel
+
+ScrapeStage = Literal["links_raw", "links_clean", "links_llm", "articles_raw", "articles_clean"]
+SCRAPE_STAGES: list[ScrapeStage] = list(get_args(ScrapeStage))
+StorageBackend = Literal["json", "sqlite"]
+# (paper, batch_id) of a stage's filename, either may be None if the name can't be parsed
+FilenameParser = Callable[[ScrapeStage, str], tuple[str | None, str | None]]
+# Canonical form of a URL, so variants of one article share an index entry
+UrlCanonicaliser = Callable[[str], str]
+# Raw article scrapes are indexed by URL, so later batches can reuse them
+URL_INDEXED_STAGE: ScrapeStage = "articles_raw"
+
+def scrape_metadata(data: str) -> tuple[str | None, bool]:
+    """url and success of a stored scrape, link lists have neither"""
+    try:
+        record = json.loads(data)
+    except ValueError:
+        return None, False
+    if not isinstance(record, dict):
+        return None, True
+    return record.get("url"), record.get("success", True)
+
+def scrape_time(data: str) -> datetime | None:
+    """When a stored article scrape was fetched, None for scrapes from before this was recorded"""
+    try:
+        record = json.loads(data)
+    except ValueError:
+        return None
+    if not isinstance(record, dict) or not record.get("scraped_at"):
+        return None
+    return datetime.fromisoformat(record["scraped_at"])
+
+class UrlIndexEntry(BaseModel):
+    url: str
+    filename: str
+    # When the scrape was first fetched, copies into later batches keep the original time
+    written_at: datetime
+
+class ScrapeStore(Protocol):
+    # Whether writers should indent their JSON for people reading the files
+    pretty: bool
+    def write(self, stage: ScrapeStage, filename: str, data: str, written_at: datetime | None = None): ...
+    def copy(self, stage: ScrapeStage, source_filename: str, filename: str): ...
+    def find_url(self, url: str) -> UrlIndexEntry | None: ...
+    # (stage, filename, data, written_at), written_at None for now
+    def write_many(self, records: Iterable[tuple[ScrapeStage, str, str, datetime | None]]) -> int: ...
+    def written_at(self, stage: ScrapeStage, filename: str) -> datetime | None: ...
+    def read(self, stage: ScrapeStage, filename: str) -> str: ...
+    def exists(self, stage: ScrapeStage, filename: str) -> bool: ...
+    def paths(self, stage: ScrapeStage, batch_id: str) -> list[Path]: ...
+    def recent(self, stage: ScrapeStage, paper: str, limit: int | None = None) -> list[str]: ...
+    def batch_ids(self) -> list[str]: ...
+    def rebuild_index(self, batch_id: str): ...
+    def rebuild_url_index(self): ...
+
+class ManifestEntry(BaseModel):
+    stage: ScrapeStage
+    filename: str
+    path: str
+    paper: str | None = None
+    # False for article scrapes which failed
+    success: bool = True
+
+class BatchManifest:
+    """Index of one batch's scrape files, appended to on every write as {manifest_dir}/{batch_id}.jsonl.
+    A later line for the same stage and filename replaces an earlier one.
+    Batches without a manifest get one built from their directories on first use."""
+    def __init__(self, batch_id: str, manifest_dir: Path, stage_dirs: dict[ScrapeStage, Path], parse: FilenameParser):
+        self.batch_id = batch_id
+        self.path = manifest_dir / f"{batch_id}.jsonl"
+        self.stage_dirs = stage_dirs
+        self.parse = parse
+        self.entries: dict[tuple[ScrapeStage, str], ManifestEntry] = {}
+        self._lock = threading.Lock()
+        if self.path.exists():
+            for line in self.path.read_text().splitlines():
+                if line.strip():
+                    entry = ManifestEntry.model_validate_json(line)
+                    self.entries[(entry.stage, entry.filename)] = entry
+        else:
+            self.rebuild()
+
+    def record(self, entry: ManifestEntry):
+        with self._lock:
+            self.entries[(entry.stage, entry.filename)] = entry
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(entry.model_dump_json() + "\n")
+
+    def _forget(self, entries: list[ManifestEntry]):
+        """Drop entries whose files have gone, unless they were written again meanwhile"""
+        with self._lock:
+            for entry in entries:
+                if self.entries.get((entry.stage, entry.filename)) is entry:
+                    del self.entries[(entry.stage, entry.filename)]
+
+    def get(self, stage: ScrapeStage, filename: str) -> ManifestEntry | None:
+        """The entry, if its file is still there, files deleted by hand or by another process are forgotten"""
+        with self._lock:
+            entry = self.entries.get((stage, filename))
+        if entry is not None and not Path(entry.path).exists():
+            self._forget([entry])
+            return None
+        return entry
+
+    def paths(self, stage: ScrapeStage) -> list[Path]:
+        with self._lock:
+            entries = [entry for (entry_stage, _), entry in self.entries.items() if entry_stage == stage]
+        present, missing = [], []
+        for entry in entries:
+            (present if Path(entry.path).exists() else missing).append(entry)
+        if missing:
+            self._forget(missing)
+        return [Path(entry.path) for entry in sorted(present, key=lambda entry: entry.filename)]
+
+    def _scan(self, stage: ScrapeStage) -> list[Path]:
+        base_dir = self.stage_dirs[stage]
+        candidates = list((base_dir / self.batch_id).glob("*.json")) + list(base_dir.glob(f"*-{self.batch_id}.json"))
+        if stage.startswith("articles"):
+            # Dated article scrapes used to be filed under their day of the month
+            candidates += (base_dir / self.batch_id.rsplit("-", 1)[-1]).glob(f"*-{self.batch_id}.json")
+        return [p for p in set(candidates) if self.parse(stage, p.name)[1] == self.batch_id]
+
+    def rebuild(self):
+        """Re-index the batch from its directories, replacing the manifest file"""
+        entries: dict[tuple[ScrapeStage, str], ManifestEntry] = {}
+        for stage in SCRAPE_STAGES:
+            for path in self._scan(stage):
+                success = True
+                if stage == "articles_raw":
+                    try:
+                        _, success = scrape_metadata(path.read_text())
+                    except OSError:
+                        success = False
+                entries[(stage, path.name)] = ManifestEntry(
+                    stage=stage, filename=path.name, path=str(path), paper=self.parse(stage, path.name)[0], success=success,
+                )
+        with self._lock:
+            self.entries = entries
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Write then rename, so a crash never leaves a half written manifest
+            tmp_path = self.path.with_suffix(".tmp")
+            tmp_path.write_text("".join(entry.model_dump_json() + "\n" for entry in entries.values()))
+            tmp_path.replace(self.path)
+
+class UrlIndex:
+    """The latest successful raw article scrape of each canonical URL across all batches, appended to as {path}.
+    Built from every batch's scrapes the first time it is needed."""
+    def __init__(self, path: Path, build: Callable[[], Iterable[UrlIndexEntry]]):
+        self.path = path
+        self.build = build
+        self._entries: dict[str, UrlIndexEntry] | None = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict[str, UrlIndexEntry]:
+        if self._entries is None:
+            entries: dict[str, UrlIndexEntry] = {}
+            if self.path.exists():
+                for line in self.path.read_text().splitlines():
+                    if line.strip():
+                        entry = UrlIndexEntry.model_validate_json(line)
+                        entries[entry.url] = entry
+            else:
+                for entry in sorted(self.build(), key=lambda entry: entry.written_at):
+                    entries[entry.url] = entry
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = self.path.with_suffix(".tmp")
+                tmp_path.write_text("".join(entry.model_dump_json() + "\n" for entry in entries.values()))
+                tmp_path.replace(self.path)
+            self._entries = entries
+        return self._entries
+
+    def record(self, entry: UrlIndexEntry):
+        with self._lock:
+            self._load()[entry.url] = entry
+            with open(self.path, "a") as f:
+                f.write(entry.model_dump_json() + "\n")
+
+    def get(self, url: str) -> UrlIndexEntry | None:
+        with self._lock:
+            return self._load().get(url)
+
+    def rebuild(self):
+        """Re-index from every batch, after the way URLs are canonicalised changed"""
+        with self._lock:
+            self.path.unlink(missing_ok=True)
+            self._entries = None
+            self._load()
+
+class JsonScrapeStore:
+    """One JSON file per scrape in {stage dir}/{batch_id}/, indexed by a manifest per batch"""
+    pretty = True
+
+    def __init__(self, stage_dirs: dict[ScrapeStage, Path], manifest_dir: Path, parse: FilenameParser, canonical: UrlCanonicaliser):
+        self.stage_dirs = stage_dirs
+        self.manifest_dir = manifest_dir
+        self.parse = parse
+        self.canonical = canonical
+        self._manifests: dict[str, BatchManifest] = {}
+        self._lock = threading.Lock()
+        self.url_index = UrlIndex(manifest_dir / "urls.jsonl", self._indexed_urls)
+
+    def manifest(self, batch_id: str) -> BatchManifest:
+        """The batch's manifest, loaded once per process"""
+        with self._lock:
+            if batch_id not in self._manifests:
+                self._manifests[batch_id] = BatchManifest(batch_id, self.manifest_dir, self.stage_dirs, self.parse)
+            return self._manifests[batch_id]
+
+    def path(self, stage: ScrapeStage, filename: str) -> Path:
+        _, batch_id = self.parse(stage, filename)
+        if batch_id:
+            return self.stage_dirs[stage] / batch_id / filename
+        # Fallback: if we can't parse batch_id, use old location
+        return self.stage_dirs[stage] / filename
+
+    def _manifest_entry(self, stage: ScrapeStage, filename: str) -> ManifestEntry | None:
+        _, batch_id = self.parse(stage, filename)
+        return self.manifest(batch_id).get(stage, filename) if batch_id else None
+
+    def write(self, stage: ScrapeStage, filename: str, data: str, written_at: datetime | None = None):
+        path = self.path(stage, filename)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            f.write(data)
+        if written_at is not None:
+            # recent() goes by mtime, so imported scrapes keep their place
+            timestamp = written_at.timestamp()
+            os.utime(path, (timestamp, timestamp))
+        paper, batch_id = self.parse(stage, filename)
+        url, success = scrape_metadata(data)
+        if batch_id:
+            self.manifest(batch_id).record(ManifestEntry(
+                stage=stage, filename=filename, path=str(path), paper=paper, success=success,
+            ))
+        if stage == URL_INDEXED_STAGE and url and success:
+            self.url_index.record(UrlIndexEntry(
+                url=self.canonical(url), filename=filename, written_at=scrape_time(data) or written_at or datetime.now(),
+            ))
+
+    def copy(self, stage: ScrapeStage, source_filename: str, filename: str):
+        data = self.read(stage, source_filename)
+        url, _ = scrape_metadata(data)
+        source = self.url_index.get(self.canonical(url)) if url and stage == URL_INDEXED_STAGE else None
+        self.write(stage, filename, data, source.written_at if source else None)
+
+    def find_url(self, url: str) -> UrlIndexEntry | None:
+        return self.url_index.get(self.canonical(url))
+
+    def _indexed_urls(self) -> Iterator[UrlIndexEntry]:
+        for batch_id in self.batch_ids():
+            manifest = self.manifest(batch_id)
+            for path in manifest.paths(URL_INDEXED_STAGE):
+                entry = manifest.get(URL_INDEXED_STAGE, path.name)
+                if entry is None or not entry.success:
+                    continue
+                try:
+                    data = path.read_text()
+                    url, _ = scrape_metadata(data)
+                    # Copies into later batches are new files, only the record knows when it was fetched
+                    written_at = scrape_time(data) or datetime.fromtimestamp(path.stat().st_mtime)
+                except OSError:
+                    continue
+                if url:
+                    yield UrlIndexEntry(url=self.canonical(url), filename=path.name, written_at=written_at)
+
+    def write_many(self, records: Iterable[tuple[ScrapeStage, str, str, datetime | None]]) -> int:
+        n = 0
+        for stage, filename, data, written_at in records:
+            self.write(stage, filename, data, written_at)
+            n += 1
+        return n
+
+    def read(self, stage: ScrapeStage, filename: str) -> str:
+        path = self.path(stage, filename)
+        if not path.exists():
+            # Fallback to old locations for backward compatibility
+            entry = self._manifest_entry(stage, filename)
+            path = Path(entry.path) if entry else self.stage_dirs[stage] / filename
+        with open(path, "r") as f:
+            return f.read()
+
+    def written_at(self, stage: ScrapeStage, filename: str) -> datetime | None:
+        path = self.path(stage, filename)
+        if not path.exists():
+            entry = self._manifest_entry(stage, filename)
+            path = Path(entry.path) if entry else self.stage_dirs[stage] / filename
+        try:
+            return datetime.fromtimestamp(path.stat().st_mtime)
+        except OSError:
+            return None
+
+    def exists(self, stage: ScrapeStage, filename: str) -> bool:
+        # The manifest covers the batch directories, confirming its entry costs one stat, and the old flat location another
+        if self._manifest_entry(stage, filename) is not None:
+            return True
+        return (self.stage_dirs[stage] / filename).exists()
+
+    def paths(self, stage: ScrapeStage, batch_id: str) -> list[Path]:
+        return self.manifest(batch_id).paths(stage)
+
+    def recent(self, stage: ScrapeStage, paper: str, limit: int | None = None) -> list[str]:
+        paths = [p for p in self.stage_dirs[stage].rglob("*.json") if self.parse(stage, p.name)[0] == paper]
+        paths.sort(key=lambda p: p.stat().st_mtime, reverse=True)
+        return [p.name for p in paths[:limit]]
+
+    def batch_ids(self) -> list[str]:
+        """Batch ids with a manifest or a directory in any stage"""
+        batch_ids = {p.stem for p in self.manifest_dir.glob("*.jsonl") if p != self.url_index.path}
+        for base_dir in self.stage_dirs.values():
+            if base_dir.exists():
+                batch_ids |= {p.name for p in base_dir.iterdir() if p.is_dir()}
+        return sorted(batch_ids)
+
+    def rebuild_index(self, batch_id: str):
+        self.manifest(batch_id).rebuild()
+
+    def rebuild_url_index(self):
+        self.url_index.rebuild()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scrapes (
+    stage TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    batch_id TEXT NOT NULL,
+    paper TEXT,
+    url TEXT,
+    success INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    written_at TEXT NOT NULL,
+    PRIMARY KEY (stage, filename)
+);
+CREATE INDEX IF NOT EXISTS scrapes_batch ON scrapes (batch_id, stage);
+CREATE INDEX IF NOT EXISTS scrapes_paper ON scrapes (paper, stage, written_at);
+-- url holds the canonical URL
+CREATE INDEX IF NOT EXISTS scrapes_url ON scrapes (url, stage);
+"""
+
+class SqliteScrapeStore:
+    """Every scrape as a row of one SQLite database, in WAL mode so readers don't block the writer.
+    Each thread gets its own connection. paths() gives where the JSON backend would keep each file,
+    only their names mean anything here."""
+    pretty = False
+    # Rows per transaction in write_many
+    WRITE_CHUNK = 500
+
+    def __init__(self, db_path: Path, stage_dirs: dict[ScrapeStage, Path], parse: FilenameParser, canonical: UrlCanonicaliser):
+        self.db_path = db_path
+        self.stage_dirs = stage_dirs
+        self.parse = parse
+        self.canonical = canonical
+        self._local = threading.local()
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        connection = self._connection()
+        connection.executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # Writers from other threads wait for the lock rather than failing
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _row(self, stage: ScrapeStage, filename: str, data: str, written_at: datetime | None = None) -> tuple:
+        paper, batch_id = self.parse(stage, filename)
+        url, success = scrape_metadata(data)
+        url = self.canonical(url) if url else None
+        written_at = scrape_time(data) or written_at or datetime.now()
+        return (stage, filename, batch_id or "", paper, url, int(success), data, written_at.isoformat())
+
+    def write(self, stage: ScrapeStage, filename: str, data: str, written_at: datetime | None = None):
+        self.write_many([(stage, filename, data, written_at)])
+
+    def write_many(self, records: Iterable[tuple[ScrapeStage, str, str, datetime | None]]) -> int:
+        connection = self._connection()
+        n = 0
+        chunk: list[tuple] = []
+        for stage, filename, data, written_at in records:
+            chunk.append(self._row(stage, filename, data, written_at))
+            if len(chunk) >= self.WRITE_CHUNK:
+                n += self._insert(connection, chunk)
+                chunk = []
+        if chunk:
+            n += self._insert(connection, chunk)
+        return n
+
+    def _insert(self, connection: sqlite3.Connection, rows: list[tuple]) -> int:
+        with connection:
+            connection.executemany("INSERT OR REPLACE INTO scrapes VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def copy(self, stage: ScrapeStage, source_filename: str, filename: str):
+        paper, batch_id = self.parse(stage, filename)
+        connection = self._connection()
+        with connection:
+            # The copy keeps the original written_at, so its age is that of the first fetch
+            cursor = connection.execute(
+                "INSERT OR REPLACE INTO scrapes "
+                "SELECT stage, ?, ?, ?, url, success, data, written_at FROM scrapes WHERE stage = ? AND filename = ?",
+                (filename, batch_id or "", paper, stage, source_filename),
+            )
+        if cursor.rowcount == 0:
+            raise FileNotFoundError(f"No {stage} scrape {source_filename} in {self.db_path}")
+
+    def find_url(self, url: str) -> UrlIndexEntry | None:
+        row = self._connection().execute(
+            "SELECT url, filename, written_at FROM scrapes WHERE url = ? AND stage = ? AND success = 1 "
+            "ORDER BY written_at DESC LIMIT 1",
+            (self.canonical(url), URL_INDEXED_STAGE),
+        ).fetchone()
+        if row is None:
+            return None
+        return UrlIndexEntry(url=row[0], filename=row[1], written_at=datetime.fromisoformat(row[2]))
+
+    def read(self, stage: ScrapeStage, filename: str) -> str:
+        row = self._connection().execute(
+            "SELECT data FROM scrapes WHERE stage = ? AND filename = ?", (stage, filename)
+        ).fetchone()
+        if row is None:
+            raise FileNotFoundError(f"No {stage} scrape {filename} in {self.db_path}")
+        return row[0]
+
+    def written_at(self, stage: ScrapeStage, filename: str) -> datetime | None:
+        row = self._connection().execute(
+            "SELECT written_at FROM scrapes WHERE stage = ? AND filename = ?", (stage, filename)
+        ).fetchone()
+        return datetime.fromisoformat(row[0]) if row else None
+
+    def exists(self, stage: ScrapeStage, filename: str) -> bool:
+        row = self._connection().execute(
+            "SELECT 1 FROM scrapes WHERE stage = ? AND filename = ?", (stage, filename)
+        ).fetchone()
+        return row is not None
+
+    def paths(self, stage: ScrapeStage, batch_id: str) -> list[Path]:
+        rows = self._connection().execute(
+            "SELECT filename FROM scrapes WHERE batch_id = ? AND stage = ? ORDER BY filename", (batch_id, stage)
+        ).fetchall()
+        return [self.stage_dirs[stage] / batch_id / filename for (filename,) in rows]
+
+    def recent(self, stage: ScrapeStage, paper: str, limit: int | None = None) -> list[str]:
+        rows = self._connection().execute(
+            "SELECT filename FROM scrapes WHERE paper = ? AND stage = ? ORDER BY written_at DESC LIMIT ?",
+            (paper, stage, -1 if limit is None else limit),
+        ).fetchall()
+        return [filename for (filename,) in rows]
+
+    def batch_ids(self) -> list[str]:
+        rows = self._connection().execute("SELECT DISTINCT batch_id FROM scrapes WHERE batch_id != ''").fetchall()
+        return sorted(batch_id for (batch_id,) in rows)
+
+    def rebuild_index(self, batch_id: str):
+        # The table is its own index
+        pass
+
+    def rebuild_url_index(self):
+        connection = self._connection()
+        connection.create_function("canonical_url", 1, self.canonical, deterministic=True)
+        with connection:
+            # From the URL as scraped, canonicalising the column again can't bring back what earlier rules stripped
+            connection.execute(
+                "UPDATE scrapes SET url = canonical_url(json_extract(data, '$.url')) WHERE url IS NOT NULL AND json_valid(data)"
+            )
+
+def migrate_scrapes(source: ScrapeStore, destination: ScrapeStore, batch_ids: list[str] | None = None) -> dict[ScrapeStage, int]:
+    """Copy every scrape of the given batches (default all) from one store to another, returning counts per stage.
+    Scrapes keep when they were written, which recent() and URL lookups go by."""
+    counts: dict[ScrapeStage, int] = {stage: 0 for stage in SCRAPE_STAGES}
+    for batch_id in batch_ids or source.batch_ids():
+        for stage in SCRAPE_STAGES:
+            records = (
+                (stage, path.name, source.read(stage, path.name), source.written_at(stage, path.name))
+                for path in source.paths(stage, batch_id)
+            )
+            counts[stage] += destination.write_many(records)
+    return counts
@@ -0,0 +1,129 @@
+"""A local stand-in for the OpenAI Responses API, for exercising the LLM stages without an API key.
+
+    uv run stub_responses_server.py --port 8089 --latency 0.5 --error-rate 0.1
+    OPENAI_BASE_URL=http://localhost:8089/v1 OPENAI_API_KEY=stub uv run cli.py batch-clean-articles --concurrency 8
+
+Structured output requests are answered by the handler registered for their schema name,
+so cleaning echoes the article back unchanged (or keeps every paragraph) and link filtering keeps every link.
+"""
+import json
+import random
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+import typer
+from rich import print
+
+SchemaHandler = Callable[[str], dict]
+
+def _all_paragraphs(input_text: str) -> dict:
+    n = sum(1 for line in input_text.splitlines() if line.startswith("["))
+    return {"is_article": True, "reason": "", "spans": [{"start": 0, "end": n - 1}] if n else []}
+
+schema_handlers: dict[str, SchemaHandler] = {
+    "ArticleExtractionResult": lambda input_text: {"content": input_text, "is_article": True},
+    "ArticleClassification": lambda input_text: {"is_article": True, "reason": "Stub treats every page as an article"},
+    "ChunkExtractionResult": lambda input_text: {"content": input_text},
+    "ArticleSpans": _all_paragraphs,
+    "FilteredLinks": lambda input_text: {"links": json.loads(input_text)},
+}
+
+def _input_text(body: dict) -> str:
+    # input may be a plain string or a list of messages with text content
+    input_value = body.get("input", "")
+    if isinstance(input_value, str):
+        return input_value
+    texts = []
+    for message in input_value:
+        content = message.get("content", "")
+        if isinstance(content, str):
+            texts.append(content)
+        else:
+            texts.extend(part.get("text", "") for part in content)
+    return "\n".join(texts)
+
+def response_body(body: dict) -> dict:
+    """Build a completed Response object for a request body"""
+    input_text = _input_text(body)
+    text_format = body.get("text", {}).get("format", {})
+    handler = schema_handlers.get(text_format.get("name", ""))
+    output_text = json.dumps(handler(input_text)) if handler else input_text
+    input_tokens = len(input_text) // 4 + 1
+    output_tokens = len(output_text) // 4 + 1
+    return {
+        "id": f"resp_{uuid.uuid4().hex}",
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": body.get("model", "stub"),
+        "status": "completed",
+        "output": [{
+            "type": "message",
+            "id": f"msg_{uuid.uuid4().hex}",
+            "status": "completed",
+            "role": "assistant",
+            "content": [{"type": "output_text", "text": output_text, "annotations": []}],
+        }],
+        "parallel_tool_calls": False,
+        "tool_choice": "auto",
+        "tools": [],
+        "usage": {
+            "input_tokens": input_tokens,
+            "input_tokens_details": {"cached_tokens": 0},
+            "output_tokens": output_tokens,
+            "output_tokens_details": {"reasoning_tokens": 0},
+            "total_tokens": input_tokens + output_tokens,
+        },
+    }
+
+def make_handler(latency: float, error_rate: float):
+    class StubHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, payload: dict, headers: dict[str, str] | None = None):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            time.sleep(latency)
+            if not self.path.rstrip("/").endswith("/responses"):
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+                return
+            if random.random() < error_rate:
+                # Alternate between rate limits and server errors, both should be retried
+                if random.random() < 0.5:
+                    self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests"}}, {"retry-after": "1"})
+                else:
+                    self._send_json(500, {"error": {"message": "Stub server error", "type": "server_error"}})
+                return
+            self._send_json(200, response_body(body))
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+class StubServer(ThreadingHTTPServer):
+    # Chunked extraction sends bursts of concurrent requests, don't refuse them at the listen backlog
+    request_queue_size = 256
+
+def main(
+    port: int = typer.Option(8089, help="Port to listen on"),
+    latency: float = typer.Option(0.5, help="Seconds to wait before answering each request"),
+    error_rate: float = typer.Option(0.0, help="Fraction of requests answered with a 429 or 500"),
+):
+    server = StubServer(("127.0.0.1", port), make_handler(latency, error_rate))
+    print(f"[green]Stub Responses API on http://127.0.0.1:{port}/v1[/green]")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    typer.run(main)
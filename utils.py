@@ -1,15 +1,25 @@
 from urllib.parse import urlparse, urlunparse
+import os
 import re
+import threading
 from pathlib import Path
 from typing import Callable, Literal, get_args
 from pydantic import BaseModel
 from pydantic import TypeAdapter
 from datetime import datetime
+from storage import (
+    ScrapeStage, SCRAPE_STAGES, StorageBackend, ScrapeStore, JsonScrapeStore, SqliteScrapeStore, UrlIndexEntry,
+)
 
 LINK_SCRAPE_DIR = Path("scrapes/links/raw")
 CLEAN_LINK_SCRAPE_DIR = Path("scrapes/links/clean")
+LINK_DECISIONS_DIR = Path("scrapes/links/llm")
 ARTICLE_SCRAPE_DIR = Path("scrapes/articles/raw")
 CLEAN_ARTICLE_SCRAPE_DIR = Path("scrapes/articles/clean")
+LLM_CACHE_DIR = Path("scrapes/llm_cache")
+LLM_BATCH_DIR = Path("scrapes/llm_batches")
+MANIFEST_DIR = Path("scrapes/manifests")
+SCRAPE_DB_PATH = Path("scrapes/scrapes.db")
 
 Paper = Literal[
     "thetimes",
@@ -45,6 +55,115 @@ ai_topic_page_maps: dict[Paper, LinkScheme] = {
     "dailystar": lambda n : f"https://www.dailystar.co.uk/latest/artificial-intelligence?pageNumber={n}",
 }
 
+class PageWait(BaseModel):
+    timeout: float = 10  # Maximum seconds to wait for a page to become ready
+    quiet_ms: int = 250  # The DOM must go this long without mutations to count as settled
+    quiet_timeout: float = 3  # Maximum seconds to wait for the DOM to settle, once the content is present
+    request_delay: float = 1.0  # Politeness delay, minimum seconds between requests to the paper's domain
+
+# Pages heavy on client-side rendering get a longer budget, the rest return as soon as they settle
+paper_page_waits: dict[Paper, PageWait] = {
+    "thetimes": PageWait(timeout=20, quiet_ms=500),
+    "thesun": PageWait(),
+    "express": PageWait(),
+    "mirror": PageWait(),
+    "telegraph": PageWait(timeout=20, quiet_ms=500),
+    "theguardian": PageWait(),
+    "dailymail": PageWait(timeout=15),
+    "ft": PageWait(timeout=20, quiet_ms=500),
+    "metro": PageWait(),
+    "independent": PageWait(timeout=15),
+    "observer": PageWait(timeout=15, quiet_ms=500),
+    "dailystar": PageWait(),
+}
+
+FetchBackend = Literal["http", "selenium"]
+
+# Topic pages which are server-rendered can be fetched over plain HTTP, the rest need a browser
+paper_fetch_backends: dict[Paper, FetchBackend] = {
+    "thetimes": "selenium",
+    "thesun": "http",
+    "express": "http",
+    "mirror": "http",
+    "telegraph": "selenium",
+    "theguardian": "http",
+    "dailymail": "http",
+    "ft": "selenium",
+    "metro": "http",
+    "independent": "http",
+    "observer": "selenium",
+    "dailystar": "http",
+}
+
+# Query parameters which only record how a reader got to a page
+TRACKING_PARAMS = {
+    "ico", "ito", "icid", "cmp", "cmpid", "fbclid", "gclid", "dclid", "msclkid", "smid",
+    "int_source", "int_medium", "int_campaign",
+}
+TRACKING_PREFIXES = ("utm_", "at_", "mc_", "ns_", "ga_", "_ga")
+
+class UrlRules(BaseModel):
+    """How a paper's article URL variants reduce to the one URL we scrape and file it under"""
+    host: str  # Canonical host
+    aliases: set[str] = set()  # Other hosts serving the same pages, such as amp. or bare domains
+    keep_query: set[str] | None = None  # Query parameters to keep, None keeps all but tracking ones
+    trailing_slash: bool = False  # Whether the paper's article paths end in a slash
+    amp_paths: list[tuple[str, str]] = []  # (pattern, replacement) taking an AMP page's path to the canonical one
+
+# Suffixes the AMP versions of most papers' articles add to the path
+AMP_SUFFIX = (r"/amp/?$", "")
+REACH_AMP_SUFFIX = (r"\.amp$", "")
+
+paper_url_rules: dict[Paper, UrlRules] = {
+    "thetimes": UrlRules(host="www.thetimes.com", aliases={"thetimes.com"}, keep_query=set()),
+    "thesun": UrlRules(host="www.thesun.co.uk", aliases={"thesun.co.uk"}, keep_query=set(), trailing_slash=True, amp_paths=[AMP_SUFFIX]),
+    "express": UrlRules(host="www.express.co.uk", aliases={"express.co.uk"}, keep_query=set(), amp_paths=[AMP_SUFFIX]),
+    "mirror": UrlRules(host="www.mirror.co.uk", aliases={"mirror.co.uk"}, keep_query=set(), amp_paths=[REACH_AMP_SUFFIX]),
+    "telegraph": UrlRules(host="www.telegraph.co.uk", aliases={"telegraph.co.uk"}, keep_query=set(), trailing_slash=True, amp_paths=[AMP_SUFFIX]),
+    "theguardian": UrlRules(host="www.theguardian.com", aliases={"theguardian.com", "amp.theguardian.com"}, keep_query=set()),
+    "dailymail": UrlRules(
+        host="www.dailymail.co.uk", aliases={"dailymail.co.uk"}, keep_query=set(),
+        amp_paths=[(r"/(article-\d+)/amp/", r"/\1/")],
+    ),
+    "ft": UrlRules(host="www.ft.com", aliases={"ft.com"}, keep_query=set()),
+    "metro": UrlRules(host="metro.co.uk", aliases={"www.metro.co.uk"}, keep_query=set(), trailing_slash=True, amp_paths=[AMP_SUFFIX]),
+    "independent": UrlRules(host="www.independent.co.uk", aliases={"independent.co.uk"}, keep_query=set(), amp_paths=[AMP_SUFFIX]),
+    "observer": UrlRules(host="observer.co.uk", aliases={"www.observer.co.uk"}, keep_query=set()),
+    "dailystar": UrlRules(host="www.dailystar.co.uk", aliases={"dailystar.co.uk"}, keep_query=set(), amp_paths=[REACH_AMP_SUFFIX]),
+}
+_url_rules_by_host = {host: rules for rules in paper_url_rules.values() for host in rules.aliases | {rules.host}}
+
+class LinkSchemeMatcher:
+    """Matches hrefs against the first n pages of a link scheme.
+    An href matches if it is a substring of a page URL, or a page URL is a substring of it.
+    The page URLs are materialised once, so each query costs about O(len(href))."""
+    def __init__(self, link_scheme: LinkScheme, n_pages: int):
+        self.urls = {link_scheme(i) for i in range(1, n_pages+1)}
+        # Every substring of every page URL, page URLs are short so this stays small
+        self._substrings = {
+            url[start:end] for url in self.urls
+            for start in range(len(url)) for end in range(start, len(url)+1)
+        }
+        self._lengths = {len(url) for url in self.urls}
+        # Page URLs can only start where one of these heads occurs in the href
+        self._heads = {url[:8] for url in self.urls}
+    
+    @classmethod
+    def for_paper(cls, paper: "Paper", n_pages: int) -> "LinkSchemeMatcher":
+        return cls(ai_topic_page_maps[paper], n_pages)
+    
+    def contains_page_url(self, href: str) -> bool:
+        for head in self._heads:
+            start = href.find(head)
+            while start != -1:
+                if any(href[start:start+length] in self.urls for length in self._lengths):
+                    return True
+                start = href.find(head, start+1)
+        return False
+    
+    def matches(self, href: str) -> bool:
+        return href in self._substrings or self.contains_page_url(href)
+
 class LinkData(BaseModel):
     text: str
     href: str
@@ -59,9 +178,11 @@ class ScrapeData(BaseModel):
     url: str
     content: str
     is_article: bool = True  # True if this is a valid article, False if it's a listing page or non-article content
+    duplicate_of: str | None = None  # Filename of the near-duplicate article this was cleaned as, if it wasn't cleaned itself
     
 class Scrape(ScrapeData):
     success: bool
+    scraped_at: datetime | None = None  # When the article was fetched, copies into later batches keep it
 
 def glob_articles():
     """Get all article scrape files, searching recursively in batch_id subdirectories"""
@@ -78,73 +199,89 @@ def glob_links(paper:Paper|None=None):
     return links_paths
 
 def write_link_scrape(slsr: SmartLinkScrapeResult, filename: str):
-    path = get_link_scrape_path(filename, LINK_SCRAPE_DIR)
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w") as outfile:
-        outfile.write(
-            slsr.model_dump_json(indent=4)
-        )
+    store = get_store()
+    store.write("links_raw", filename, slsr.model_dump_json(indent=4 if store.pretty else None))
 
 def read_link_scrape(filename: str) -> SmartLinkScrapeResult:
-    # Try new location first (with batch_id subdirectory), then fallback to old location
-    path = get_link_scrape_path(filename, LINK_SCRAPE_DIR)
-    if not path.exists():
-        # Fallback to old location for backward compatibility
-        old_path = LINK_SCRAPE_DIR / filename
-        if old_path.exists():
-            path = old_path
-    with open(path, "r") as outfile:
-        contents = outfile.read()
-    slsr = SmartLinkScrapeResult.model_validate_json(contents)
+    slsr = SmartLinkScrapeResult.model_validate_json(get_store().read("links_raw", filename))
     return slsr
 
 LinkDataList = TypeAdapter(list[LinkData])
 
-def canonicalize_url(url: str) -> str:
-    """Canonicalize a URL by removing fragments and normalizing.
-    This removes #comments, #section, etc. to prevent duplicates."""
-    parsed = urlparse(url)
-    # Remove fragment (everything after #)
-    canonical = urlunparse((
-        parsed.scheme,
-        parsed.netloc,
-        parsed.path,
-        parsed.params,
-        parsed.query,
-        ''  # Remove fragment
-    ))
-    return canonical
+def _is_tracking_param(key: str) -> bool:
+    key = key.lower()
+    return key in TRACKING_PARAMS or key.startswith(TRACKING_PREFIXES)
+
+def canonicalize_url(url: str, paper: Paper | None = None) -> str:
+    """Canonicalize a URL, so the variants of one article (#comments, ?utm_source=..., AMP pages,
+    bare domains, a missing trailing slash) become one URL.
+    Hosts are lowercased and fragments and tracking parameters dropped for any URL. A paper's UrlRules,
+    found by host if no paper is given, also fold AMP pages and host aliases and apply its query allowlist."""
+    parsed = urlparse(url.strip())
+    host = (parsed.hostname or "").lower()
+    rules = _url_rules_by_host.get(host)
+    if paper is not None and rules is not paper_url_rules[paper]:
+        # Links off the paper's site only get the generic clean up
+        rules = None
+    scheme, path = parsed.scheme.lower(), parsed.path
+    keep_query = None
+    if rules is not None:
+        scheme, host, keep_query = "https", rules.host, rules.keep_query
+        path = path or "/"
+        for pattern, replacement in rules.amp_paths:
+            path = re.sub(pattern, replacement, path)
+        last_segment = path.rsplit("/", 1)[-1]
+        if rules.trailing_slash and path and not path.endswith("/") and "." not in last_segment:
+            path += "/"
+        elif not rules.trailing_slash and len(path) > 1:
+            path = path.rstrip("/")
+    if parsed.port is not None and (scheme, parsed.port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{parsed.port}"
+    # Filter the raw query, so kept parameters keep their original encoding
+    query = "&".join(
+        part for part in parsed.query.split("&")
+        if part and not _is_tracking_param(key := part.split("=", 1)[0]) and (keep_query is None or key in keep_query)
+    )
+    return urlunparse((scheme, host, path, parsed.params, query, ""))
 
 def write_clean_link_scrape(links: list[LinkData], filename: str):
     """Write clean link scrape, deduplicating by canonical URL"""
+    paper, _, _ = parse_link_scrape_filename(filename)
     # Canonicalize URLs and deduplicate
     seen_canonical_urls = set()
     deduplicated_links = []
     
     for link in links:
-        canonical_url = canonicalize_url(link.href)
+        canonical_url = canonicalize_url(link.href, paper)
         if canonical_url not in seen_canonical_urls:
             seen_canonical_urls.add(canonical_url)
             # Update the link's href to the canonical version
             deduplicated_link = LinkData(text=link.text, href=canonical_url)
             deduplicated_links.append(deduplicated_link)
     
-    path = get_link_scrape_path(filename, CLEAN_LINK_SCRAPE_DIR)
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w") as outfile:
-        outfile.write(LinkDataList.dump_json(deduplicated_links, indent=4).decode())
+    store = get_store()
+    store.write("links_clean", filename, LinkDataList.dump_json(deduplicated_links, indent=4 if store.pretty else None).decode())
 
 def read_clean_link_scrape(filename: str) -> list[LinkData]:
-    # Try new location first (with batch_id subdirectory), then fallback to old location
-    path = get_link_scrape_path(filename, CLEAN_LINK_SCRAPE_DIR)
-    if not path.exists():
-        # Fallback to old location for backward compatibility
-        old_path = CLEAN_LINK_SCRAPE_DIR / filename
-        if old_path.exists():
-            path = old_path
-    with open(path, "r") as outfile:
-        contents = outfile.read()
-    return LinkDataList.validate_json(contents)
+    return LinkDataList.validate_json(get_store().read("links_clean", filename))
+
+class LinkDecisions(BaseModel):
+    """The canonical hrefs the LLM was asked about when a link scrape was cleaned, and those it kept.
+    Links the prefilter decided itself aren't in it, it is what the prefilter learns from."""
+    asked: list[str]
+    kept: list[str]
+
+def write_link_decisions(asked: list[LinkData], kept: list[LinkData], filename: str):
+    paper, _, _ = parse_link_scrape_filename(filename)
+    decisions = LinkDecisions(
+        asked=list(dict.fromkeys(canonicalize_url(link.href, paper) for link in asked)),
+        kept=list(dict.fromkeys(canonicalize_url(link.href, paper) for link in kept)),
+    )
+    store = get_store()
+    store.write("links_llm", filename, decisions.model_dump_json(indent=4 if store.pretty else None))
+
+def read_link_decisions(filename: str) -> LinkDecisions:
+    return LinkDecisions.model_validate_json(get_store().read("links_llm", filename))
 
 def link_scrape_filename(paper: Paper, page_limit: int, batch_id: str|None = None) -> str:
     if batch_id is None:
@@ -178,45 +315,27 @@ def get_article_scrape_path(filename: str, base_dir: Path) -> Path:
     return base_dir / filename
 
 def write_article_scrape(scrape: Scrape, filename: str):
-    path = get_article_scrape_path(filename, ARTICLE_SCRAPE_DIR)
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w") as f:
-        f.write(scrape.model_dump_json(indent=2))
+    if scrape.scraped_at is None:
+        scrape = scrape.model_copy(update={"scraped_at": datetime.now()})
+    store = get_store()
+    store.write("articles_raw", filename, scrape.model_dump_json(indent=2 if store.pretty else None))
 
 def read_article_scrape(filename: str) -> Scrape:
-    # Try new location first (with batch_id subdirectory), then fallback to old location
-    path = get_article_scrape_path(filename, ARTICLE_SCRAPE_DIR)
-    if not path.exists():
-        # Fallback to old location for backward compatibility
-        old_path = ARTICLE_SCRAPE_DIR / filename
-        if old_path.exists():
-            path = old_path
-    with open(path, "r") as f:
-        return Scrape.model_validate_json(f.read())
+    return Scrape.model_validate_json(get_store().read("articles_raw", filename))
 
 def write_clean_article_scrape(scrape: ScrapeData, filename: str):
-    path = get_article_scrape_path(filename, CLEAN_ARTICLE_SCRAPE_DIR)
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w") as f:
-        f.write(scrape.model_dump_json(indent=2))
+    store = get_store()
+    store.write("articles_clean", filename, scrape.model_dump_json(indent=2 if store.pretty else None))
 
 def read_clean_article_scrape(filename: str) -> ScrapeData:
-    # Try new location first (with batch_id subdirectory), then fallback to old location
-    path = get_article_scrape_path(filename, CLEAN_ARTICLE_SCRAPE_DIR)
-    if not path.exists():
-        # Fallback to old location for backward compatibility
-        old_path = CLEAN_ARTICLE_SCRAPE_DIR / filename
-        if old_path.exists():
-            path = old_path
-    with open(path, "r") as f:
-        return ScrapeData.model_validate_json(f.read())
+    return ScrapeData.model_validate_json(get_store().read("articles_clean", filename))
 
 def article_scrape_filename(paper: Paper, href: str, batch_id: str | None = None) -> str:
     if batch_id is None:
         batch_id = datetime.now().date().isoformat()
     
-    # Extract path from href and sanitize
-    parsed = urlparse(href)
+    # Extract path from href and sanitize, variants of one article share a filename
+    parsed = urlparse(canonicalize_url(href, paper))
     slug = parsed.path.strip("/").replace("/", "-")
     slug = re.sub(r"[^\w\-]", "", slug)  # Remove non-alphanumeric chars
     slug = slug[:80]  # Truncate if too long
@@ -246,6 +365,11 @@ def parse_article_scrape_filename(filename: str) -> tuple[Paper | None, str | No
     Format: {paper}-{slug}-{batch_id}.json
     Returns (paper, batch_id) or (None, None) if parsing fails.
     Accepts any batch_id suffix (not restricted to dates)."""
+    # Dated batch ids contain dashes themselves
+    match = re.match(r"(.+)-(\d{4}-\d{2}-\d{2})\.json$", filename)
+    if match:
+        paper = match.group(1).split("-", 1)[0]
+        return (paper if paper in PAPERS else None, match.group(2))
     name_without_ext = filename.replace(".json", "")
     # Split from the right once to isolate batch_id, keeping slug intact
     parts = name_without_ext.rsplit("-", 1)
@@ -257,76 +381,80 @@ def parse_article_scrape_filename(filename: str) -> tuple[Paper | None, str | No
         paper = None
     return (paper, batch_id)
 
+STAGE_DIRS: dict[ScrapeStage, Path] = {
+    "links_raw": LINK_SCRAPE_DIR,
+    "links_clean": CLEAN_LINK_SCRAPE_DIR,
+    "links_llm": LINK_DECISIONS_DIR,
+    "articles_raw": ARTICLE_SCRAPE_DIR,
+    "articles_clean": CLEAN_ARTICLE_SCRAPE_DIR,
+}
+
+def parse_scrape_filename(stage: ScrapeStage, filename: str) -> tuple[Paper | None, str | None]:
+    """(paper, batch_id) of a link or article scrape filename"""
+    if stage.startswith("links"):
+        paper, _, batch_id = parse_link_scrape_filename(filename)
+        return (paper, batch_id)
+    return parse_article_scrape_filename(filename)
+
+def open_store(backend: StorageBackend, db_path: Path | None = None) -> ScrapeStore:
+    if backend == "sqlite":
+        return SqliteScrapeStore(db_path or SCRAPE_DB_PATH, STAGE_DIRS, parse_scrape_filename, canonicalize_url)
+    return JsonScrapeStore(STAGE_DIRS, MANIFEST_DIR, parse_scrape_filename, canonicalize_url)
+
+_store: ScrapeStore | None = None
+_store_lock = threading.Lock()
+
+def get_store() -> ScrapeStore:
+    """The store scrapes are read from and written to, chosen by SCRAPE_BACKEND (json or sqlite) and SCRAPE_DB"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            backend = os.environ.get("SCRAPE_BACKEND", "json")
+            if backend not in ("json", "sqlite"):
+                raise ValueError(f"Unknown SCRAPE_BACKEND {backend!r}, expected json or sqlite")
+            db_path = os.environ.get("SCRAPE_DB")
+            _store = open_store(backend, Path(db_path) if db_path else None)
+        return _store
+
+def recent_scrape_filenames(stage: ScrapeStage, paper: Paper, limit: int | None = None) -> list[str]:
+    """Filenames of a paper's scrapes across all batches, most recently written first"""
+    return get_store().recent(stage, paper, limit)
+
+def find_previous_scrape(url: str) -> UrlIndexEntry | None:
+    """The latest successful raw scrape of this article's canonical URL, in any batch"""
+    return get_store().find_url(url)
+
+def copy_article_scrape(source_filename: str, filename: str):
+    """Copy a raw article scrape, and its clean version if there is one, under another batch's filename"""
+    store = get_store()
+    store.copy("articles_raw", source_filename, filename)
+    if store.exists("articles_clean", source_filename):
+        store.copy("articles_clean", source_filename, filename)
+
 def clean_link_scrape_exists(filename: str) -> bool:
     """Check if a clean link scrape file already exists (checks both new and old locations)"""
-    path = get_link_scrape_path(filename, CLEAN_LINK_SCRAPE_DIR)
-    if path.exists():
-        return True
-    # Check old location for backward compatibility
-    old_path = CLEAN_LINK_SCRAPE_DIR / filename
-    return old_path.exists()
+    return get_store().exists("links_clean", filename)
 
 def article_scrape_exists(filename: str) -> bool:
     """Check if an article scrape file already exists (checks both new and old locations)"""
-    path = get_article_scrape_path(filename, ARTICLE_SCRAPE_DIR)
-    if path.exists():
-        return True
-    # Check old location for backward compatibility
-    old_path = ARTICLE_SCRAPE_DIR / filename
-    return old_path.exists()
+    return get_store().exists("articles_raw", filename)
 
 def clean_article_scrape_exists(filename: str) -> bool:
     """Check if a clean article scrape file already exists (checks both new and old locations)"""
-    path = get_article_scrape_path(filename, CLEAN_ARTICLE_SCRAPE_DIR)
-    if path.exists():
-        return True
-    # Check old location for backward compatibility
-    old_path = CLEAN_ARTICLE_SCRAPE_DIR / filename
-    return old_path.exists()
+    return get_store().exists("articles_clean", filename)
 
 def get_link_scrapes_for_batch(batch_id: str) -> list[Path]:
     """Get all link scrape files for a given batch_id"""
-    all_links = glob_links()
-    matching = []
-    for link_path in all_links:
-        filename = link_path.name
-        _, _, file_batch_id = parse_link_scrape_filename(filename)
-        if file_batch_id == batch_id:
-            matching.append(link_path)
-    return matching
+    return get_store().paths("links_raw", batch_id)
 
 def get_clean_link_scrapes_for_batch(batch_id: str) -> list[Path]:
     """Get all clean link scrape files for a given batch_id"""
-    all_links = glob_links()
-    matching = []
-    for link_path in all_links:
-        filename = link_path.name
-        _, _, file_batch_id = parse_link_scrape_filename(filename)
-        if file_batch_id == batch_id:
-            # Check if it's in the clean directory (could be in batch_id subdirectory or old location)
-            clean_path = get_link_scrape_path(filename, CLEAN_LINK_SCRAPE_DIR)
-            if clean_path.exists():
-                matching.append(clean_path)
-    return matching
+    return get_store().paths("links_clean", batch_id)
 
 def get_article_scrapes_for_batch(batch_id: str) -> list[Path]:
     """Get all article scrape files for a given batch_id"""
-    all_articles = glob_articles()
-    matching = []
-    for article_path in all_articles:
-        filename = article_path.name
-        _, file_batch_id = parse_article_scrape_filename(filename)
-        if file_batch_id == batch_id and "raw" in str(article_path):
-            matching.append(article_path)
-    return matching
+    return get_store().paths("articles_raw", batch_id)
 
 def get_clean_article_scrapes_for_batch(batch_id: str) -> list[Path]:
     """Get all clean article scrape files for a given batch_id"""
-    all_articles = glob_articles()
-    matching = []
-    for article_path in all_articles:
-        filename = article_path.name
-        _, file_batch_id = parse_article_scrape_filename(filename)
-        if file_batch_id == batch_id and "clean" in str(article_path):
-            matching.append(article_path)
-    return matching
\ No newline at end of file
+    return get_store().paths("articles_clean", batch_id)